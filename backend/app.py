@@ -1,11 +1,39 @@
 from flask import Flask, request, jsonify
+import click
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta
+import contextlib
 import os
 from dotenv import load_dotenv
 import pymysql
-from sqlalchemy import text
+from sqlalchemy import text, select, func
+from serialization import (
+    FORMATS, fetch_reading_rows, newer_rows, parse_since, reading_columns, readings_payload, rows_to_columnar,
+    rows_to_records, json_response,
+)
+from chunk_storage import (
+    chunk_table, compact_readings, fetch_range_rows, fetch_recent_rows, merge_latest_rows, merge_trip_counts,
+    start_compactor,
+)
+from response_cache import ResponseCache, READINGS_TAG, REGISTRY_TAG
+from recent_buffer import create_recent_readings
+from load_stats import (
+    RANKINGS, catch_up, create_load_stats, load_checkpoint, start_checkpointer, stats_table,
+)
+from compression import init_compression
+from forecasting import ForecastUnavailable, create_forecaster, hourly_history, merge_history
+from registry import (
+    ensure_registry_schema, latest_reading_update, newest_readings, page_payload,
+    page_statement, parse_registry_args, wants_page,
+)
+from ingest import (
+    MAX_BATCH_SIZE, UNIQUE_INDEX_NAME, ensure_unique_index, insert_reading, insert_readings, prepare_reading,
+)
+from db_routing import ReplicaRouter, REGISTRY_KEY, replica_uris_from_hosts
+from sharding import (
+    ShardRouter, latest_readings_statement, merge_rows, rebalance, shard_specs_from_env, trip_counts_statement,
+)
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +43,7 @@ pymysql.install_as_MySQLdb()
 
 app = Flask(__name__)
 CORS(app)
+init_compression(app)
 
 # Database Configuration
 DB_HOST = os.getenv('DB_HOST', 'localhost')
@@ -22,18 +51,45 @@ DB_USER = os.getenv('DB_USER', 'root')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 DB_NAME = os.getenv('DB_NAME', 'lt_monitoring')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', f'mysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
+# Response cache for read endpoints (CACHE_BACKEND=memory|disk|none)
+response_cache = ResponseCache.from_env()
+
+# Newest readings per transformer kept in memory (RECENT_BUFFER_SIZE, 0 = off)
+recent_readings = create_recent_readings()
+
+# Online per-transformer load statistics, updated on ingest (see load_stats.py)
+transformer_stats = create_load_stats()
+
+# Read replicas for dashboard queries (writes always go to the primary)
+replica_router = ReplicaRouter(
+    db,
+    replica_uris_from_hosts(os.getenv('DB_REPLICA_HOSTS', ''), DB_USER, DB_PASSWORD, DB_NAME),
+    lag_window=float(os.getenv('DB_REPLICA_LAG_WINDOW', '2')),
+    retry_interval=float(os.getenv('DB_REPLICA_RETRY', '10'))
+)
+
 # Database Models
 class Transformer(db.Model):
     __tablename__ = 'transformer'
+    # Registry pages are sorted / filtered on these (see registry.py)
+    __table_args__ = (
+        db.Index('ix_transformer_location', 'location'),
+        db.Index('ix_transformer_created_at', 'created_at'),
+        db.Index('ix_transformer_last_reading_at', 'last_reading_at'),
+        db.Index('ix_transformer_tripped', 'tripped', 'transformer_id'),
+    )
     
     transformer_id = db.Column(db.String(50), primary_key=True)
     location = db.Column(db.String(200), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # State of the latest reading, kept current on ingest
+    tripped = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    last_reading_at = db.Column(db.DateTime)
     
     # Relationship with readings
     readings = db.relationship('Reading', backref='transformer', lazy=True, cascade='all, delete-orphan')
@@ -47,6 +103,8 @@ class Transformer(db.Model):
 
 class Reading(db.Model):
     __tablename__ = 'reading'
+    # One reading per transformer and timestamp: device retries are not stored twice
+    __table_args__ = (db.UniqueConstraint('transformer_id', 'timestamp', name=UNIQUE_INDEX_NAME),)
     
     id = db.Column(db.Integer, primary_key=True)
     transformer_id = db.Column(db.String(50), db.ForeignKey('transformer.transformer_id'), nullable=False)
@@ -65,6 +123,137 @@ class Reading(db.Model):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
 
+# Compressed history (READING_STORAGE=chunks): readings from closed time
+# windows are moved into reading_chunk blobs, see chunk_storage.py
+READING_STORAGE = os.getenv('READING_STORAGE', 'rows')
+reading_chunks = chunk_table(db.metadata) if READING_STORAGE == 'chunks' else None
+
+# Checkpoints of the load statistics
+transformer_stats_table = stats_table(db.metadata)
+
+# Reading shards (READING_SHARDS): readings split across databases by
+# consistent hash of transformer_id, transformers stay on the primary;
+# see sharding.py
+reading_shards = ShardRouter(
+    shard_specs_from_env(os.getenv('READING_SHARDS', ''), DB_USER, DB_PASSWORD, DB_NAME),
+    Reading.__table__,
+    vnodes=int(os.getenv('READING_SHARD_VNODES', '128'))
+)
+if reading_shards.enabled and reading_chunks is not None:
+    raise RuntimeError('READING_SHARDS requires READING_STORAGE=rows')
+
+@contextlib.contextmanager
+def reading_session(transformer_id):
+    """
+    Session for writing a transformer's readings: its shard (committed on
+    exit), or db.session (committed by the caller) when not sharded
+    """
+    if reading_shards.enabled:
+        with reading_shards.session(transformer_id) as session:
+            yield session
+    else:
+        yield db.session
+
+def read_readings(transformer_id, fn):
+    """Call fn(session) where the transformer's readings can be read"""
+    if reading_shards.enabled:
+        return reading_shards.run_read(transformer_id, fn)
+    return replica_router.run_read(fn, key=transformer_id)
+
+def scatter_readings(fn):
+    """Call fn(session) on every shard in parallel (or once, when not sharded)"""
+    if reading_shards.enabled:
+        return reading_shards.scatter(fn)
+    return [replica_router.run_read(fn)]
+
+def forecast_history(start, end):
+    """Hourly current aggregates of every transformer, from every shard and the chunk archive"""
+    with app.app_context():
+        return merge_history(scatter_readings(
+            lambda session: hourly_history(session, Reading.__table__, reading_chunks, start, end)
+        ))
+
+# Day-ahead load forecasts, refitted in bulk every FORECAST_TTL seconds (see forecasting.py)
+forecaster = create_forecaster(forecast_history, transformer_stats.rated_current)
+FORECAST_RISK_THRESHOLD = float(os.getenv('FORECAST_RISK_THRESHOLD', '1.0'))
+
+def insert_reading_batch(rows):
+    """Insert rows where their readings are stored; returns how many were new"""
+    if not reading_shards.enabled:
+        return insert_readings(db.session, Reading.__table__, rows)
+    inserted = 0
+    for shard, transformer_ids in reading_shards.group({row['transformer_id'] for row in rows}).items():
+        owned = set(transformer_ids)
+        with reading_shards.session(shard=shard) as session:
+            inserted += insert_readings(session, Reading.__table__, [row for row in rows if row['transformer_id'] in owned])
+    return inserted
+
+def recent_reading_rows(session, transformer_id, limit, since=None):
+    """
+    Newest readings as tuples, including compacted history when chunk storage
+    is on; only readings newer than the `since` cursor if given
+    """
+    if since is not None:
+        if reading_chunks is not None and not isinstance(since, int):
+            # Chunked readings have no id, so only timestamp cursors can reach them
+            rows = fetch_range_rows(session, Reading.__table__, reading_chunks, transformer_id, since, datetime(9999, 12, 31))
+            return newer_rows(rows, since)[::-1][:limit]
+        return fetch_reading_rows(session, Reading, transformer_id, limit, since=since)
+    if reading_chunks is not None:
+        return fetch_recent_rows(session, Reading.__table__, reading_chunks, transformer_id, limit)
+    return fetch_reading_rows(session, Reading, transformer_id, limit)
+
+def load_recent_rows(transformer_id, limit, since=None):
+    """
+    Newest readings (newer than `since` if given), from the in-memory buffer
+    when it covers `limit`; None if the transformer does not exist
+    """
+    def query(session, fetch_limit, since=None):
+        if session.get(Transformer, transformer_id) is None:
+            return None
+        return recent_reading_rows(session, transformer_id, fetch_limit, since)
+    
+    def load(fetch_limit, since=None):
+        if not reading_shards.enabled:
+            return replica_router.run_read(lambda session: query(session, fetch_limit, since), key=transformer_id)
+        # Transformer on the primary, its readings on the owning shard
+        if replica_router.run_read(lambda session: session.get(Transformer, transformer_id), key=transformer_id) is None:
+            return None
+        return reading_shards.run_read(
+            transformer_id, lambda session: recent_reading_rows(session, transformer_id, fetch_limit, since)
+        )
+    
+    if since is not None and not recent_readings.covers(limit):
+        return load(limit, since)
+    if isinstance(since, int):
+        return recent_readings.read_since(transformer_id, limit, since, load)
+    rows = recent_readings.read(transformer_id, limit, load)
+    return rows if rows is None or since is None else newer_rows(rows, since)
+
+def registry_cursor(transformers, since=None):
+    """`since` value for the next get_transformers delta: newest created_at seen"""
+    created = [t.created_at for t in transformers if t.created_at is not None]
+    newest = max(created) if created else since
+    return newest.isoformat() if newest is not None else None
+
+def record_latest_reading(row):
+    """
+    Keep the transformer's tripped / last_reading_at in step with a new
+    reading. Returns True when the transformer row changed, i.e. cached
+    registry pages are stale.
+    """
+    result = db.session.execute(latest_reading_update(
+        Transformer.__table__, row['transformer_id'], row['timestamp'], row['trip_status']
+    ))
+    return bool(result.rowcount)
+
+def forget_readings(*transformer_ids):
+    """Drop cached responses and buffered readings after readings were rewritten"""
+    for transformer_id in transformer_ids:
+        response_cache.invalidate_transformer(transformer_id)
+        recent_readings.invalidate(transformer_id)
+    response_cache.invalidate_readings()
+
 # API Routes
 
 @app.route('/', methods=['GET'])
@@ -95,6 +284,8 @@ def add_transformer():
         
         db.session.add(transformer)
         db.session.commit()
+        replica_router.mark_write(REGISTRY_KEY, transformer.transformer_id)
+        response_cache.invalidate_registry()
         
         return jsonify({
             'message': 'Transformer added successfully',
@@ -110,117 +301,409 @@ def add_reading():
     try:
         data = request.get_json()
         
-        required_fields = ['transformer_id', 'voltage', 'current']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'{field} is required'}), 400
+        try:
+            row = prepare_reading(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Check if transformer exists
-        transformer = Transformer.query.filter_by(transformer_id=data['transformer_id']).first()
+        transformer = Transformer.query.filter_by(transformer_id=row['transformer_id']).first()
         if not transformer:
             return jsonify({'error': 'Transformer not found'}), 404
         
-        # Parse timestamp if provided, otherwise use current time
-        timestamp = datetime.utcnow()
-        if 'timestamp' in data:
-            try:
-                timestamp = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-            except ValueError:
-                pass  # Use default timestamp if parsing fails
+        with reading_session(row['transformer_id']) as session:
+            reading_id = insert_reading(session, Reading.__table__, row)
+            if reading_id is None:
+                # Retry of a reading we already have: nothing new is stored
+                existing = session.scalars(select(Reading).filter_by(
+                    transformer_id=row['transformer_id'], timestamp=row['timestamp']
+                )).first()
+                existing = existing.to_dict() if existing else None
+        registry_changed = reading_id is not None and record_latest_reading(row)
+        db.session.commit()
         
-        reading = Reading(
-            transformer_id=data['transformer_id'],
-            voltage=float(data['voltage']),
-            current=float(data['current']),
-            trip_status=data.get('trip_status', False),
-            timestamp=timestamp
-        )
+        if reading_id is None:
+            return jsonify({
+                'message': 'Reading already recorded',
+                'duplicate': True,
+                'reading': existing
+            }), 200
         
-        db.session.add(reading)
-        db.session.commit()
+        replica_router.mark_write(row['transformer_id'])
+        response_cache.invalidate_transformer(row['transformer_id'])
+        response_cache.invalidate_readings()
+        if registry_changed:
+            response_cache.invalidate_registry()
+        recent_readings.add(row['transformer_id'], (
+            reading_id, row['transformer_id'], row['voltage'], row['current'], row['trip_status'], row['timestamp']
+        ))
+        transformer_stats.add(row['transformer_id'], row['voltage'], row['current'], row['trip_status'], row['timestamp'])
         
         return jsonify({
             'message': 'Reading added successfully',
-            'reading': reading.to_dict()
+            'reading': Reading(id=reading_id, **row).to_dict()
         }), 201
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/add_readings', methods=['POST'])
+def add_readings():
+    """Batch ingest: {"readings": [...]}; readings already stored are skipped"""
+    try:
+        data = request.get_json()
+        items = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'readings must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'at most {MAX_BATCH_SIZE} readings per request'}), 400
+        
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append(prepare_reading(item))
+            except ValueError as e:
+                return jsonify({'error': f'readings[{index}]: {e}'}), 400
+        
+        # Check all transformers exist with one query
+        transformer_ids = {row['transformer_id'] for row in rows}
+        known = dict(db.session.execute(
+            select(Transformer.transformer_id, Transformer.tripped)
+            .where(Transformer.transformer_id.in_(transformer_ids))
+        ).all())
+        missing = sorted(transformer_ids - known.keys())
+        if missing:
+            return jsonify({'error': f"Transformer not found: {', '.join(missing)}"}), 404
+        
+        inserted = insert_reading_batch(rows)
+        registry_changed = False
+        if inserted:
+            for row in newest_readings(rows).values():
+                registry_changed |= record_latest_reading(row)
+        db.session.commit()
+        
+        if inserted:
+            replica_router.mark_write(*transformer_ids)
+            forget_readings(*transformer_ids)
+            transformer_stats.add_rows(rows)
+            if registry_changed:
+                response_cache.invalidate_registry()
+        
+        return jsonify({
+            'message': 'Readings processed',
+            'received': len(rows),
+            'inserted': inserted,
+            'duplicates': len(rows) - inserted
+        }), 201 if inserted else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/get_transformers', methods=['GET'])
+@response_cache.cached(tag=REGISTRY_TAG)
 def get_transformers():
     try:
-        transformers = Transformer.query.all()
+        # Paginated / searchable registry: ?limit, after, q, prefix, tripped, sort, order
+        if wants_page(request.args):
+            try:
+                query = parse_registry_args(request.args)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            rows = replica_router.run_read(
+                lambda session: session.execute(
+                    page_statement(Transformer.__table__, query, session.get_bind().dialect.name)
+                ).all(),
+                key=REGISTRY_KEY
+            )
+            return json_response(page_payload(rows, query))
+        
+        since = request.args.get('since')
+        stmt = select(Transformer)
+        if since is not None:
+            # Delta sync: only transformers registered after the cursor
+            try:
+                since = parse_since(since)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if isinstance(since, int):
+                return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+            stmt = stmt.where(Transformer.created_at > since)
+        
+        transformers = replica_router.run_read(
+            lambda session: session.scalars(stmt).all(),
+            key=REGISTRY_KEY
+        )
         return jsonify({
-            'transformers': [t.to_dict() for t in transformers]
+            'transformers': [t.to_dict() for t in transformers],
+            'cursor': registry_cursor(transformers, since)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/get_readings/<transformer_id>', methods=['GET'])
+@response_cache.cached(tag_arg='transformer_id')
 def get_readings(transformer_id):
     try:
-        # Check if transformer exists
-        transformer = Transformer.query.filter_by(transformer_id=transformer_id).first()
-        if not transformer:
-            return jsonify({'error': 'Transformer not found'}), 404
-        
         # Get limit parameter (default to 50 recent readings)
         limit = request.args.get('limit', 50, type=int)
         
-        readings = Reading.query.filter_by(transformer_id=transformer_id)\
-                                .order_by(Reading.timestamp.desc())\
-                                .limit(limit).all()
+        # Response layout: 'records' (list of dicts) or 'columnar' (arrays per field)
+        fmt = request.args.get('format', 'records')
+        if fmt not in FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
         
-        return jsonify({
-            'transformer_id': transformer_id,
-            'readings': [r.to_dict() for r in readings]
-        })
+        # Delta sync: only readings newer than the cursor from a previous response
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = parse_since(since)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        rows = load_recent_rows(transformer_id, limit, since)
+        if rows is None:
+            return jsonify({'error': 'Transformer not found'}), 404
+        
+        return json_response(readings_payload(transformer_id, rows, fmt, since))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/get_latest_reading/<transformer_id>', methods=['GET'])
+@response_cache.cached(tag_arg='transformer_id')
 def get_latest_reading(transformer_id):
     try:
-        # Check if transformer exists
-        transformer = Transformer.query.filter_by(transformer_id=transformer_id).first()
-        if not transformer:
+        rows = load_recent_rows(transformer_id, 1)
+        if rows is None:
             return jsonify({'error': 'Transformer not found'}), 404
         
-        latest_reading = Reading.query.filter_by(transformer_id=transformer_id)\
-                                    .order_by(Reading.timestamp.desc())\
-                                    .first()
-        
-        if not latest_reading:
+        if not rows:
             return jsonify({'error': 'No readings found'}), 404
         
-        return jsonify({
+        return json_response({
             'transformer_id': transformer_id,
-            'latest_reading': latest_reading.to_dict()
+            'latest_reading': rows_to_records(rows)[0]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Fleet-wide views: one query per shard, run in parallel and merged
+@app.route('/fleet/snapshot', methods=['GET'])
+@response_cache.cached(tag=READINGS_TAG)
+def fleet_snapshot():
+    """Newest reading of every transformer"""
+    try:
+        fmt = request.args.get('format', 'records')
+        if fmt not in FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
+        
+        statement = latest_readings_statement(Reading, reading_columns(Reading))
+        
+        def latest_rows(session):
+            rows = session.execute(statement).all()
+            if reading_chunks is not None:
+                rows = merge_latest_rows(session, reading_chunks, rows)
+            return rows
+        
+        rows = merge_rows(scatter_readings(latest_rows), key=lambda row: row[1])
+        return json_response({
+            'count': len(rows),
+            'tripped': sum(1 for row in rows if row[4]),
+            'readings': rows_to_columnar(rows) if fmt == 'columnar' else rows_to_records(rows)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/fleet/outages', methods=['GET'])
+@response_cache.cached(tag=READINGS_TAG)
+def fleet_outages():
+    """Trip readings per transformer over the last ?hours (default 24)"""
+    try:
+        hours = request.args.get('hours', 24, type=float)
+        if hours <= 0:
+            return jsonify({'error': 'hours must be positive'}), 400
+        since = datetime.utcnow() - timedelta(hours=hours)
+        
+        statement = trip_counts_statement(Reading, since)
+        
+        def trip_counts(session):
+            counts = session.execute(statement).all()
+            if reading_chunks is not None:
+                counts = merge_trip_counts(session, Reading.__table__, reading_chunks, counts, since)
+            return counts
+        
+        counts = merge_rows(scatter_readings(trip_counts))
+        tripped_now = replica_router.run_read(
+            lambda session: session.scalar(select(func.count()).where(Transformer.tripped.is_(True))),
+            key=REGISTRY_KEY
+        )
+        return json_response({
+            'since': since.isoformat(),
+            'total_trips': sum(count for _, count in counts),
+            'transformers': {transformer_id: count for transformer_id, count in counts},
+            'tripped_now': tripped_now
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Load statistics, served from memory
+@app.route('/stats', methods=['GET'])
+def get_fleet_stats():
+    """Fleet totals and the top ?k transformers ranked ?by a statistic"""
+    try:
+        by = request.args.get('by', 'utilization')
+        if by not in RANKINGS:
+            return jsonify({'error': f"by must be one of: {', '.join(RANKINGS)}"}), 400
+        k = request.args.get('k', 10, type=int)
+        if not 0 < k <= 1000:
+            return jsonify({'error': 'k must be between 1 and 1000'}), 400
+        
+        return json_response({
+            'by': by,
+            'fleet': transformer_stats.fleet(),
+            'transformers': transformer_stats.top(k, by)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/stats/<transformer_id>', methods=['GET'])
+def get_transformer_stats(transformer_id):
+    try:
+        stats = transformer_stats.get(transformer_id)
+        if stats is None:
+            return jsonify({'error': 'No readings found'}), 404
+        return json_response(stats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Load forecasts
+@app.route('/forecast/<transformer_id>', methods=['GET'])
+def get_forecast(transformer_id):
+    """Hourly current forecast for the next 24 hours with an upper band"""
+    try:
+        forecast = forecaster.get().for_transformer(transformer_id)
+        if forecast is None:
+            return jsonify({'error': 'No history to forecast from'}), 404
+        return json_response(forecast)
+    except ForecastUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/fleet/at_risk', methods=['GET'])
+def fleet_at_risk():
+    """Transformers forecast to reach ?threshold x rated current in the next 24 hours"""
+    try:
+        threshold = request.args.get('threshold', FORECAST_RISK_THRESHOLD, type=float)
+        if threshold <= 0:
+            return jsonify({'error': 'threshold must be positive'}), 400
+        limit = request.args.get('limit', 50, type=int)
+        if not 0 < limit <= 1000:
+            return jsonify({'error': 'limit must be between 1 and 1000'}), 400
+        
+        return json_response(forecaster.get().at_risk(threshold, limit))
+    except ForecastUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
     try:
         # Test database connection
         db.session.execute(text('SELECT 1'))
-        return jsonify({'status': 'healthy', 'database': 'connected'})
+        return jsonify({
+            'status': 'healthy',
+            'database': 'connected',
+            'replication': replica_router.status(),
+            'cache': response_cache.stats(),
+            'recent_buffer': recent_readings.stats(),
+            'load_stats': transformer_stats.stats(),
+            'forecast': forecaster.stats(),
+            'sharding': reading_shards.status()
+        })
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'database': 'disconnected', 'error': str(e)}), 503
 
+@app.cli.command('compact-readings')
+def compact_readings_command():
+    """Move readings from closed time windows into compressed chunks"""
+    if reading_chunks is None:
+        print("Set READING_STORAGE=chunks to enable compressed reading storage")
+        return
+    moved = compact_readings(db.session, Reading.__table__, reading_chunks,
+                             on_compacted=forget_readings)
+    print(f"Compacted {moved} readings")
+
+@app.cli.command('rebalance-readings')
+@click.option('--dry-run', is_flag=True, help='Only report how many readings would move')
+@click.option('--batch-size', default=1000, show_default=True, help='Readings copied per transaction')
+def rebalance_readings_command(dry_run, batch_size):
+    """Move readings to their owning shard after adding shards (or sharding the primary)"""
+    if not reading_shards.enabled:
+        print("Set READING_SHARDS to enable sharded reading storage")
+        return
+    reading_shards.create_all()
+    sources = [(name, shard.engine) for name, shard in reading_shards.shards.items()]
+    sources.append(('primary', db.engine))
+    moved = rebalance(reading_shards, sources, dry_run=dry_run, batch_size=batch_size)
+    for (source, target), count in sorted(moved.items()):
+        print(f"{source} -> {target}: {count} readings{' to move' if dry_run else ' moved'}")
+    if not dry_run:
+        forget_readings(*db.session.scalars(select(Transformer.transformer_id)))
+    print(f"{sum(moved.values())} readings {'to move' if dry_run else 'moved'}")
+    if moved and not dry_run:
+        print("Moved readings have new ids: `since` id cursors issued before the move are no longer valid")
+
+def warm_recent_readings():
+    """Load the in-memory buffer for every transformer before serving"""
+    with app.app_context():
+        transformer_ids = db.session.scalars(select(Transformer.transformer_id)).all()
+        recent_readings.warm(transformer_ids, lambda transformer_id, limit: read_readings(
+            transformer_id, lambda session: recent_reading_rows(session, transformer_id, limit)
+        ))
+        print(f"Buffered recent readings for {len(transformer_ids)} transformers")
+
+STATS_CATCH_UP_LIMIT = 100000
+
+def load_transformer_stats():
+    """Restore load statistics from the last checkpoint and replay newer readings"""
+    with app.app_context():
+        restored = load_checkpoint(db.session, transformer_stats_table, transformer_stats)
+        transformer_ids = db.session.scalars(select(Transformer.transformer_id)).all()
+        applied = catch_up(transformer_stats, transformer_ids, lambda transformer_id, since: read_readings(
+                transformer_id, lambda session: recent_reading_rows(session, transformer_id, STATS_CATCH_UP_LIMIT, since)
+            ))
+        db.session.rollback()
+        print(f"Load stats: {restored} transformers from checkpoint, {applied} readings replayed")
+
 # Initialize database
 def create_tables():
     with app.app_context():
         db.create_all()
-        print("Database tables created successfully!")
+        # Tables created before the unique index existed get it (and lose duplicates) here
+        with db.engine.begin() as connection:
+            removed = ensure_unique_index(connection, Reading.__table__)
+            search = ensure_registry_schema(connection, Transformer.__table__, Reading.__table__)
+        reading_shards.create_all()
+        if removed:
+            print(f"Removed {removed} duplicate readings")
+        print(f"Database tables created successfully! (registry search: {search})")
 
 if __name__ == '__main__':
     # Create tables on startup
     create_tables()
+    warm_recent_readings()
+    load_transformer_stats()
+    start_checkpointer(app, lambda: db.session, transformer_stats_table, transformer_stats,
+                       interval=int(os.getenv('STATS_CHECKPOINT_INTERVAL', '60')))
+    
+    if reading_chunks is not None:
+        start_compactor(app, lambda: db.session, Reading.__table__, reading_chunks,
+                        interval=int(os.getenv('READING_COMPACT_INTERVAL', '300')),
+                        on_compacted=forget_readings)
     
     # Get host IP for network access
     import socket
@@ -0,0 +1,407 @@
+"""
+LT Line Monitoring System - Async API (FastAPI + async SQLAlchemy)
+
+Wire-compatible port of the Flask API in app.py for high-concurrency ingest:
+requests waiting on the database do not hold a worker thread, so one
+process can keep thousands of device connections open.
+
+Database:
+    MySQL  -> mysql+aiomysql://DB_USER:DB_PASSWORD@DB_HOST/DB_NAME (default)
+    Demo   -> ASYNC_DEMO=true uses sqlite+aiosqlite:///lt_monitoring_demo.db
+    Any    -> ASYNC_DATABASE_URL overrides both
+
+Run with:
+    pip install fastapi uvicorn "sqlalchemy[asyncio]" aiomysql aiosqlite
+    uvicorn app_async:app --host 0.0.0.0 --port 5000
+"""
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, UniqueConstraint,
+    select, text,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from compression import DecompressRequestMiddleware
+from ingest import (
+    MAX_BATCH_SIZE, UNIQUE_INDEX_NAME, ensure_unique_index, insert_reading, insert_readings, parse_timestamp,
+    prepare_reading,
+)
+from registry import (
+    ensure_registry_schema, latest_reading_update, newest_readings, page_payload, page_statement,
+    parse_registry_args, wants_page,
+)
+from serialization import FORMATS, READING_FIELDS, dumps, parse_since, readings_payload, since_condition
+
+# Load environment variables
+load_dotenv()
+
+# Database Configuration
+DB_HOST = os.getenv('DB_HOST', 'localhost')
+DB_USER = os.getenv('DB_USER', 'root')
+DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+DB_NAME = os.getenv('DB_NAME', 'lt_monitoring')
+
+if os.getenv('ASYNC_DATABASE_URL'):
+    DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')
+elif os.getenv('ASYNC_DEMO', 'false').lower() == 'true':
+    DATABASE_URL = 'sqlite+aiosqlite:///lt_monitoring_demo.db'
+else:
+    DATABASE_URL = f'mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
+
+engine_options = {'pool_pre_ping': True}
+if not DATABASE_URL.startswith('sqlite'):
+    engine_options.update(
+        pool_size=int(os.getenv('ASYNC_POOL_SIZE', '20')),
+        max_overflow=int(os.getenv('ASYNC_MAX_OVERFLOW', '20')),
+    )
+engine = create_async_engine(DATABASE_URL, **engine_options)
+
+# Tables (same schema as the Flask-SQLAlchemy models in app.py)
+metadata = MetaData()
+
+transformer_table = Table(
+    'transformer', metadata,
+    Column('transformer_id', String(50), primary_key=True),
+    Column('location', String(200), nullable=False),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('tripped', Boolean, nullable=False, default=False, server_default='0'),
+    Column('last_reading_at', DateTime),
+    Index('ix_transformer_location', 'location'),
+    Index('ix_transformer_created_at', 'created_at'),
+    Index('ix_transformer_last_reading_at', 'last_reading_at'),
+    Index('ix_transformer_tripped', 'tripped', 'transformer_id'),
+)
+
+reading_table = Table(
+    'reading', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('transformer_id', String(50), ForeignKey('transformer.transformer_id'), nullable=False),
+    Column('voltage', Float, nullable=False),
+    Column('current', Float, nullable=False),
+    Column('trip_status', Boolean, default=False),
+    Column('timestamp', DateTime, default=datetime.utcnow),
+    UniqueConstraint('transformer_id', 'timestamp', name=UNIQUE_INDEX_NAME),
+)
+
+reading_columns = [reading_table.c[field] for field in READING_FIELDS]
+
+
+# Request Models
+class TransformerIn(BaseModel):
+    transformer_id: str = Field(max_length=50)
+    location: str = Field(max_length=200)
+
+
+class ReadingIn(BaseModel):
+    transformer_id: str = Field(max_length=50)
+    voltage: float
+    current: float
+    trip_status: bool = False
+    timestamp: Optional[str] = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+        await conn.run_sync(ensure_unique_index, reading_table)
+        await conn.run_sync(ensure_registry_schema, transformer_table, reading_table)
+    yield
+    await engine.dispose()
+
+
+app = FastAPI(title='LT Line Monitoring System API (async)', version='1.0', lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv('COMPRESS_MIN_SIZE', '500')))
+app.add_middleware(DecompressRequestMiddleware)
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status_code=status, media_type='application/json')
+
+
+def error(message, status):
+    return json_response({'error': message}, status)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    # Keep the Flask API's 400 {"error": ...} shape instead of FastAPI's 422
+    if request.url.path == '/add_transformer':
+        return error('transformer_id and location are required', 400)
+    for err in exc.errors():
+        field = err['loc'][-1] if err['loc'] else 'body'
+        if err['type'] == 'missing':
+            return error(f'{field} is required', 400)
+        return error(f'{field}: {err["msg"]}', 400)
+    return error('Invalid request body', 400)
+
+
+def transformer_to_dict(row):
+    return {
+        'transformer_id': row.transformer_id,
+        'location': row.location,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+async def transformer_exists(conn, transformer_id):
+    result = await conn.execute(
+        select(transformer_table.c.transformer_id)
+        .where(transformer_table.c.transformer_id == transformer_id)
+    )
+    return result.first() is not None
+
+
+# API Routes
+
+@app.get('/')
+async def home():
+    return json_response({
+        'message': 'LT Line Monitoring System API',
+        'version': '1.0',
+        'status': 'running',
+        'server': 'async',
+    })
+
+
+@app.post('/add_transformer')
+async def add_transformer(data: TransformerIn):
+    try:
+        created_at = datetime.utcnow()
+        async with engine.begin() as conn:
+            if await transformer_exists(conn, data.transformer_id):
+                return error('Transformer already exists', 409)
+            await conn.execute(transformer_table.insert().values(
+                transformer_id=data.transformer_id,
+                location=data.location,
+                created_at=created_at,
+            ))
+        return json_response({
+            'message': 'Transformer added successfully',
+            'transformer': {
+                'transformer_id': data.transformer_id,
+                'location': data.location,
+                'created_at': created_at.isoformat(),
+            }
+        }, 201)
+    except IntegrityError:
+        # Lost a race with a concurrent insert of the same id
+        return error('Transformer already exists', 409)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def reading_row_to_dict(row, reading_id):
+    return {
+        'id': reading_id,
+        'transformer_id': row['transformer_id'],
+        'voltage': row['voltage'],
+        'current': row['current'],
+        'trip_status': row['trip_status'],
+        'timestamp': row['timestamp'].isoformat(),
+    }
+
+
+@app.post('/add_reading')
+async def add_reading(data: ReadingIn):
+    try:
+        row = {
+            'transformer_id': data.transformer_id,
+            'voltage': data.voltage,
+            'current': data.current,
+            'trip_status': data.trip_status,
+            'timestamp': parse_timestamp(data.timestamp),
+        }
+        async with engine.begin() as conn:
+            if not await transformer_exists(conn, data.transformer_id):
+                return error('Transformer not found', 404)
+            reading_id = await conn.run_sync(insert_reading, reading_table, row)
+            if reading_id is None:
+                # Retry of a reading we already have: nothing new is stored
+                existing = await conn.execute(
+                    select(*reading_columns)
+                    .where(reading_table.c.transformer_id == row['transformer_id'])
+                    .where(reading_table.c.timestamp == row['timestamp'])
+                )
+                existing = existing.first()
+                return json_response({
+                    'message': 'Reading already recorded',
+                    'duplicate': True,
+                    'reading': reading_row_to_dict(existing._mapping, existing.id) if existing else None
+                })
+            await conn.execute(latest_reading_update(
+                transformer_table, row['transformer_id'], row['timestamp'], row['trip_status']
+            ))
+        return json_response({
+            'message': 'Reading added successfully',
+            'reading': reading_row_to_dict(row, reading_id)
+        }, 201)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@app.post('/add_readings')
+async def add_readings(request: Request):
+    """Batch ingest: {"readings": [...]}; readings already stored are skipped"""
+    try:
+        data = await request.json()
+        items = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return error('readings must be a non-empty list', 400)
+        if len(items) > MAX_BATCH_SIZE:
+            return error(f'at most {MAX_BATCH_SIZE} readings per request', 400)
+
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append(prepare_reading(item))
+            except ValueError as e:
+                return error(f'readings[{index}]: {e}', 400)
+
+        transformer_ids = {row['transformer_id'] for row in rows}
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                select(transformer_table.c.transformer_id)
+                .where(transformer_table.c.transformer_id.in_(transformer_ids))
+            )
+            missing = sorted(transformer_ids - set(result.scalars()))
+            if missing:
+                return error(f"Transformer not found: {', '.join(missing)}", 404)
+            inserted = await conn.run_sync(insert_readings, reading_table, rows)
+            if inserted:
+                for row in newest_readings(rows).values():
+                    await conn.execute(latest_reading_update(
+                        transformer_table, row['transformer_id'], row['timestamp'], row['trip_status']
+                    ))
+
+        return json_response({
+            'message': 'Readings processed',
+            'received': len(rows),
+            'inserted': inserted,
+            'duplicates': len(rows) - inserted
+        }, 201 if inserted else 200)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@app.get('/get_transformers')
+async def get_transformers(request: Request, since: Optional[str] = None):
+    # Paginated / searchable registry: ?limit, after, q, prefix, tripped, sort, order
+    if wants_page(request.query_params):
+        try:
+            query = parse_registry_args(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+        try:
+            async with engine.connect() as conn:
+                rows = (await conn.execute(page_statement(transformer_table, query, conn.dialect.name))).all()
+            return json_response(page_payload(rows, query))
+        except Exception as e:
+            return error(str(e), 500)
+
+    stmt = select(transformer_table)
+    if since is not None:
+        # Delta sync: only transformers registered after the cursor
+        try:
+            since = parse_since(since)
+        except ValueError as e:
+            return error(str(e), 400)
+        if isinstance(since, int):
+            return error('since must be an ISO 8601 timestamp', 400)
+        stmt = stmt.where(transformer_table.c.created_at > since)
+    try:
+        async with engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+        created = [r.created_at for r in rows if r.created_at is not None]
+        newest = max(created) if created else since
+        return json_response({
+            'transformers': [transformer_to_dict(r) for r in rows],
+            'cursor': newest.isoformat() if newest is not None else None,
+        })
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@app.get('/get_readings/{transformer_id}')
+async def get_readings(transformer_id: str, limit: int = 50, format: str = 'records',
+                       since: Optional[str] = None):
+    if format not in FORMATS:
+        return error(f"format must be one of: {', '.join(FORMATS)}", 400)
+    if since is not None:
+        # Delta sync: only readings newer than the cursor from a previous response
+        try:
+            since = parse_since(since)
+        except ValueError as e:
+            return error(str(e), 400)
+    stmt = select(*reading_columns).where(reading_table.c.transformer_id == transformer_id)
+    if since is not None:
+        stmt = stmt.where(since_condition(reading_table.c.id, reading_table.c.timestamp, since))
+    try:
+        async with engine.connect() as conn:
+            if not await transformer_exists(conn, transformer_id):
+                return error('Transformer not found', 404)
+            result = await conn.execute(stmt.order_by(reading_table.c.timestamp.desc()).limit(limit))
+            rows = result.all()
+        return json_response(readings_payload(transformer_id, rows, format, since))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@app.get('/get_latest_reading/{transformer_id}')
+async def get_latest_reading(transformer_id: str):
+    try:
+        async with engine.connect() as conn:
+            if not await transformer_exists(conn, transformer_id):
+                return error('Transformer not found', 404)
+            result = await conn.execute(
+                select(*reading_columns)
+                .where(reading_table.c.transformer_id == transformer_id)
+                .order_by(reading_table.c.timestamp.desc())
+                .limit(1)
+            )
+            row = result.first()
+        if row is None:
+            return error('No readings found', 404)
+        return json_response({
+            'transformer_id': transformer_id,
+            'latest_reading': dict(zip(READING_FIELDS, row)),
+        })
+    except Exception as e:
+        return error(str(e), 500)
+
+
+# Health check endpoint
+@app.get('/health')
+async def health_check():
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text('SELECT 1'))
+        return json_response({
+            'status': 'healthy',
+            'database': 'connected',
+            'pool': engine.pool.status(),
+        })
+    except Exception as e:
+        return json_response({'status': 'unhealthy', 'database': 'disconnected', 'error': str(e)}, 503)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print('Starting LT Line Monitoring API (async)...')
+    print(f"Database: {DATABASE_URL.split('@')[-1]}")
+    print('Local access: http://127.0.0.1:5000')
+    uvicorn.run(app, host='0.0.0.0', port=5000)
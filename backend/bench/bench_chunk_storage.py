@@ -0,0 +1,45 @@
+"""
+Bytes per sample and encode/decode speed of the chunk codec
+
+Run from the repository root: python backend/bench/bench_chunk_storage.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunk_storage import decode_chunk, encode_chunk  # noqa: E402
+
+
+def main():
+    """Bytes per sample and encode/decode speed on synthetic 5-second data"""
+    def series(samples, jitter_us):
+        start = datetime(2024, 1, 1)
+        timestamps = [start + timedelta(seconds=5 * i, microseconds=random.randint(0, jitter_us) if jitter_us else 0)
+                      for i in range(samples)]
+        voltage = [round(230 + random.gauss(0, 2), 1) for _ in range(samples)]
+        current = [round(max(0.0, 5 + random.gauss(0, 0.5)), 3) for _ in range(samples)]
+        trips = [random.random() < 0.001 for _ in range(samples)]
+        return timestamps, voltage, current, trips
+
+    row_bytes = 4 + 50 + 8 + 8 + 1 + 8  # id, transformer_id, voltage, current, trip_status, timestamp
+    print(f"row table: ~{row_bytes} bytes per sample before index overhead")
+    print(f"{'samples':>8} {'timestamps':>14} {'bytes':>8} {'B/sample':>9} {'encode ms':>10} {'decode ms':>10} {'decode us/sample':>17}")
+    for samples in (720, 17280):
+        for label, jitter in (('whole seconds', 0), ('microseconds', 999_999)):
+            columns = series(samples, jitter)
+            start = time.perf_counter()
+            blob = encode_chunk(*columns)
+            encode_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            decoded = decode_chunk(blob)
+            decode_ms = (time.perf_counter() - start) * 1000
+            assert decoded == tuple(columns), 'round trip mismatch'
+            print(f"{samples:>8} {label:>14} {len(blob):>8} {len(blob) / samples:>9.2f} "
+                  f"{encode_ms:>10.2f} {decode_ms:>10.2f} {decode_ms * 1000 / samples:>17.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Encoded size and CPU time of the response codecs on get_readings payloads
+
+Run from the repository root: python backend/bench/bench_compression.py
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compression import brotli, compress_bytes  # noqa: E402
+
+
+def main():
+    """Compare encoded size and CPU time on synthetic get_readings payloads"""
+    def payload(rows):
+        start = datetime(2024, 1, 1)
+        return json.dumps({
+            'transformer_id': 'TX001',
+            'readings': [{
+                'id': i,
+                'transformer_id': 'TX001',
+                'voltage': round(220 + random.uniform(-5, 5), 1),
+                'current': round(5 + random.uniform(-1, 1), 3),
+                'trip_status': False,
+                'timestamp': (start + timedelta(seconds=5 * i)).isoformat(),
+            } for i in range(rows)]
+        }).encode('utf-8')
+
+    settings = [('gzip', 1), ('gzip', 6), ('gzip', 9)]
+    if brotli is not None:
+        settings += [('br', 4), ('br', 11)]
+
+    print(f"{'rows':>6} {'raw B':>9} {'codec':>8} {'enc B':>9} {'ratio':>7} {'ms':>8}")
+    for rows in (50, 500, 1000):
+        data = payload(rows)
+        for codec, level in settings:
+            runs = 20
+            start = time.perf_counter()
+            for _ in range(runs):
+                out = compress_bytes(data, codec, level=level, brotli_quality=level)
+            ms = (time.perf_counter() - start) / runs * 1000
+            print(f"{rows:>6} {len(data):>9} {codec + '-' + str(level):>8} "
+                  f"{len(out):>9} {len(data) / len(out):>6.1f}x {ms:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
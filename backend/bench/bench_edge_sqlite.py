@@ -0,0 +1,107 @@
+"""
+add_reading-style commits: SQLite defaults vs. the edge profile
+
+Run from the repository root: python backend/bench/bench_edge_sqlite.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, \
+    UniqueConstraint, create_engine, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from edge_sqlite import SingleWriter, configure_sqlite, edge_pragmas_from_env  # noqa: E402
+
+
+def main():
+    """add_reading-style commits: SQLite defaults vs. the edge profile"""
+    metadata = MetaData()
+    reading = Table(
+        'reading', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50), nullable=False),
+        Column('voltage', Float, nullable=False),
+        Column('current', Float, nullable=False),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+        UniqueConstraint('transformer_id', 'timestamp'),
+    )
+    start = datetime(2024, 1, 1)
+
+    def row(thread, i):
+        return {'transformer_id': f'TX{thread:03d}', 'voltage': 230.0, 'current': 10.0,
+                'trip_status': False, 'timestamp': start + timedelta(seconds=i)}
+
+    def make_engine(edge):
+        engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/bench.db')
+        if edge:
+            configure_sqlite(engine, {**edge_pragmas_from_env(), 'busy_timeout': 5000})
+        metadata.create_all(engine)
+        return engine
+
+    def direct(engine, threads, per_thread):
+        errors = []
+
+        def work(thread):
+            for i in range(per_thread):
+                try:
+                    with Session(bind=engine) as session:
+                        session.execute(insert(reading).values(row(thread, i)))
+                        session.commit()
+                except Exception as e:
+                    errors.append(e)
+        began = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(work, range(threads)))
+        return time.perf_counter() - began, len(errors)
+
+    def queued(engine, threads, per_thread):
+        writer = SingleWriter(engine, checkpoint_interval=1)
+
+        def work(thread):
+            for i in range(per_thread):
+                writer.run(lambda session, r=row(thread, i): session.execute(insert(reading).values(r)))
+        began = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(work, range(threads)))
+        return time.perf_counter() - began, 0, writer.stats()
+
+    def with_reader(engine, write):
+        """Run `write` while another thread polls the newest readings; returns (write result, read us)"""
+        latencies = []
+        done = threading.Event()
+
+        def poll():
+            with Session(bind=engine) as session:
+                while not done.is_set():
+                    began = time.perf_counter()
+                    session.execute(select(reading).where(reading.c.transformer_id == 'TX000')
+                                    .order_by(reading.c.timestamp.desc()).limit(50)).all()
+                    session.rollback()
+                    latencies.append(time.perf_counter() - began)
+        reader = threading.Thread(target=poll)
+        reader.start()
+        result = write()
+        done.set()
+        reader.join()
+        latencies.sort()
+        return result, latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+    for threads, per_thread in ((1, 1000), (8, 250)):
+        total = threads * per_thread
+        print(f"{threads} writer thread(s), {total} commits, with a dashboard reader polling:")
+        for name, edge, run in (('default', False, direct), ('edge', True, direct), ('edge + single writer', True, queued)):
+            engine = make_engine(edge)
+            result, p50, p99 = with_reader(engine, lambda: run(engine, threads, per_thread))
+            extra = f", {result[2]['jobs_per_commit']} per commit" if len(result) > 2 else f", {result[1]} errors"
+            print(f"  {name:<21} {total / result[0]:6.0f} commits/s{extra}; read p50 {p50:6.0f} us p99 {p99:7.0f} us")
+
+
+if __name__ == '__main__':
+    main()
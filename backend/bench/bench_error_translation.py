@@ -0,0 +1,71 @@
+"""
+Previous per-request regex loop vs. the compiled error translation engine
+
+Run from the repository root: python backend/bench/bench_error_translation.py
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from error_translation import ErrorTranslator, translator  # noqa: E402
+
+
+def main():
+    """Compare the previous per-request regex loop with the compiled engine"""
+    legacy_rules = {
+        r"SyntaxError: invalid syntax": "Syntax Error: There's a mistake in your code structure. Check for missing colons (:), parentheses, or quotes.",
+        r"IndentationError: expected an indented block": "Indentation Error: Python needs proper spacing. After lines ending with ':', the next line should be indented (4 spaces).",
+        r"IndentationError: unindent does not match any outer indentation level": "Indentation Error: Your spacing doesn't match. Make sure all lines at the same level have the same indentation.",
+        r"NameError: name '(.+?)' is not defined": r"Variable Error: The variable '\1' hasn't been created yet. Make sure you define it before using it.",
+        r"TypeError: unsupported operand type\(s\) for (.+?): '(.+?)' and '(.+?)'": r"Type Error: You can't use '\1' with \2 and \3. Make sure both values are compatible types.",
+        r"ZeroDivisionError": "Division Error: You're trying to divide by zero, which isn't allowed in math!",
+        r"IndexError: list index out of range": "List Error: You're trying to access an item that doesn't exist in the list. Check the list length.",
+        r"KeyError: '(.+?)'": r"Dictionary Error: The key '\1' doesn't exist in the dictionary. Check your spelling or add the key first.",
+        r"ValueError: (.+)": r"Value Error: \1. Make sure you're using the right type of value.",
+        r"AttributeError: '(.+?)' object has no attribute '(.+?)'": r"Attribute Error: \1 doesn't have a '\2' method or property. Check the documentation for available methods.",
+    }
+
+    def legacy(error_msg):
+        friendly = error_msg
+        for pattern, replacement in legacy_rules.items():
+            friendly = re.sub(pattern, replacement, friendly, flags=re.IGNORECASE)
+        return friendly
+
+    def traceback_text(frames):
+        lines = ['Traceback (most recent call last):']
+        for i in range(frames):
+            lines.append(f'  File "<main>", line {i + 2}, in f')
+            lines.append('    return f(n - 1) + values[n]')
+        lines.append("NameError: name 'values' is not defined")
+        return '\n'.join(lines)
+
+    print(f"{'frames':>7} {'bytes':>8} {'legacy us':>10} {'engine us':>10} {'speedup':>8}")
+    for frames in (1, 10, 100, 1000):
+        text = traceback_text(frames)
+        runs = max(20, 20000 // frames)
+        timings = []
+        for fn in (legacy, translator.translate):
+            start = time.perf_counter()
+            for _ in range(runs):
+                fn(text)
+            timings.append((time.perf_counter() - start) / runs * 1e6)
+        print(f"{frames:>7} {len(text):>8} {timings[0]:>10.1f} {timings[1]:>10.1f} "
+              f"{timings[0] / timings[1]:>7.1f}x")
+
+    # Rule table size: pad the table with unrelated types and time again
+    text = traceback_text(10)
+    for extra in (0, 1000):
+        padded = ErrorTranslator(
+            [{'type': f'Custom{i}Error', 'pattern': f'custom {i} (.+)', 'message': r'\1'} for i in range(extra)]
+            + [{'type': 'NameError', 'pattern': "name '(.+?)' is not defined", 'message': r'\1'}]
+        )
+        start = time.perf_counter()
+        for _ in range(20000):
+            padded.translate(text)
+        print(f"{extra + 1:>5} rules: {(time.perf_counter() - start) / 20000 * 1e6:.1f} us per translation")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Fleet forecast fit time, accuracy and bulk history loading
+
+Run from the repository root: python backend/bench/bench_forecasting.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, create_engine, insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from forecasting import _EPOCH, _fit, fit_fleet, history_matrices, hourly_history  # noqa: E402
+
+
+def main():
+    """Fit time for 10k transformers x 28 days, accuracy vs. a naive forecast, and bulk history loading"""
+    rng = np.random.default_rng(1)
+    transformers, days = 10000, 29  # 28 days of history + 1 day to score against
+    hour_of_day = np.arange(days * 24) % 24
+    daily_shape = 1 + 0.5 * np.sin((hour_of_day - 13) / 24 * 2 * np.pi)
+    base = rng.uniform(2, 9, size=(transformers, 1))
+    growth = rng.normal(0, 0.02, size=(transformers, 1)) * np.arange(days * 24) / 24
+    load = np.maximum(base * daily_shape + growth + rng.normal(0, 0.4, size=(transformers, days * 24)), 0)
+    load[rng.random(load.shape) < 0.05] = np.nan  # missed readings
+    peak = load * rng.uniform(1.05, 1.3, size=load.shape)
+    history, actual = load[:, :-24], load[:, -24:]
+
+    began = time.perf_counter()
+    forecast, spread, _, _ = fit_fleet(history, peak[:, :-24], workers=1)
+    single = time.perf_counter() - began
+    workers = min(max(os.cpu_count() or 1, 2), 8)
+    began = time.perf_counter()
+    fit_fleet(history, peak[:, :-24], workers=workers)
+    pooled = time.perf_counter() - began
+    print(f"fit {transformers} transformers x {days - 1} days: {single * 1000:.0f} ms in one process, "
+          f"{pooled * 1000:.0f} ms with {workers} processes (including pool start-up)")
+
+    began = time.perf_counter()
+    for row in range(0, transformers, 10):
+        _fit(history[row:row + 1], 0.3)
+    loop = (time.perf_counter() - began) * 10
+    print(f"one transformer at a time (extrapolated): {loop * 1000:.0f} ms")
+
+    mask = ~np.isnan(actual)
+    naive = history[:, -24:]  # same hour yesterday
+    both = mask & ~np.isnan(naive)
+    print(f"next-day MAE: model {np.abs(forecast - actual)[mask].mean():.3f} A, "
+          f"same hour yesterday {np.abs(naive - actual)[both].mean():.3f} A")
+
+    reading = Table(
+        'reading', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50)),
+        Column('current', Float),
+        Column('voltage', Float),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+    )
+    engine = create_engine('sqlite://')
+    reading.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(reading), [
+            {'transformer_id': f'TX{t:05d}', 'current': float(c), 'voltage': 230.0, 'trip_status': False,
+             'timestamp': start + timedelta(minutes=15 * i)}
+            for t in range(transformers) for i, c in enumerate(np.nan_to_num(load[t, :24].repeat(4)))
+        ])
+    with Session(engine) as session:
+        began = time.perf_counter()
+        loaded = hourly_history(session, reading, None, start, start + timedelta(days=1))
+        ids, mean, _ = history_matrices(loaded, int((start - _EPOCH).total_seconds()) // 3600, 24)
+        print(f"bulk load of {transformers * 96} readings into a {mean.shape[0]} x {mean.shape[1]} matrix: "
+              f"{(time.perf_counter() - began) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
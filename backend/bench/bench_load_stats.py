@@ -0,0 +1,68 @@
+"""
+Ingest cost of the online load statistics and the SQL ranking they replace
+
+Run from the repository root: python backend/bench/bench_load_stats.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, create_engine, func, \
+    insert, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from load_stats import LoadStats  # noqa: E402
+
+
+def main():
+    """Ingest cost per reading, top-K over 10k transformers, and the SQL it replaces"""
+    stats = LoadStats()
+    start = datetime(2024, 1, 1)
+    transformers = [f'TX{i:05d}' for i in range(10000)]
+    load = {tid: random.uniform(2, 12) for tid in transformers}
+    readings = [
+        (tid, 230 + random.gauss(0, 3), max(0.0, load[tid] + random.gauss(0, 1)), random.random() < 0.001,
+         start + timedelta(seconds=30 * i))
+        for i in range(20) for tid in transformers
+    ]
+    began = time.perf_counter()
+    for reading in readings:
+        stats.add(*reading)
+    per_reading = (time.perf_counter() - began) / len(readings) * 1e6
+    print(f"ingest: {per_reading:.2f} us per reading; {stats.stats()['approx_bytes'] / 10000:.0f} bytes per transformer")
+
+    began = time.perf_counter()
+    for _ in range(10):
+        stats.top(10, 'utilization')
+    print(f"top-10 by utilization over 10k transformers: {(time.perf_counter() - began) / 10 * 1000:.1f} ms")
+
+    reading = Table(
+        'reading', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50)),
+        Column('voltage', Float),
+        Column('current', Float),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+    )
+    engine = create_engine('sqlite://')
+    reading.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(reading), [
+            {'transformer_id': tid, 'voltage': v, 'current': c, 'trip_status': t, 'timestamp': ts}
+            for tid, v, c, t, ts in readings
+        ])
+    with Session(engine) as session:
+        began = time.perf_counter()
+        session.execute(
+            select(reading.c.transformer_id, func.avg(reading.c.current).label('mean'))
+            .group_by(reading.c.transformer_id).order_by(func.avg(reading.c.current).desc()).limit(10)
+        ).all()
+        print(f"same ranking as GROUP BY over {len(readings)} readings: {(time.perf_counter() - began) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
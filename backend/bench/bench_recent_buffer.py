@@ -0,0 +1,75 @@
+"""
+Recent-readings buffer vs. the indexed SQLite query it replaces
+
+Run from the repository root: python backend/bench/bench_recent_buffer.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, \
+    UniqueConstraint, create_engine, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recent_buffer import RecentReadings  # noqa: E402
+
+
+def main():
+    """Buffered reads vs. the indexed SQLite query they replace"""
+    metadata = MetaData()
+    reading = Table(
+        'reading', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50), nullable=False),
+        Column('voltage', Float, nullable=False),
+        Column('current', Float, nullable=False),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+        UniqueConstraint('transformer_id', 'timestamp'),
+    )
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    transformers = [f'TX{i:03d}' for i in range(100)]
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(reading), [
+            {'transformer_id': tx, 'voltage': 230.0 + i % 5, 'current': 10.0 + i % 3,
+             'trip_status': False, 'timestamp': start + timedelta(seconds=10 * i)}
+            for tx in transformers for i in range(500)
+        ])
+
+    columns = [reading.c[f] for f in ('id', 'transformer_id', 'voltage', 'current', 'trip_status', 'timestamp')]
+
+    def load(session, transformer_id, limit):
+        return session.execute(
+            select(*columns).where(reading.c.transformer_id == transformer_id)
+            .order_by(reading.c.timestamp.desc()).limit(limit)
+        ).all()
+
+    buffer = RecentReadings(capacity=100)
+    with Session(engine) as session:
+        began = time.perf_counter()
+        buffer.warm(transformers, lambda tx, n: load(session, tx, n))
+        print(f"warm {len(transformers)} transformers: {(time.perf_counter() - began) * 1000:.1f} ms")
+        for limit in (1, 25, 50):
+            runs = 2000
+            began = time.perf_counter()
+            for i in range(runs):
+                load(session, transformers[i % 100], limit)
+            db_us = (time.perf_counter() - began) / runs * 1e6
+            began = time.perf_counter()
+            for i in range(runs):
+                buffer.read(transformers[i % 100], limit, None)
+            ring_us = (time.perf_counter() - began) / runs * 1e6
+            print(f"limit {limit:>3}: database {db_us:7.1f} us  buffer {ring_us:6.1f} us  ({db_us / ring_us:.0f}x)")
+        began = time.perf_counter()
+        for i in range(100000):
+            buffer.add('TX000', (i, 'TX000', 230.0, 10.0, False, start + timedelta(days=1, seconds=i)))
+        print(f"add: {(time.perf_counter() - began) / 100000 * 1e6:.2f} us per reading")
+    print(buffer.stats())
+
+
+if __name__ == '__main__':
+    main()
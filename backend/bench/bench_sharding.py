@@ -0,0 +1,81 @@
+"""
+Hash ring balance and scatter-gather over SQLite shard files
+
+Run from the repository root: python backend/bench/bench_sharding.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, UniqueConstraint, \
+    func, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sharding import HashRing, ShardRouter  # noqa: E402
+
+
+def main():
+    """Key balance, keys moved when adding a shard, and parallel scatter-gather on SQLite files"""
+    keys = [f'TX{i:05d}' for i in range(20000)]
+    for shards in (2, 4, 8):
+        ring = HashRing([f'shard{i}' for i in range(shards)])
+        counts = {}
+        for key in keys:
+            counts[ring.owner(key)] = counts.get(ring.owner(key), 0) + 1
+        grown = HashRing([f'shard{i}' for i in range(shards + 1)])
+        moved = sum(ring.owner(key) != grown.owner(key) for key in keys)
+        print(f"{shards} shards: keys per shard {min(counts.values())}-{max(counts.values())} "
+              f"(ideal {len(keys) // shards}); adding one moves {moved / len(keys):.1%} "
+              f"(ideal {1 / (shards + 1):.1%})")
+
+    reading = Table(
+        'reading', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50), nullable=False),
+        Column('voltage', Float, nullable=False),
+        Column('current', Float, nullable=False),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+        UniqueConstraint('transformer_id', 'timestamp', name='uq_reading_transformer_timestamp'),
+    )
+    directory = tempfile.mkdtemp()
+    router = ShardRouter(
+        [(f'shard{i}', f'sqlite:///{os.path.join(directory, f"shard{i}.db")}') for i in range(4)], reading
+    )
+    router.create_all()
+    start = datetime(2024, 1, 1)
+    transformers = [f'TX{i:04d}' for i in range(400)]
+    for shard, ids in router.group(transformers).items():
+        with router.session(shard=shard) as session:
+            session.execute(insert(router.table), [
+                {'transformer_id': tx, 'voltage': 230.0, 'current': 10.0, 'trip_status': i % 97 == 0,
+                 'timestamp': start + timedelta(seconds=30 * i)}
+                for tx in ids for i in range(1000)
+            ])
+
+    def outages(session):
+        return session.execute(
+            select(router.table.c.transformer_id, func.count())
+            .where(router.table.c.trip_status.is_(True))
+            .group_by(router.table.c.transformer_id)
+        ).all()
+
+    router.scatter(outages)
+    began = time.perf_counter()
+    for shard in router.shards.values():
+        with Session(bind=shard.engine) as session:
+            outages(session)
+    sequential = time.perf_counter() - began
+    began = time.perf_counter()
+    router.scatter(outages)
+    parallel = time.perf_counter() - began
+    print(f"fleet outage count over 400k readings on 4 shards: sequential {sequential * 1000:.0f} ms, "
+          f"scatter-gather {parallel * 1000:.0f} ms")
+    router.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Content-negotiated response compression (gzip, and Brotli when installed)
+
+Registered as an after_request hook. JSON, CSV and NDJSON bodies above
+COMPRESS_MIN_SIZE are compressed according to the client's Accept-Encoding.
+Streamed (generator) responses are compressed chunk by chunk with a sync
+flush, so each chunk reaches the client as soon as it is produced.
+
+Request bodies sent with Content-Encoding: gzip are decompressed
+before the view reads them, up to MAX_REQUEST_BODY bytes, so batch uploads
+(e.g. from gateway.py) can be compressed too.
+
+Run `python bench/bench_compression.py` for a bytes / CPU comparison on typical
+get_readings payloads.
+"""
+import gzip
+import io
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'application/x-ndjson', 'text/plain'}
+
+# Largest decompressed request body accepted (guards against zip bombs)
+MAX_REQUEST_BODY = int(os.getenv('COMPRESS_MAX_REQUEST_BODY', str(32 * 1024 * 1024)))
+
+
+def _parse_accept_encoding(header):
+    """Return {coding: q} from an Accept-Encoding header"""
+    codings = {}
+    for part in header.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        coding, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(header, brotli_available=None):
+    """Pick 'br', 'gzip' or None for an Accept-Encoding header"""
+    if brotli_available is None:
+        brotli_available = brotli is not None
+    codings = _parse_accept_encoding(header or '')
+    wildcard = codings.get('*', 0.0)
+    candidates = ['br', 'gzip'] if brotli_available else ['gzip']
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress_bytes(data, encoding, level=6, brotli_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, encoding, level=6, brotli_quality=4):
+    """Compress an iterable of byte/str chunks, flushing after each chunk"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def decompress_body(data, encoding, limit=MAX_REQUEST_BODY):
+    """
+    Decode a request body sent with Content-Encoding `encoding`. Raises
+    ValueError for an unsupported coding, corrupt data or a body that
+    expands beyond `limit` bytes.
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ('', 'identity'):
+        return data
+    if encoding not in ('gzip', 'x-gzip'):
+        raise ValueError(f'unsupported Content-Encoding: {encoding}')
+    try:
+        body = zlib.decompressobj(31).decompress(data, limit + 1)
+    except zlib.error as e:
+        raise ValueError(f'invalid gzip body: {e}') from None
+    if len(body) > limit:
+        raise ValueError(f'decompressed body larger than {limit} bytes')
+    return body
+
+
+class DecompressRequestMiddleware:
+    """ASGI middleware decoding compressed request bodies (FastAPI app)"""
+
+    def __init__(self, app, limit=MAX_REQUEST_BODY):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        headers = [(k, v) for k, v in scope['headers'] if k != b'content-encoding']
+        encoding = next((v.decode('latin-1') for k, v in scope['headers'] if k == b'content-encoding'), '')
+        if encoding.strip().lower() in ('', 'identity'):
+            return await self.app(scope, receive, send)
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        try:
+            body = decompress_body(b''.join(chunks), encoding, self.limit)
+        except ValueError as e:
+            from starlette.responses import JSONResponse
+            return await JSONResponse({'error': str(e)}, status_code=400)(scope, receive, send)
+
+        headers = [(k, v) for k, v in headers if k != b'content-length']
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        await self.app(dict(scope, headers=headers), replay, send)
+
+
+def init_request_decompression(app):
+    """Register a before_request hook decoding compressed request bodies"""
+    from flask import jsonify, request
+
+    @app.before_request
+    def decompress_request():
+        encoding = request.headers.get('Content-Encoding', '')
+        if encoding.strip().lower() in ('', 'identity'):
+            return None
+        try:
+            body = decompress_body(request.get_data(cache=False), encoding)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        request.environ['wsgi.input'] = io.BytesIO(body)
+        request.environ['CONTENT_LENGTH'] = str(len(body))
+        request.environ.pop('HTTP_CONTENT_ENCODING', None)
+        # Drop the cached stream so get_json() reads the decoded body
+        request.__dict__.pop('stream', None)
+        return None
+
+
+def init_compression(app):
+    """
+    Register the compression hook on a Flask app. Settings come from the
+    environment: COMPRESS_ENABLED, COMPRESS_LEVEL (gzip 1-9),
+    COMPRESS_BROTLI_QUALITY (0-11) and COMPRESS_MIN_SIZE (bytes).
+    """
+    enabled = os.getenv('COMPRESS_ENABLED', 'true').lower() != 'false'
+    level = int(os.getenv('COMPRESS_LEVEL', '6'))
+    brotli_quality = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+    min_size = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+
+    init_request_decompression(app)
+    if not enabled:
+        return
+
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level, brotli_quality)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            response.set_data(compress_bytes(body, encoding, level, brotli_quality))
+
+        response.headers['Content-Encoding'] = encoding
+        # The representation changed, so a strong validator no longer applies
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,161 @@
+"""
+Read replica routing for the monitoring API
+
+Read-only endpoints run their queries through ReplicaRouter.run_read(), which
+picks a healthy replica (round robin) and falls back to the primary when no
+replica is available or the query fails with a connection error. Writes keep
+using db.session on the primary.
+
+Read-your-writes: after a write, mark_write(key) pins reads for that key
+(a transformer_id, or REGISTRY_KEY for the transformer list) to the primary
+for DB_REPLICA_LAG_WINDOW seconds, so a client never reads back older data
+than it just wrote, and the response cache is never refilled from a lagging
+replica.
+
+Configuration:
+    DB_REPLICA_HOSTS       comma-separated replica hosts (same user/password/
+                           database as the primary) or full SQLAlchemy URIs,
+                           e.g. "sqlite:///replica1.db,sqlite:///replica2.db"
+    DB_REPLICA_LAG_WINDOW  seconds reads stay on the primary after a write (2)
+    DB_REPLICA_RETRY       seconds before a failed replica is re-checked (10)
+"""
+import itertools
+import logging
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Key used by mark_write()/run_read() for the transformer registry
+REGISTRY_KEY = '__registry__'
+
+
+def replica_uris_from_hosts(hosts, user, password, database):
+    """Turn a DB_REPLICA_HOSTS value into a list of SQLAlchemy URIs"""
+    uris = []
+    for host in hosts.split(','):
+        host = host.strip()
+        if not host:
+            continue
+        if '://' in host:
+            uris.append(host)
+        else:
+            uris.append(f'mysql://{user}:{password}@{host}/{database}')
+    return uris
+
+
+class Replica:
+    def __init__(self, uri, engine):
+        self.uri = uri
+        self.engine = engine
+        self.healthy = True
+        self.failed_at = 0.0
+        self.failures = 0
+
+    @property
+    def name(self):
+        # Hide credentials in status output
+        return self.uri.split('@')[-1]
+
+
+class ReplicaRouter:
+    """Routes read-only queries to replicas with health checks and failover"""
+
+    def __init__(self, db, replica_uris=(), lag_window=2.0, retry_interval=10.0, engine_options=None):
+        self.db = db
+        self.lag_window = lag_window
+        self.retry_interval = retry_interval
+        options = {'pool_pre_ping': True, 'pool_recycle': 3600}
+        options.update(engine_options or {})
+        self.replicas = [Replica(uri, create_engine(uri, **options)) for uri in replica_uris]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._recent_writes = {}  # key -> monotonic time of last write
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failovers = 0
+
+    def mark_write(self, *keys):
+        """Pin reads for these keys to the primary for the lag window"""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._recent_writes[key] = now
+            if len(self._recent_writes) > 10000:
+                cutoff = now - self.lag_window
+                self._recent_writes = {k: t for k, t in self._recent_writes.items() if t > cutoff}
+
+    def _recently_written(self, key):
+        if key is None:
+            return False
+        written_at = self._recent_writes.get(key)
+        return written_at is not None and time.monotonic() - written_at < self.lag_window
+
+    def _check(self, replica):
+        try:
+            with replica.engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            return True
+        except Exception:
+            return False
+
+    def _mark_failed(self, replica, error):
+        with self._lock:
+            replica.healthy = False
+            replica.failed_at = time.monotonic()
+            replica.failures += 1
+        logger.warning(f"Replica {replica.name} marked unhealthy: {error}")
+
+    def _pick_replica(self):
+        """Next healthy replica, re-checking failed ones after retry_interval"""
+        if self._cycle is None:
+            return None
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._cycle)
+            if replica.healthy:
+                return replica
+            if time.monotonic() - replica.failed_at >= self.retry_interval:
+                if self._check(replica):
+                    replica.healthy = True
+                    logger.info(f"Replica {replica.name} is healthy again")
+                    return replica
+                replica.failed_at = time.monotonic()
+        return None
+
+    def run_read(self, fn, key=None):
+        """
+        Call fn(session) on a replica session, or on the primary session when
+        there is no healthy replica, the key was written recently, or the
+        replica fails with a database/connection error.
+        """
+        replica = None if self._recently_written(key) else self._pick_replica()
+        if replica is not None:
+            session = Session(bind=replica.engine)
+            try:
+                result = fn(session)
+                self.replica_reads += 1
+                return result
+            except DBAPIError as e:
+                self._mark_failed(replica, e)
+                self.failovers += 1
+            finally:
+                session.close()
+
+        self.primary_reads += 1
+        return fn(self.db.session)
+
+    def status(self):
+        return {
+            'replicas': [
+                {'host': r.name, 'healthy': r.healthy, 'failures': r.failures}
+                for r in self.replicas
+            ],
+            'replica_reads': self.replica_reads,
+            'primary_reads': self.primary_reads,
+            'failovers': self.failovers,
+        }
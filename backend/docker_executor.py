@@ -1,25 +1,125 @@
 import docker
 import asyncio
-import tempfile
+import codecs
+import concurrent.futures
+import contextlib
 import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Tuple
 import logging
 
+from docker.utils.socket import STDOUT, frames_iter
+
 logger = logging.getLogger(__name__)
 
+# `timeout --verbose` reports on stderr when it kills the program; exit codes
+# can't tell a timeout from an out-of-memory kill or sys.exit(124)
+TIMEOUT_NOTICE = b"timeout: sending signal "
+KILLED_EXIT_CODE = 137
+
+class _OutputForwarder:
+    """
+    Hands output frames from the exec thread to an async emit(name, text) on
+    the event loop, one at a time, so a slow consumer stops the socket reads
+    and in turn pauses the program
+    """
+
+    def __init__(self, loop, emit, limit=None):
+        self.loop = loop
+        self.emit = emit
+        self.limit = limit
+        self.written = 0
+        self.exceeded = False
+        self.closed = False
+        self._decoders = {}
+
+    def forward(self, stream_id, data: bytes) -> bool:
+        """Called on the exec thread; returns False once reading should stop"""
+        if self.limit is not None and self.written + len(data) > self.limit:
+            data = data[:self.limit - self.written]
+            self.exceeded = True
+        self.written += len(data)
+        name = "stdout" if stream_id == STDOUT else "stderr"
+        decoder = self._decoders.setdefault(name, codecs.getincrementaldecoder("utf-8")(errors="replace"))
+        text = decoder.decode(data)
+        if text and not self.closed:
+            pending = asyncio.run_coroutine_threadsafe(self.emit(name, text), self.loop)
+            while True:
+                try:
+                    pending.result(timeout=0.5)
+                    break
+                except concurrent.futures.TimeoutError:
+                    if self.closed:
+                        pending.cancel()
+                        break
+        return not (self.exceeded or self.closed)
+
+    def close(self):
+        """Called on the event loop when the run is over, timed out or cancelled"""
+        self.closed = True
+
+class _PooledContainer:
+    def __init__(self, container):
+        self.container = container
+        self.uses = 0
+
 class DockerExecutor:
-    def __init__(self):
+    """
+    Runs code in pre-started, network-disabled, memory-capped containers.
+
+    All docker-py calls are blocking, so they run on a dedicated thread pool
+    instead of the event loop. Containers idle in `sleep infinity` until a
+    job arrives, receive the code on the stdin of an `exec` running
+    `python -` (argv is capped at ~128 KB per argument), and are replaced in the
+    background after `max_uses` runs or any failure. A semaphore caps how
+    many executions run at once.
+    """
+
+    def __init__(self, client_factory=None, pool_size=None, max_concurrency=None, max_uses=None,
+                 mem_limit="128m"):
+        # client_factory lets tests pass a fake docker client
+        self._client_factory = client_factory or docker.from_env
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv("DOCKER_POOL_SIZE", "2"))
+        self.max_concurrency = max_concurrency or int(os.getenv("DOCKER_MAX_CONCURRENCY", "4"))
+        self.max_uses = max_uses or int(os.getenv("DOCKER_CONTAINER_MAX_USES", "1"))
+        self.mem_limit = mem_limit
         self.client = None
         self.image_name = "python-ide-executor"
         self._initialized = False
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.max_concurrency + self.pool_size + 1,
+            thread_name_prefix="docker"
+        )
+        self._semaphore = None
+        self._idle = None
+        self._background = set()
+
+    async def _call(self, fn, *args, **kwargs):
+        """Run a blocking docker-py call off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._threads, partial(fn, *args, **kwargs))
 
-    async def initialize(self):
-        """Initialize Docker client and build execution image"""
+    async def initialize(self, tracker=None):
+        """
+        Initialize Docker client, build execution image and warm the container pool.
+        `tracker` (a startup.StartupTracker) records the timing of each step.
+        """
+        step = tracker.step if tracker is not None else (lambda name: contextlib.nullcontext())
         try:
-            self.client = docker.from_env()
-            await self._build_execution_image()
+            with step("docker.client"):
+                self.client = await self._call(self._client_factory)
+            with step("docker.image"):
+                await self._build_execution_image()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._idle = asyncio.Queue()
+            with step("docker.containers"):
+                containers = await asyncio.gather(*(self._start_container() for _ in range(self.pool_size)))
+            for pooled in containers:
+                self._idle.put_nowait(pooled)
             self._initialized = True
-            logger.info("Docker executor initialized successfully")
+            logger.info(f"Docker executor initialized with {self.pool_size} warm containers")
         except Exception as e:
             logger.warning(f"Docker not available: {e}")
             self._initialized = False
@@ -29,7 +129,7 @@ class DockerExecutor:
         try:
             # Check if image exists
             try:
-                self.client.images.get(self.image_name)
+                await self._call(self.client.images.get, self.image_name)
                 logger.info(f"Docker image {self.image_name} already exists")
                 return
             except docker.errors.ImageNotFound:
@@ -39,7 +139,8 @@ class DockerExecutor:
             dockerfile_path = os.path.join(os.path.dirname(__file__), "Dockerfile.execution")
             if os.path.exists(dockerfile_path):
                 logger.info(f"Building Docker image {self.image_name}")
-                self.client.images.build(
+                await self._call(
+                    self.client.images.build,
                     path=os.path.dirname(__file__),
                     dockerfile="Dockerfile.execution",
                     tag=self.image_name
@@ -52,63 +153,170 @@ class DockerExecutor:
             logger.error(f"Failed to build Docker image: {e}")
             self.image_name = "python:3.11-slim"
 
-    async def execute_code(self, code: str, timeout: int = 10) -> Tuple[str, str]:
+    async def _start_container(self) -> _PooledContainer:
+        container = await self._call(
+            self.client.containers.run,
+            self.image_name,
+            ["sleep", "infinity"],
+            detach=True,
+            mem_limit=self.mem_limit,       # Limit memory to 128MB
+            memswap_limit=self.mem_limit,   # ...without swap on top
+            cpu_quota=50000,                # Limit CPU to 50% of one core
+            pids_limit=64,                  # No fork bombs
+            network_disabled=True,          # Disable network access
+            read_only=True,                 # Only /tmp is writable
+            tmpfs={"/tmp": "size=16m"},
+            working_dir="/tmp",
+            user="1000:1000",               # Run as non-root user
+            auto_remove=True
+        )
+        return _PooledContainer(container)
+
+    async def _acquire(self) -> _PooledContainer:
+        try:
+            return self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            # Pool drained faster than it refills: start one on demand
+            return await self._start_container()
+
+    def _release(self, pooled: _PooledContainer, reusable: bool):
+        pooled.uses += 1
+        if reusable and pooled.uses < self.max_uses:
+            self._idle.put_nowait(pooled)
+            return
+
+        async def recycle():
+            try:
+                await self._call(pooled.container.remove, force=True)
+            except Exception as e:
+                logger.warning(f"Failed to remove container: {e}")
+            if self._idle.qsize() < self.pool_size:
+                try:
+                    self._idle.put_nowait(await self._start_container())
+                except Exception as e:
+                    logger.error(f"Failed to start replacement container: {e}")
+
+        task = asyncio.create_task(recycle())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _exec(self, container, cmd, stdin: bytes, forwarder=None):
         """
-        Execute Python code in a Docker container
-        Returns (stdout, stderr)
+        Run cmd in the container with stdin as its input; returns (exit code,
+        (stdout, stderr)). Output frames also go to `forwarder`, except the
+        timeout notice; the exit code is None if the forwarder stopped the read.
+        """
+        api = self.client.api
+        exec_id = api.exec_create(container.id, cmd, stdin=True, user="1000:1000", workdir="/tmp")["Id"]
+        sock = api.exec_start(exec_id, socket=True)
+        output = {"stdout": [], "stderr": []}
+        stopped = False
+        try:
+            raw = getattr(sock, "_sock", sock)
+            raw.sendall(stdin)
+            raw.shutdown(socket.SHUT_WR)  # EOF: python starts running the script
+            for stream_id, data in frames_iter(sock, tty=False):
+                output["stdout" if stream_id == STDOUT else "stderr"].append(data)
+                if forwarder is None or (stream_id != STDOUT and data.startswith(TIMEOUT_NOTICE)):
+                    continue
+                if not forwarder.forward(stream_id, data):
+                    stopped = True
+                    break
+        finally:
+            sock.close()
+        exit_code = None if stopped else api.exec_inspect(exec_id)["ExitCode"]
+        return exit_code, (b"".join(output["stdout"]), b"".join(output["stderr"]))
+
+    async def execute_code(self, code: str, timeout: int = 10, emit=None,
+                           output_limit=None) -> Tuple[str, str]:
+        """
+        Execute Python code in a pooled Docker container
+        Returns (stdout, stderr). With `emit`, output is also streamed:
+        `await emit("stdout" | "stderr", text)` is called as it arrives, and
+        the program is stopped once it writes more than `output_limit` bytes.
         """
         if not self._initialized or not self.client:
             raise RuntimeError("Docker executor not initialized")
 
-        # Create temporary file with code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp_file:
-            tmp_file.write(code)
-            tmp_file_path = tmp_file.name
+        timeout_message = f"Execution timed out after {timeout} seconds. Your code might have an infinite loop."
 
-        try:
-            # Run code in Docker container
-            result = self.client.containers.run(
-                self.image_name,
-                f"python {os.path.basename(tmp_file_path)}",
-                volumes={os.path.dirname(tmp_file_path): {'bind': '/app', 'mode': 'ro'}},
-                working_dir="/app",
-                mem_limit="128m",  # Limit memory to 128MB
-                cpu_quota=50000,   # Limit CPU to 50% of one core
-                network_disabled=True,  # Disable network access
-                remove=True,       # Auto-remove container
-                timeout=timeout,
-                user="1000:1000",  # Run as non-root user
-                stdout=True,
-                stderr=True,
-                detach=False
-            )
-            
-            # Docker returns combined output, we need to separate stdout/stderr
-            output = result.decode('utf-8', errors='replace').strip()
-            return output, ""
-            
-        except docker.errors.ContainerError as e:
-            # Container ran but exited with non-zero code
-            stdout = e.result.attrs.get('Output', b'').decode('utf-8', errors='replace').strip()
-            stderr = str(e).strip()
-            return stdout, stderr
-            
-        except docker.errors.APIError as e:
-            return "", f"Docker API error: {str(e)}"
-            
-        except Exception as e:
-            return "", f"Execution error: {str(e)}"
-            
-        finally:
-            # Clean up temporary file
+        async with self._semaphore:
+            try:
+                pooled = await self._acquire()
+            except docker.errors.APIError as e:
+                return "", f"Docker API error: {str(e)}"
+            except Exception as e:
+                return "", f"Execution error: {str(e)}"
+
+            reusable = False
+            forwarder = None
+            python = ["python", "-"]
+            if emit is not None:
+                forwarder = _OutputForwarder(asyncio.get_running_loop(), emit, output_limit)
+                python = ["python", "-u", "-"]  # unbuffered, so output arrives as it is printed
             try:
-                os.unlink(tmp_file_path)
-            except:
+                exit_code, (stdout, stderr) = await asyncio.wait_for(
+                    self._call(
+                        self._exec,
+                        pooled.container,
+                        ["timeout", "--verbose", "-s", "KILL", str(timeout)] + python,
+                        code.encode("utf-8"),
+                        forwarder
+                    ),
+                    timeout=timeout + 5
+                )
+                stderr = stderr or b""
+                if stderr.rstrip().rpartition(b"\n")[2].startswith(TIMEOUT_NOTICE):
+                    return "", timeout_message
+                if forwarder is not None and forwarder.exceeded:
+                    # Still running: the container is replaced, not reused
+                    return (
+                        stdout[:output_limit].decode('utf-8', errors='replace').strip(),
+                        f"Execution stopped: your program printed more than {output_limit} bytes of output."
+                    )
+                reusable = True
+                stderr = stderr.decode('utf-8', errors='replace').strip()
+                if exit_code == KILLED_EXIT_CODE and not stderr:
+                    stderr = f"Your program was killed, probably for using more than {self.mem_limit} of memory."
+                return (stdout or b"").decode('utf-8', errors='replace').strip(), stderr
+
+            except asyncio.TimeoutError:
+                return "", timeout_message
+
+            except docker.errors.APIError as e:
+                return "", f"Docker API error: {str(e)}"
+
+            except Exception as e:
+                return "", f"Execution error: {str(e)}"
+
+            finally:
+                if forwarder is not None:
+                    forwarder.close()
+                self._release(pooled, reusable)
+
+    async def shutdown(self):
+        """Remove pooled containers"""
+        if not self._initialized:
+            return
+        self._initialized = False
+        while not self._idle.empty():
+            pooled = self._idle.get_nowait()
+            try:
+                await self._call(pooled.container.remove, force=True)
+            except Exception:
                 pass
 
     def is_available(self) -> bool:
         """Check if Docker executor is available"""
         return self._initialized and self.client is not None
 
+    def stats(self) -> dict:
+        return {
+            "available": self.is_available(),
+            "image": self.image_name,
+            "warm_containers": self._idle.qsize() if self._idle is not None else 0,
+            "max_concurrency": self.max_concurrency
+        }
+
 # Global instance
 docker_executor = DockerExecutor()
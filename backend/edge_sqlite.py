@@ -0,0 +1,189 @@
+"""
+Embedded SQLite profile for edge / substation servers (app_demo.py)
+
+With default settings every add_reading commit rewrites the rollback journal
+and fsyncs twice, and a writer locks out readers for the whole commit. The
+edge profile instead:
+
+- runs the database in WAL mode: readers never block the writer or each
+  other, and a commit is one sequential append to the -wal file
+- sets synchronous=NORMAL: the WAL is fsynced at checkpoints, not on every
+  commit. A power cut can lose the last few commits but never corrupts the
+  database (devices resend unacknowledged readings, which the unique reading
+  key makes safe)
+- maps the database file (mmap_size) and gives each connection a larger page
+  cache (cache_size), so dashboard reads avoid read() syscalls
+- waits up to busy_timeout ms for a lock instead of raising
+  "database is locked"
+
+Pragmas are applied to every new connection by an engine `connect` event.
+
+All reading inserts go through one SingleWriter thread. Requests queue their
+write as a function of a Session; the thread runs whatever is queued in one
+transaction (group commit) and hands each caller its result. Writes from
+this process therefore never contend for the lock. The same thread
+checkpoints the WAL every SQLITE_CHECKPOINT_INTERVAL seconds (PASSIVE, or
+TRUNCATE once the WAL is larger than SQLITE_WAL_LIMIT), so the WAL stays
+small without a commit ever paying for a checkpoint.
+
+Configuration:
+    SQLITE_PROFILE              edge (default) or default (SQLite defaults, no writer thread)
+    SQLITE_SYNCHRONOUS          NORMAL (FULL for fsync on every commit)
+    SQLITE_MMAP_SIZE            bytes of the file to memory-map (268435456)
+    SQLITE_CACHE_SIZE           page cache per connection, negative = KiB (-65536)
+    SQLITE_BUSY_TIMEOUT         ms to wait for a lock (5000)
+    SQLITE_WAL_AUTOCHECKPOINT   pages; backstop if the writer thread is not running (10000)
+    SQLITE_CHECKPOINT_INTERVAL  seconds between background checkpoints (60)
+    SQLITE_WAL_LIMIT            WAL bytes above which the checkpoint truncates (67108864)
+
+Run one process per database (app_demo.py, or gunicorn -w 1 --threads N):
+each process has its own writer thread.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+WRITER_MAX_BATCH = 256
+
+
+def edge_pragmas_from_env():
+    """PRAGMA settings of the edge profile, or None when SQLITE_PROFILE=default"""
+    if os.getenv('SQLITE_PROFILE', 'edge') != 'edge':
+        return None
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': int(os.getenv('SQLITE_WAL_AUTOCHECKPOINT', '10000')),
+    }
+
+
+def configure_sqlite(engine, pragmas):
+    """Apply `pragmas` to every new connection of a SQLite engine"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def sqlite_settings(engine):
+    """Effective settings of a pooled connection, for /health"""
+    with engine.connect() as connection:
+        return {
+            name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout')
+        }
+
+
+class SingleWriter:
+    """
+    Runs write transactions on one thread. `run(fn)` queues fn(session) and
+    returns its result once committed; queued functions are committed
+    together. If a group fails, each function is retried in its own
+    transaction so only the failing caller sees the error.
+    """
+
+    def __init__(self, engine, checkpoint_interval=60, wal_limit=64 * 1024 * 1024, max_batch=WRITER_MAX_BATCH):
+        self.engine = engine
+        self.checkpoint_interval = checkpoint_interval
+        self.wal_limit = wal_limit
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.commits = 0
+        self.checkpoints = 0
+        self.last_checkpoint = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn):
+        """Queue fn(session); returns a Future for its result"""
+        self.start()
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def run(self, fn, timeout=30):
+        return self.submit(fn).result(timeout)
+
+    def _loop(self):
+        next_checkpoint = time.monotonic() + self.checkpoint_interval
+        while True:
+            try:
+                batch = [self._queue.get(timeout=max(next_checkpoint - time.monotonic(), 0.01))]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._commit(batch)
+            if self.checkpoint_interval and time.monotonic() >= next_checkpoint:
+                self.checkpoint()
+                next_checkpoint = time.monotonic() + self.checkpoint_interval
+
+    def _commit(self, batch):
+        with Session(bind=self.engine) as session:
+            try:
+                results = [fn(session) for fn, _ in batch]
+                session.commit()
+                error = None
+            except Exception as e:
+                session.rollback()
+                error = e
+        if error is not None and len(batch) > 1:
+            for job in batch:
+                self._commit([job])
+            return
+        self.jobs += len(batch)
+        if error is not None:
+            batch[0][1].set_exception(error)
+            return
+        self.commits += 1
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def checkpoint(self):
+        """Checkpoint the WAL; truncate it when it has grown past wal_limit"""
+        try:
+            path = self.engine.url.database
+            wal_size = os.path.getsize(f'{path}-wal') if path and os.path.exists(f'{path}-wal') else 0
+            mode = 'TRUNCATE' if wal_size > self.wal_limit else 'PASSIVE'
+            with self.engine.connect() as connection:
+                busy, log_pages, checkpointed = connection.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one()
+            self.checkpoints += 1
+            self.last_checkpoint = {'mode': mode, 'busy': bool(busy), 'wal_pages': log_pages,
+                                    'checkpointed': checkpointed, 'wal_bytes_before': wal_size}
+        except Exception as e:
+            logger.warning(f"WAL checkpoint failed: {e}")
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'jobs': self.jobs,
+            'commits': self.commits,
+            'jobs_per_commit': round(self.jobs / self.commits, 2) if self.commits else 0,
+            'checkpoints': self.checkpoints,
+            'last_checkpoint': self.last_checkpoint,
+        }
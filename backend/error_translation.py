@@ -0,0 +1,183 @@
+"""
+Beginner-friendly translation of Python error output
+
+Rules are loaded from a JSON file (error_rules.json next to this module, or
+ERROR_RULES_PATH) and compiled once at import. Each rule names an exception
+type, an optional regex matched against the start of the exception message
+and a replacement message that can use the regex groups (\\1, \\g<name>).
+Rules for the same type are tried in file order; a rule without a pattern
+matches any message of that type. "tips" gives one tip per exception type,
+either a string or {executor: tip, "default": tip} when the advice depends
+on where the code ran (docker, pool or subprocess).
+
+The exception is the first line after the last `File "...", line N` frame
+that looks like `Name: message` (or a bare ...Error / ...Exception name).
+The lines after it are part of its message (multi-line messages, notes
+added with add_note()). Dotted names such as json.decoder.JSONDecodeError
+are looked up by their last component. Rules are looked up by exception
+type, so the cost of a translation hardly depends on the size of the rule
+table.
+"""
+import json
+import os
+import re
+from typing import NamedTuple, Optional
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'error_rules.json')
+
+_EXCEPTION_LINE = re.compile(r'([A-Za-z_][\w.]*)(?:(:) ?(.*))?')
+_BARE_EXCEPTION_SUFFIXES = ('Error', 'Exception', 'Warning', 'Exit', 'Interrupt', 'StopIteration')
+_FRAME_LINE = re.compile(r'  File ".*", line \d+')
+_TRACEBACK_MARKERS = ('Traceback (most recent call last)', '  File "')
+_GROUP_REF = re.compile(r'\\(?:(\d+)|g<(\w+)>)')
+
+
+class TranslatedError(NamedTuple):
+    type: str
+    message: str
+    tip: Optional[str]
+    line: Optional[int]
+    text: str  # full friendly text: traceback head, message and tip
+
+
+def _compile_template(template):
+    """
+    Split a message template into literal text and group references once, so
+    filling it in is a join rather than re-parsing it (match.expand does)
+    """
+    parts, refs = [], []
+    position = 0
+    for ref in _GROUP_REF.finditer(template):
+        parts.append(template[position:ref.start()])
+        number, name = ref.groups()
+        refs.append(int(number) if number else name)
+        position = ref.end()
+    parts.append(template[position:])
+    return parts, refs
+
+
+def _fill(template, match):
+    parts, refs = template
+    if not refs:
+        return parts[0]
+    pieces = [parts[0]]
+    for ref, literal in zip(refs, parts[1:]):
+        pieces.append(match.group(ref) or '')
+        pieces.append(literal)
+    return ''.join(pieces)
+
+
+class ErrorTranslator:
+    def __init__(self, rules=(), tips=None):
+        self._rules = {}  # exception type -> [(compiled pattern or None, compiled template)]
+        for rule in rules:
+            pattern = rule.get('pattern')
+            compiled = re.compile(pattern) if pattern else None
+            self._rules.setdefault(rule['type'], []).append((compiled, _compile_template(rule['message'])))
+        self._tips = dict(tips or {})
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            table = json.load(f)
+        return cls(table.get('rules', ()), table.get('tips'))
+
+    def __len__(self):
+        return sum(len(rules) for rules in self._rules.values())
+
+    def translate(self, stderr, filename='<main>', executor=None):
+        """
+        Translate interpreter error output. Returns None when the output does
+        not end in an exception (e.g. the program only wrote to stderr).
+        `filename` is the name the user's code ran under, used to find the
+        line number of the innermost user frame; `executor` selects
+        executor-specific tips.
+        """
+        found = _find_exception(stderr.strip())
+        if found is None:
+            return None
+        head, exc_type, exc_message = found
+        short_type = exc_type.rpartition('.')[2]
+        rules = self._rules.get(short_type)
+        if rules is None and not any(marker in head for marker in _TRACEBACK_MARKERS):
+            return None
+
+        message = exc_type + (': ' + exc_message if exc_message else '')
+        for pattern, template in rules or ():
+            rule_match = pattern.match(exc_message) if pattern is not None else None
+            if pattern is not None and rule_match is None:
+                continue
+            message = _fill(template, rule_match) if rule_match is not None else template[0][0]
+            # Keep the lines the rule did not look at (rest of a multi-line message, notes)
+            rest = exc_message.find('\n', rule_match.end() if rule_match is not None else 0)
+            if rest >= 0 and exc_message[rest:].strip():
+                message += exc_message[rest:].rstrip()
+            break
+
+        tip = self._tips.get(short_type)
+        if isinstance(tip, dict):
+            tip = tip.get(executor, tip.get('default'))
+        text = head + message
+        if tip:
+            text += '\n💡 Tip: ' + tip
+        return TranslatedError(short_type, message, tip, _user_line(head, filename), text)
+
+
+def _find_exception(stderr):
+    """
+    Split error output into (head, exception type, message): the exception
+    line is the first one after the last traceback frame that looks like one;
+    without a frame only the last line is considered
+    """
+    frame_end = None
+    position = len(stderr)
+    while True:
+        position = stderr.rfind('  File "', 0, position)
+        if position < 0:
+            break
+        if position == 0 or stderr[position - 1] == '\n':
+            line_end = stderr.find('\n', position)
+            line_end = len(stderr) if line_end < 0 else line_end
+            if _FRAME_LINE.match(stderr, position, line_end):
+                frame_end = line_end
+                break
+
+    if frame_end is None:
+        start = stderr.rfind('\n') + 1
+        match = _exception_line(stderr, start, len(stderr))
+        return (stderr[:start], match.group(1), match.group(3) or '') if match else None
+
+    start = frame_end + 1
+    while start < len(stderr):
+        end = stderr.find('\n', start)
+        end = len(stderr) if end < 0 else end
+        match = _exception_line(stderr, start, end)
+        if match is not None:
+            message = (match.group(3) or '') + stderr[end:]
+            return stderr[:start], match.group(1), message.strip()
+        start = end + 1
+    return None
+
+
+def _exception_line(text, start, end):
+    """Match an exception line (`Name: message`, or a bare exception name) in text[start:end]"""
+    match = _EXCEPTION_LINE.fullmatch(text, start, end)
+    if match is None or (match.group(2) is None and not match.group(1).endswith(_BARE_EXCEPTION_SUFFIXES)):
+        return None
+    return match
+
+
+def _user_line(head, filename):
+    """Line number of the last frame in the user's file, if any"""
+    marker = f'File "{filename}", line '
+    start = head.rfind(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    end = start
+    while end < len(head) and head[end].isdigit():
+        end += 1
+    return int(head[start:end]) if end > start else None
+
+
+translator = ErrorTranslator.from_file(os.getenv('ERROR_RULES_PATH') or DEFAULT_RULES_PATH)
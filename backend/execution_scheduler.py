@@ -0,0 +1,234 @@
+"""
+Execution scheduler for /api/execute and the job API
+
+A fixed number of worker tasks (sized to the CPU cores by default) take jobs
+from per-client queues in round-robin order, so one client submitting a burst
+of infinite loops delays only its own jobs. The total queue and each client's
+queue are bounded; submit() raises QueueFull when either is full and the API
+answers 503 with Retry-After.
+
+Finished jobs are kept for `result_ttl` seconds so they can be polled.
+cancel() drops a queued job or cancels a running one, e.g. when the client
+streaming its output has gone away.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Execution queue is full')
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, client_id, code, run_fn=None):
+        self.id = uuid.uuid4().hex
+        self.client_id = client_id
+        self.code = code
+        self.run_fn = run_fn
+        self.status = 'queued'
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.task = None  # the task running run_fn, once started
+        self.done = asyncio.Event()
+
+    @property
+    def queue_time(self):
+        if self.started_at is None:
+            return time.monotonic() - self.submitted_at
+        return self.started_at - self.submitted_at
+
+    @property
+    def run_time(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'queue_time': round(self.queue_time, 4),
+            'run_time': round(self.run_time, 4) if self.run_time is not None else None,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class _Timings:
+    """Rolling window of durations for avg / p95 reporting"""
+
+    def __init__(self, size=500):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0, 'avg': None, 'p95': None}
+        ordered = sorted(self.samples)
+        return {
+            'count': len(ordered),
+            'avg': round(sum(ordered) / len(ordered), 4),
+            'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        }
+
+
+class ExecutionScheduler:
+    """Bounded worker pool with per-client fair queuing"""
+
+    def __init__(self, run_fn, workers=None, max_queue=64, max_queue_per_client=8,
+                 retry_after=5, result_ttl=300):
+        self.run_fn = run_fn
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.retry_after = retry_after
+        self.result_ttl = result_ttl
+        self._queues = OrderedDict()   # client_id -> deque of jobs, in round-robin order
+        self._jobs = OrderedDict()     # job_id -> Job
+        self._queued = 0
+        self._running = 0
+        self._available = None
+        self._tasks = []
+        self.queue_times = _Timings()
+        self.run_times = _Timings()
+        self.completed = 0
+        self.rejected = 0
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._available = asyncio.Semaphore(0)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, client_id, code, run_fn=None):
+        """
+        Queue a job; raises QueueFull when the global or client queue is full.
+        run_fn overrides the scheduler's default runner for this job.
+        """
+        queue = self._queues.get(client_id)
+        if self._queued >= self.max_queue or (queue is not None and len(queue) >= self.max_queue_per_client):
+            self.rejected += 1
+            raise QueueFull(self.retry_after)
+
+        self._expire_jobs()
+        job = Job(client_id, code, run_fn)
+        self._jobs[job.id] = job
+        if queue is None:
+            queue = self._queues[client_id] = deque()
+        queue.append(job)
+        self._queued += 1
+        self._available.release()
+        return job
+
+    def record_finished(self, client_id, code, result):
+        """Store a job that was answered without running (e.g. a syntax error)"""
+        self._expire_jobs()
+        job = Job(client_id, code)
+        job.status = 'done'
+        job.started_at = job.finished_at = job.submitted_at
+        job.result = result
+        job.done.set()
+        self._jobs[job.id] = job
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued or running job; finished jobs are left alone"""
+        if job.done.is_set():
+            return
+        if job.task is not None:
+            job.task.cancel()
+            return
+        # Still queued: the worker that takes it skips it
+        job.status = 'cancelled'
+        job.finished_at = time.monotonic()
+        job.done.set()
+
+    async def run(self, client_id, code):
+        """Submit a job and wait for its result"""
+        job = self.submit(client_id, code)
+        await job.done.wait()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _next_job(self):
+        # Round robin: take from the first client, then move it to the back
+        client_id, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        if queue:
+            self._queues.move_to_end(client_id)
+        else:
+            del self._queues[client_id]
+        self._queued -= 1
+        return job
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            job = self._next_job()
+            if job.status == 'cancelled':
+                continue
+
+            job.status = 'running'
+            job.started_at = time.monotonic()
+            self.queue_times.add(job.queue_time)
+            self._running += 1
+            # A task of its own, so cancel() stops the job but not this worker
+            job.task = asyncio.create_task((job.run_fn or self.run_fn)(job.code))
+            try:
+                await asyncio.wait({job.task})
+                if job.task.cancelled():
+                    job.status = 'cancelled'
+                elif job.task.exception() is not None:
+                    job.status = 'failed'
+                    job.error = str(job.task.exception())
+                else:
+                    job.result = job.task.result()
+                    job.status = 'done'
+            except asyncio.CancelledError:
+                job.task.cancel()  # the scheduler is stopping
+                raise
+            finally:
+                self._running -= 1
+                job.finished_at = time.monotonic()
+                self.run_times.add(job.run_time)
+                self.completed += 1
+                job.done.set()
+
+    def _expire_jobs(self):
+        cutoff = time.monotonic() - self.result_ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished_at is None or job.finished_at > cutoff:
+                break
+            self._jobs.popitem(last=False)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'running': self._running,
+            'queued': self._queued,
+            'clients_waiting': len(self._queues),
+            'max_queue': self.max_queue,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'queue_time': self.queue_times.summary(),
+            'run_time': self.run_times.summary(),
+        }
@@ -0,0 +1,207 @@
+"""
+Content-addressed cache for AI code explanations
+
+Explanations are keyed by a hash of the whitespace-normalized code, the model
+and the prompt version, so the same snippet is only sent to the model once.
+Lookups go through an in-memory LRU and then an optional SQLite file, both
+with a TTL. Concurrent requests for the same key share one upstream call
+(single flight): the first caller computes, the others await its result.
+Streaming callers (stream_or_compute) share the call the same way: each one
+receives every piece from the start, however late it joined. The upstream
+call is cancelled once every caller has gone away.
+
+Only successful explanations are cached; failures reach every waiter but are
+not stored.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+def normalize_code(code):
+    """Normalize line endings, trailing whitespace and surrounding blank lines"""
+    lines = [line.rstrip() for line in code.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    return '\n'.join(lines).strip('\n')
+
+
+class _Flight:
+    """One upstream call and the pieces it has streamed so far"""
+
+    def __init__(self):
+        self.task = None
+        self.pieces = []
+        self.streamed = False
+        self.listeners = 0
+        self.updated = asyncio.Event()
+
+    def add(self, piece):
+        self.streamed = True
+        self.pieces.append(piece)
+        self.notify()
+
+    def notify(self):
+        # Wake everyone waiting for the next piece; later waiters get a new event
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class ExplanationCache:
+    def __init__(self, max_entries=512, ttl=7 * 24 * 3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory = OrderedDict()  # key -> (expires_at, explanation)
+        self._inflight = {}           # key -> _Flight of the upstream call
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS explanation_cache'
+                ' (key TEXT PRIMARY KEY, explanation TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(code, model, prompt_version):
+        digest = hashlib.sha256()
+        for part in (prompt_version, model, normalize_code(code)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            del self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                'SELECT explanation, expires_at FROM explanation_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None:
+                if row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+                self._db.execute('DELETE FROM explanation_cache WHERE key = ?', (key,))
+        return None
+
+    def set(self, key, explanation):
+        expires_at = time.time() + self.ttl
+        self._remember(key, explanation, expires_at)
+        if self._db is not None:
+            self._db.execute(
+                'INSERT OR REPLACE INTO explanation_cache (key, explanation, expires_at) VALUES (?, ?, ?)',
+                (key, explanation, expires_at)
+            )
+
+    def _remember(self, key, explanation, expires_at):
+        self._memory[key] = (expires_at, explanation)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return the cached explanation for key, or run compute() once for all
+        concurrent callers and cache its result. The upstream call runs as its
+        own task, so a caller disconnecting does not cancel it for the others;
+        it is cancelled when the last one goes away.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        flight = self._join(key, compute, None)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(flight)
+
+    async def stream_or_compute(self, key, produce):
+        """
+        Async generator of the explanation for key in pieces: the cached one
+        as a single piece, else what produce() (an async generator of pieces)
+        yields, run once for all concurrent callers and cached when complete.
+        Raises what the upstream call raised, after the pieces it produced.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        flight = self._join(key, None, produce)
+        try:
+            sent = 0
+            while True:
+                if sent < len(flight.pieces):
+                    sent += 1
+                    yield flight.pieces[sent - 1]
+                elif flight.task.done():
+                    break
+                else:
+                    await flight.updated.wait()
+            explanation = flight.task.result()
+            if not flight.streamed:
+                yield explanation  # joined a get_or_compute() call: no pieces
+        finally:
+            self._leave(flight)
+
+    def _join(self, key, compute, produce):
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.misses += 1
+            flight = self._inflight[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._compute_and_store(key, flight, compute, produce))
+            flight.task.add_done_callback(lambda t: self._finished(key, flight))
+        else:
+            self.coalesced += 1
+        flight.listeners += 1
+        return flight
+
+    def _leave(self, flight):
+        flight.listeners -= 1
+        if flight.listeners == 0 and not flight.task.done():
+            flight.task.cancel()  # nobody is waiting any more: stop the upstream call
+
+    async def _compute_and_store(self, key, flight, compute, produce):
+        if produce is None:
+            explanation = await compute()
+        else:
+            pieces = produce()
+            try:
+                async for piece in pieces:
+                    flight.add(piece)
+            finally:
+                await pieces.aclose()
+            explanation = ''.join(flight.pieces)
+        self.set(key, explanation)
+        return explanation
+
+    def _finished(self, key, flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        flight.notify()
+        if not flight.task.cancelled():
+            flight.task.exception()  # Mark retrieved even if every caller went away
+
+    def stats(self):
+        return {
+            'entries': len(self._memory),
+            'disk': self.path is not None,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+        }
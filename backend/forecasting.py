@@ -0,0 +1,389 @@
+"""
+Day-ahead load forecasts and overload prediction for the whole fleet
+
+History is pulled in bulk as hourly aggregates (sum, count and max of
+current per transformer and hour), with one GROUP BY over the reading table
+plus the compressed reading_chunk archive when chunk storage is on. It is
+laid out as dense NumPy matrices [transformers x hours] and every model is
+fitted on all transformers at once with array operations:
+
+- daily profile: for each hour of the day, an EWMA over the past days
+  (FORECAST_DAY_ALPHA weight on the most recent day), which captures the
+  evening peak etc.
+- trend: least-squares slope of the daily means, for load that grows
+  or falls from day to day (needs at least MIN_TREND_DAYS days)
+- spread: residual standard deviation of history around profile + trend
+
+The next 24 hours are forecast = profile + trend, and upper = forecast +
+Z_UPPER * spread (a ~95% one-sided band). The same model is fitted to
+the hourly peak current. A transformer is "at risk" when its upper peak
+forecast reaches FORECAST_RISK_THRESHOLD x STATS_RATED_CURRENT.
+
+For fleets of FORECAST_POOL_MIN transformers or more the rows are split
+across a process pool (FORECAST_WORKERS processes). One process fits 10k
+transformers in well under a second and starting a pool costs 1-2 s, so
+the pool only pays off for very large fleets on multi-core hosts. Results are cached for
+FORECAST_TTL seconds; a stale forecast is served while a background thread
+refits, so only the first requests after startup wait for a fit (and
+share it: concurrent callers do not fit the fleet again).
+
+NumPy is optional for the rest of the API. Without it the forecast
+endpoints return 503.
+
+Configuration:
+    FORECAST_HISTORY_DAYS     days of history used (28)
+    FORECAST_TTL              seconds a fitted forecast is reused (900)
+    FORECAST_DAY_ALPHA        EWMA weight of the most recent day (0.3)
+    FORECAST_RISK_THRESHOLD   fraction of rated current counted as overload (1.0)
+    FORECAST_POOL_MIN         fleet size from which a process pool is used (50000)
+    FORECAST_WORKERS          processes in the pool (CPU count)
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import Integer, cast, func, literal, literal_column, select
+
+from chunk_storage import chunk_rows
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HOURS_AHEAD = 24
+MIN_TREND_DAYS = 3
+Z_UPPER = 1.645
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ForecastUnavailable(Exception):
+    """Forecasting cannot run here (NumPy is not installed)"""
+
+
+class HourlyHistory(NamedTuple):
+    """Hourly current aggregates as parallel arrays (one entry per transformer and hour)"""
+    transformer_ids: object  # array of str
+    hours: object            # int64 hours since the epoch
+    sums: object             # float64 sum of current
+    counts: object           # int64 readings
+    peaks: object            # float64 max current
+
+
+def _require_numpy():
+    if np is None:
+        raise ForecastUnavailable('numpy is required for forecasting (pip install numpy)')
+
+
+def _hour_index(column, dialect_name):
+    """SQL expression: whole hours since 1970-01-01 for a naive UTC timestamp"""
+    if dialect_name == 'sqlite':
+        return cast(func.strftime('%s', column), Integer) // 3600
+    if dialect_name in ('mysql', 'mariadb'):
+        return func.timestampdiff(literal_column('HOUR'), literal('1970-01-01'), column)
+    return cast(func.extract('epoch', column), Integer) // 3600
+
+
+def hourly_history(session, reading_table, chunks, start, end):
+    """Hourly aggregates of every transformer for start <= timestamp < end"""
+    _require_numpy()
+    c = reading_table.c
+    hour = _hour_index(c.timestamp, session.get_bind().dialect.name).label('hour')
+    rows = session.execute(
+        select(c.transformer_id, hour, func.sum(c.current), func.count(), func.max(c.current))
+        .where(c.timestamp >= start, c.timestamp < end)
+        .group_by(c.transformer_id, hour)
+    ).all()
+    ids = [row[0] for row in rows]
+    hours = [row[1] for row in rows]
+    sums = [row[2] for row in rows]
+    counts = [row[3] for row in rows]
+    peaks = [row[4] for row in rows]
+
+    if chunks is not None:
+        # Compacted history: decode the chunks and aggregate them the same way
+        archive_ids, archive_hours, archive_current = [], [], []
+        for transformer_id, data in session.execute(
+            select(chunks.c.transformer_id, chunks.c.data)
+            .where(chunks.c.end_time >= start, chunks.c.start_time < end)
+        ):
+            for row in chunk_rows(transformer_id, data):
+                if start <= row[5] < end:
+                    archive_ids.append(transformer_id)
+                    archive_hours.append(int((row[5] - _EPOCH).total_seconds()) // 3600)
+                    archive_current.append(row[3])
+        if archive_ids:
+            ids.extend(archive_ids)
+            hours.extend(archive_hours)
+            sums.extend(archive_current)
+            counts.extend([1] * len(archive_ids))
+            peaks.extend(archive_current)
+
+    return HourlyHistory(
+        np.array(ids, dtype=str), np.array(hours, dtype=np.int64), np.array(sums, dtype=float),
+        np.array(counts, dtype=np.int64), np.array(peaks, dtype=float),
+    )
+
+
+def merge_history(parts):
+    """Concatenate HourlyHistory parts (shards); repeated (transformer, hour) entries are combined later"""
+    _require_numpy()
+    parts = [part for part in parts if len(part.hours)]
+    if not parts:
+        return HourlyHistory(np.array([], dtype=str), np.array([], dtype=np.int64), np.array([]),
+                             np.array([], dtype=np.int64), np.array([]))
+    return HourlyHistory(*(np.concatenate(arrays) for arrays in zip(*parts)))
+
+
+def history_matrices(history, first_hour, hours):
+    """
+    Dense [transformers x hours] matrices of mean and peak current (NaN where
+    there are no readings). Returns (transformer_ids, mean, peak).
+    """
+    columns = history.hours - first_hour
+    keep = (columns >= 0) & (columns < hours)
+    ids, rows = np.unique(history.transformer_ids[keep], return_inverse=True)
+    rows = rows.reshape(-1)
+    columns = columns[keep]
+    sums = np.zeros((len(ids), hours))
+    counts = np.zeros((len(ids), hours))
+    peak = np.full((len(ids), hours), -np.inf)
+    np.add.at(sums, (rows, columns), history.sums[keep])
+    np.add.at(counts, (rows, columns), history.counts[keep])
+    np.maximum.at(peak, (rows, columns), history.peaks[keep])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counts > 0, sums / counts, np.nan)
+    peak[counts == 0] = np.nan
+    return ids.tolist(), mean, peak
+
+
+def _fit(x, day_alpha):
+    """
+    Profile + trend model for every row of x [transformers x days*24].
+    Returns (forecast [T x 24], spread [T]).
+    """
+    rows, hours = x.shape
+    days = hours // 24
+    blocks = x.reshape(rows, days, 24)
+    valid = ~np.isnan(blocks)
+    values = np.where(valid, blocks, 0.0)
+
+    # Hour-of-day profile: EWMA over days, newest day weighted most
+    day = np.arange(days, dtype=float)
+    weights = (1 - day_alpha) ** (days - 1 - day)
+    weighted = valid * weights[None, :, None]
+    total = weighted.sum(axis=1)
+    profile = (values * weights[None, :, None]).sum(axis=1) / np.where(total > 0, total, 1)
+    observed = valid.sum(axis=(1, 2))
+    level = values.sum(axis=(1, 2)) / np.maximum(observed, 1)
+    profile = np.where(total > 0, profile, level[:, None])
+
+    # Linear trend of the daily means
+    day_counts = valid.sum(axis=2)
+    has_day = day_counts > 0
+    daily = values.sum(axis=2) / np.maximum(day_counts, 1)
+    n_days = has_day.sum(axis=1)
+    day_mean = (has_day * day).sum(axis=1) / np.maximum(n_days, 1)
+    load_mean = (has_day * daily).sum(axis=1) / np.maximum(n_days, 1)
+    dx = (day[None, :] - day_mean[:, None]) * has_day
+    sxx = (dx ** 2).sum(axis=1)
+    sxy = (dx * (daily - load_mean[:, None])).sum(axis=1)
+    slope = np.where((n_days >= MIN_TREND_DAYS) & (sxx > 0), sxy / np.where(sxx > 0, sxx, 1), 0.0)
+
+    # The profile describes the load around its weighted centre day
+    centre = (weights * day).sum() / weights.sum()
+    fitted = profile[:, None, :] + slope[:, None, None] * (day - centre)[None, :, None]
+    residual = np.where(valid, blocks - fitted, 0.0)
+    spread = np.sqrt((residual ** 2).sum(axis=(1, 2)) / np.maximum(observed - 1, 1))
+
+    forecast = np.maximum(profile + slope[:, None] * (days - centre), 0.0)
+    return forecast, spread
+
+
+def _fit_block(args):
+    """Process pool entry point: fit mean and peak models for a block of rows"""
+    mean, peak, day_alpha = args
+    forecast, spread = _fit(mean, day_alpha)
+    peak_forecast, peak_spread = _fit(peak, day_alpha)
+    return forecast, spread, peak_forecast, peak_spread
+
+
+def fit_fleet(mean, peak, day_alpha=0.3, workers=1):
+    """Fit all rows, split over `workers` processes when > 1"""
+    _require_numpy()
+    if workers <= 1 or len(mean) < 2 * workers:
+        return _fit_block((mean, peak, day_alpha))
+    blocks = [(m, p, day_alpha) for m, p in zip(np.array_split(mean, workers), np.array_split(peak, workers))]
+    # spawn: the server is multi-threaded, so don't fork it
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        results = list(pool.map(_fit_block, blocks))
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+class FleetForecast:
+    """Fitted forecasts for every transformer with history"""
+
+    def __init__(self, transformer_ids, start, forecast, spread, peak, peak_spread,
+                 rated_current, generated_at, history_hours, fit_seconds):
+        self.transformer_ids = transformer_ids
+        self.index = {transformer_id: row for row, transformer_id in enumerate(transformer_ids)}
+        self.start = start
+        self.forecast = forecast
+        self.upper = forecast + Z_UPPER * spread[:, None]
+        self.peak = peak
+        self.peak_upper = peak + Z_UPPER * peak_spread[:, None]
+        self.rated_current = rated_current
+        self.generated_at = generated_at
+        self.history_hours = history_hours
+        self.fit_seconds = fit_seconds
+        # Highest expected peak in the next 24 h, as a fraction of rated current
+        self.risk = self.peak_upper.max(axis=1) / rated_current if rated_current and len(peak) else np.zeros(len(peak))
+
+    def hours(self):
+        return [(self.start + timedelta(hours=k)).isoformat() for k in range(HOURS_AHEAD)]
+
+    def _summary(self, row):
+        peak_hour = int(self.peak_upper[row].argmax())
+        return {
+            'transformer_id': self.transformer_ids[row],
+            'peak_current': round(float(self.peak[row, peak_hour]), 3),
+            'peak_upper': round(float(self.peak_upper[row, peak_hour]), 3),
+            'peak_at': (self.start + timedelta(hours=peak_hour)).isoformat(),
+            'risk_utilization': round(float(self.risk[row]), 3),
+        }
+
+    def for_transformer(self, transformer_id):
+        row = self.index.get(transformer_id)
+        if row is None:
+            return None
+        return dict(
+            self._summary(row),
+            generated_at=self.generated_at.isoformat(),
+            model='hourly profile (EWMA over days) + linear trend',
+            history_hours=self.history_hours,
+            rated_current=self.rated_current,
+            hours=self.hours(),
+            current=np.round(self.forecast[row], 3).tolist(),
+            upper=np.round(self.upper[row], 3).tolist(),
+            peak=np.round(self.peak[row], 3).tolist(),
+        )
+
+    def at_risk(self, threshold=1.0, limit=50):
+        """Transformers whose upper peak forecast reaches threshold x rated current, worst first"""
+        rows = np.nonzero(self.risk >= threshold)[0]
+        rows = rows[np.argsort(-self.risk[rows], kind='stable')][:limit]
+        return {
+            'generated_at': self.generated_at.isoformat(),
+            'threshold': threshold,
+            'rated_current': self.rated_current,
+            'transformers_forecast': len(self.transformer_ids),
+            'at_risk': int((self.risk >= threshold).sum()),
+            'transformers': [self._summary(row) for row in rows],
+        }
+
+
+class Forecaster:
+    """
+    Fits and caches fleet forecasts. `load_history(start, end)` returns an
+    HourlyHistory (see hourly_history / merge_history).
+    """
+
+    def __init__(self, load_history, rated_current, days=28, ttl=900, day_alpha=0.3,
+                 pool_min=50000, workers=None):
+        self.load_history = load_history
+        self.rated_current = rated_current
+        self.days = days
+        self.ttl = ttl
+        self.day_alpha = day_alpha
+        self.pool_min = pool_min
+        self.workers = workers or os.cpu_count() or 1
+        self._result = None
+        self._fitted_at = 0.0
+        self._lock = threading.Lock()
+        self._first_fit = threading.Lock()  # held during the fit that requests without a forecast wait for
+        self._refreshing = False
+        self.last_error = None
+
+    def refresh(self):
+        """Load history and fit every transformer now"""
+        _require_numpy()
+        began = time.perf_counter()
+        now = datetime.utcnow()
+        end = now.replace(minute=0, second=0, microsecond=0)  # last full hour
+        start = end - timedelta(days=self.days)
+        first_hour = int((start - _EPOCH).total_seconds()) // 3600
+        hours = self.days * 24
+
+        ids, mean, peak = history_matrices(self.load_history(start, end), first_hour, hours)
+        workers = self.workers if len(ids) >= self.pool_min else 1
+        forecast, spread, peak_forecast, peak_spread = fit_fleet(mean, peak, self.day_alpha, workers)
+        result = FleetForecast(
+            ids, end, forecast, spread, peak_forecast, peak_spread, self.rated_current,
+            generated_at=now, history_hours=hours, fit_seconds=time.perf_counter() - began,
+        )
+        with self._lock:
+            self._result = result
+            self._fitted_at = time.monotonic()
+        logger.info(f"Forecast {len(ids)} transformers in {result.fit_seconds:.2f}s")
+        return result
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning(f"Forecast refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self):
+        """The cached forecast; fits on first use and refreshes in the background once stale"""
+        _require_numpy()
+        with self._lock:
+            result = self._result
+            stale = result is None or time.monotonic() - self._fitted_at >= self.ttl
+            start_refresh = stale and result is not None and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if result is None:
+            # One fit for all the requests that arrive before the first forecast
+            with self._first_fit:
+                with self._lock:
+                    # Another request may have fitted while we waited
+                    if self._result is not None:
+                        return self._result
+                return self.refresh()
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, name='forecast-refresh', daemon=True).start()
+        return result
+
+    def stats(self):
+        result = self._result
+        return {
+            'available': np is not None,
+            'transformers': len(result.transformer_ids) if result else 0,
+            'generated_at': result.generated_at.isoformat() if result else None,
+            'fit_seconds': round(result.fit_seconds, 3) if result else None,
+            'last_error': self.last_error,
+        }
+
+
+def create_forecaster(load_history, rated_current):
+    """Build a Forecaster from the FORECAST_* environment variables"""
+    workers = os.getenv('FORECAST_WORKERS')
+    return Forecaster(
+        load_history, rated_current,
+        days=int(os.getenv('FORECAST_HISTORY_DAYS', '28')),
+        ttl=float(os.getenv('FORECAST_TTL', '900')),
+        day_alpha=float(os.getenv('FORECAST_DAY_ALPHA', '0.3')),
+        pool_min=int(os.getenv('FORECAST_POOL_MIN', '50000')),
+        workers=int(workers) if workers else None,
+    )
@@ -0,0 +1,489 @@
+"""
+Store-and-forward edge gateway
+
+Runs at a substation between the local ESP8266 devices and the central
+server. Devices point SERVER_URL at the gateway and use the same API:
+
+    POST /add_transformer   registered locally, forwarded upstream
+    POST /add_reading       validated, timestamped and stored locally
+    POST /add_readings      batch variant
+    GET  /health            backlog, upstream status and forwarding offset
+
+Every accepted request is appended to an outbox table in a local SQLite file
+(WAL mode, single writer thread; see edge_sqlite.py) before the device gets
+its 201. A forwarder thread ships the outbox in order:
+- transformer registrations go to /add_transformer (409 "already exists"
+  counts as delivered)
+- runs of readings go to /add_readings as gzip-compressed batches of up to
+  GATEWAY_BATCH_SIZE
+
+The gateway persists the sequence number of the last delivered entry (the
+offset) in the same transaction that prunes the delivered entries. After a
+backhaul outage or a restart, forwarding resumes from that offset, retrying
+with exponential backoff up to GATEWAY_MAX_BACKOFF seconds. If a batch was
+delivered but the offset was not saved, it is sent again. The central server
+skips readings it already has, because readings are keyed by
+(transformer_id, timestamp) and the gateway stamps readings without a
+timestamp when they arrive.
+
+Only entries the central server rejects as invalid (400 or 422) are moved
+to a rejected table instead of blocking the queue. Any other answer (408,
+429, 401/403 from a proxy, a 404 that re-registering does not fix, e.g. a
+mistyped GATEWAY_UPSTREAM path) is retried like an outage. A batch answered
+with 413 is split in half, and later batches are kept to the size that got
+through.
+
+Central ingest then sees one connection and one multi-row INSERT per
+substation every GATEWAY_FORWARD_INTERVAL seconds, instead of one request
+per device reading.
+
+Configuration:
+    GATEWAY_UPSTREAM           central server URL, e.g. http://10.0.0.5:5000 (required)
+    GATEWAY_DATABASE_URL       local store (sqlite:///gateway.db)
+    GATEWAY_BATCH_SIZE         readings per upstream request (1000, at most 5000)
+    GATEWAY_FORWARD_INTERVAL   seconds between uplinks when the outbox is drained (5)
+    GATEWAY_TIMEOUT            upstream request timeout in seconds (30)
+    GATEWAY_MAX_BACKOFF        longest wait between retries in seconds (300)
+    GATEWAY_PORT               port for local devices (5000)
+
+Run:
+    GATEWAY_UPSTREAM=http://central:5000 python gateway.py
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from dotenv import load_dotenv
+from flask import Flask, request, jsonify
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, delete, func, insert, select,
+)
+
+from compression import init_compression
+from edge_sqlite import SingleWriter, configure_sqlite, edge_pragmas_from_env
+from ingest import MAX_BATCH_SIZE, prepare_reading
+from serialization import dumps
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM = os.getenv('GATEWAY_UPSTREAM', '').rstrip('/')
+BATCH_SIZE = min(int(os.getenv('GATEWAY_BATCH_SIZE', '1000')), MAX_BATCH_SIZE)
+FORWARD_INTERVAL = float(os.getenv('GATEWAY_FORWARD_INTERVAL', '5'))
+TIMEOUT = float(os.getenv('GATEWAY_TIMEOUT', '30'))
+MAX_BACKOFF = float(os.getenv('GATEWAY_MAX_BACKOFF', '300'))
+
+# Local store
+metadata = MetaData()
+
+transformer_table = Table(
+    'transformer', metadata,
+    Column('transformer_id', String(50), primary_key=True),
+    Column('location', String(200), nullable=False),
+    Column('created_at', DateTime, default=datetime.utcnow),
+)
+
+# Append-only log of accepted requests; seq is the forwarding offset.
+# AUTOINCREMENT keeps seq increasing after delivered entries are pruned.
+outbox_table = Table(
+    'outbox', metadata,
+    Column('seq', Integer, primary_key=True),
+    Column('kind', String(20), nullable=False),  # 'transformer' or 'reading'
+    Column('body', Text, nullable=False),        # JSON sent upstream
+    Column('received_at', DateTime, nullable=False),
+    sqlite_autoincrement=True,
+)
+
+rejected_table = Table(
+    'rejected', metadata,
+    Column('seq', Integer, primary_key=True),
+    Column('kind', String(20), nullable=False),
+    Column('body', Text, nullable=False),
+    Column('error', Text),
+    Column('rejected_at', DateTime, nullable=False),
+)
+
+state_table = Table(
+    'gateway_state', metadata,
+    Column('name', String(50), primary_key=True),
+    Column('value', String(200)),
+)
+
+
+# Answers that mean the entries themselves are invalid. Everything else that
+# is not a success is retried: the entries are fine, the server or path is not
+REJECT_STATUSES = (400, 422)
+
+
+class UpstreamError(Exception):
+    """The central server could not be reached or failed (retry later)"""
+
+
+def post_upstream(path, payload, compress=False):
+    """POST JSON to the central server; returns (status, parsed body, bytes sent)"""
+    body = dumps(payload)
+    headers = {'Content-Type': 'application/json'}
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    upstream_request = urllib.request.Request(f'{UPSTREAM}{path}', data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(upstream_request, timeout=TIMEOUT) as response:
+            status, data = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, data = e.code, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        raise UpstreamError(str(e)) from None
+    if status >= 500:
+        raise UpstreamError(f'{path}: HTTP {status}')
+    try:
+        return status, json.loads(data or b'{}'), len(body)
+    except ValueError:
+        return status, {'error': data[:200].decode('utf-8', 'replace')}, len(body)
+
+
+def get_offset(connection):
+    value = connection.execute(select(state_table.c.value).where(state_table.c.name == 'offset')).scalar()
+    return int(value) if value is not None else 0
+
+
+def set_offset(session, seq):
+    """Record `seq` as delivered and prune the outbox up to it"""
+    updated = session.execute(
+        state_table.update().where(state_table.c.name == 'offset').values(value=str(seq))
+    ).rowcount
+    if not updated:
+        session.execute(insert(state_table).values(name='offset', value=str(seq)))
+    session.execute(delete(outbox_table).where(outbox_table.c.seq <= seq))
+
+
+class Forwarder:
+    """Ships the outbox to the central server in order, resuming from the stored offset"""
+
+    def __init__(self, engine, writer, batch_size=BATCH_SIZE, interval=FORWARD_INTERVAL, max_backoff=MAX_BACKOFF):
+        self.engine = engine
+        self.writer = writer
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self.forwarded = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_raw = 0
+        self.rejected = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_success = None
+
+    def pending(self):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(func.count(), func.min(outbox_table.c.received_at))
+                .where(outbox_table.c.seq > get_offset(connection))
+            ).one()
+
+    def _segments(self, entries):
+        """Split entries into runs of the same kind"""
+        run = []
+        for entry in entries:
+            if run and entry.kind != run[-1].kind:
+                yield run
+                run = []
+            run.append(entry)
+        if run:
+            yield run
+
+    def _send_transformer(self, transformer):
+        """Register a transformer upstream; returns (delivered, body), False if it was rejected as invalid"""
+        status, body, _ = post_upstream('/add_transformer', transformer)
+        self.requests += 1
+        if status in (200, 201, 409):
+            return True, body
+        if status in REJECT_STATUSES:
+            return False, body
+        raise UpstreamError(f'/add_transformer: HTTP {status}')
+
+    def _send_readings(self, entries):
+        """POST readings; returns (status, body) for a success, a rejection or 413"""
+        readings = [json.loads(entry.body) for entry in entries]
+        status, body, sent = post_upstream('/add_readings', {'readings': readings}, compress=True)
+        self.requests += 1
+        if status == 404:
+            # The central server does not know a transformer (e.g. a new or
+            # rebuilt server): register the ones we know, then retry once
+            self._register_all({reading['transformer_id'] for reading in readings})
+            status, body, sent = post_upstream('/add_readings', {'readings': readings}, compress=True)
+            self.requests += 1
+        self.bytes_sent += sent
+        self.bytes_raw += sum(len(entry.body) for entry in entries)
+        if status not in (200, 201, 413) and status not in REJECT_STATUSES:
+            raise UpstreamError(f'/add_readings: HTTP {status}')
+        return status, body
+
+    def _register_all(self, transformer_ids):
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(transformer_table.c.transformer_id, transformer_table.c.location)
+                .where(transformer_table.c.transformer_id.in_(transformer_ids))
+            ).all()
+        for row in rows:
+            self._send_transformer({'transformer_id': row.transformer_id, 'location': row.location})
+
+    def _forward_readings(self, entries):
+        """Deliver a run of readings, halving it while the server answers 413; returns len(entries)"""
+        status, body = self._send_readings(entries)
+        if status == 413 and len(entries) > 1:
+            middle = len(entries) // 2
+            if middle < self.batch_size:
+                logger.warning(f"Upstream refused {len(entries)} readings as too large, sending at most {middle}")
+                self.batch_size = middle
+            return self._forward_readings(entries[:middle]) + self._forward_readings(entries[middle:])
+        if status in (200, 201):
+            self.writer.run(lambda session, seq=entries[-1].seq: set_offset(session, seq))
+            self.forwarded += len(entries)
+        else:
+            self._reject(entries, body.get('error', body))
+        return len(entries)
+
+    def _reject(self, entries, error):
+        logger.warning(f"Upstream rejected {len(entries)} {entries[0].kind} entries: {error}")
+        self.rejected += len(entries)
+        now = datetime.utcnow()
+
+        def write(session):
+            session.execute(insert(rejected_table), [
+                {'seq': entry.seq, 'kind': entry.kind, 'body': entry.body, 'error': str(error), 'rejected_at': now}
+                for entry in entries
+            ])
+            set_offset(session, entries[-1].seq)
+        self.writer.run(write)
+
+    def run_once(self):
+        """Forward one batch of the outbox; returns the number of entries delivered or rejected"""
+        with self.engine.connect() as connection:
+            entries = connection.execute(
+                select(outbox_table).where(outbox_table.c.seq > get_offset(connection))
+                .order_by(outbox_table.c.seq).limit(self.batch_size)
+            ).all()
+        done = 0
+        for segment in self._segments(entries):
+            if segment[0].kind == 'transformer':
+                for entry in segment:
+                    ok, body = self._send_transformer(json.loads(entry.body))
+                    if ok:
+                        self.writer.run(lambda session, seq=entry.seq: set_offset(session, seq))
+                    else:
+                        self._reject([entry], body.get('error', body))
+                    done += 1
+            else:
+                done += self._forward_readings(segment)
+        if done:
+            self.last_success = datetime.utcnow()
+        return done
+
+    def wake(self):
+        """Forward without waiting for the interval (e.g. after a burst of readings)"""
+        self._wake.set()
+
+    def _loop(self):
+        backoff = 1
+        while True:
+            try:
+                done = self.run_once()
+                backoff = 1
+                self.last_error = None
+            except UpstreamError as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning(f"Upstream unavailable, retrying in {backoff:g}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Forwarding failed")
+                done = 0
+            if done < self.batch_size:
+                # Drained: wait for the next interval. A full batch means a
+                # backlog (e.g. after an outage), so keep going
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def start(self):
+        thread = threading.Thread(target=self._loop, name='gateway-forwarder', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        count, oldest = self.pending()
+        return {
+            'upstream': UPSTREAM,
+            'pending': count,
+            'oldest_pending': oldest.isoformat() if oldest else None,
+            'forwarded_readings': self.forwarded,
+            'upstream_requests': self.requests,
+            'compression_ratio': round(self.bytes_raw / self.bytes_sent, 1) if self.bytes_sent else None,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_success': self.last_success.isoformat() if self.last_success else None,
+        }
+
+
+app = Flask(__name__)
+init_compression(app)
+
+engine = create_engine(os.getenv('GATEWAY_DATABASE_URL', 'sqlite:///gateway.db'))
+configure_sqlite(engine, edge_pragmas_from_env() or {'journal_mode': 'WAL', 'busy_timeout': 5000})
+metadata.create_all(engine)
+writer = SingleWriter(engine, checkpoint_interval=float(os.getenv('SQLITE_CHECKPOINT_INTERVAL', '60')))
+forwarder = Forwarder(engine, writer)
+
+
+def known_transformers(transformer_ids):
+    with engine.connect() as connection:
+        return set(connection.scalars(
+            select(transformer_table.c.transformer_id).where(transformer_table.c.transformer_id.in_(transformer_ids))
+        ))
+
+
+def queue_readings(rows):
+    """Append readings to the outbox (one commit, shared with concurrent requests)"""
+    now = datetime.utcnow()
+    writer.run(lambda session: session.execute(insert(outbox_table), [
+        {'kind': 'reading', 'body': dumps(row).decode('utf-8'), 'received_at': now} for row in rows
+    ]))
+
+
+# Local device API (same requests and responses as the central server)
+
+@app.route('/', methods=['GET'])
+def home():
+    return jsonify({
+        'message': 'LT Line Monitoring Gateway',
+        'version': '1.0',
+        'status': 'running',
+        'upstream': UPSTREAM
+    })
+
+@app.route('/add_transformer', methods=['POST'])
+def add_transformer():
+    try:
+        data = request.get_json()
+
+        if not data or 'transformer_id' not in data or 'location' not in data:
+            return jsonify({'error': 'transformer_id and location are required'}), 400
+
+        transformer = {'transformer_id': data['transformer_id'], 'location': data['location'],
+                       'created_at': datetime.utcnow()}
+
+        def write(session):
+            exists = session.execute(select(transformer_table.c.transformer_id).where(
+                transformer_table.c.transformer_id == transformer['transformer_id']
+            )).first()
+            if exists:
+                return False
+            session.execute(insert(transformer_table).values(transformer))
+            session.execute(insert(outbox_table).values(
+                kind='transformer', received_at=transformer['created_at'],
+                body=dumps({'transformer_id': transformer['transformer_id'], 'location': transformer['location']}).decode('utf-8')
+            ))
+            return True
+
+        if not writer.run(write):
+            return jsonify({'error': 'Transformer already exists'}), 409
+        forwarder.wake()
+
+        return jsonify({
+            'message': 'Transformer added successfully',
+            'transformer': {**transformer, 'created_at': transformer['created_at'].isoformat()}
+        }), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/add_reading', methods=['POST'])
+def add_reading():
+    try:
+        try:
+            row = prepare_reading(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not known_transformers({row['transformer_id']}):
+            return jsonify({'error': 'Transformer not found'}), 404
+
+        queue_readings([row])
+        if row['trip_status']:
+            # Trips are forwarded right away rather than with the next batch
+            forwarder.wake()
+
+        return jsonify({
+            'message': 'Reading queued for upload',
+            'reading': {**row, 'timestamp': row['timestamp'].isoformat()}
+        }), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/add_readings', methods=['POST'])
+def add_readings():
+    """Batch variant of /add_reading: {"readings": [...]}"""
+    try:
+        data = request.get_json()
+        items = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'readings must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'at most {MAX_BATCH_SIZE} readings per request'}), 400
+
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append(prepare_reading(item))
+            except ValueError as e:
+                return jsonify({'error': f'readings[{index}]: {e}'}), 400
+
+        transformer_ids = {row['transformer_id'] for row in rows}
+        missing = sorted(transformer_ids - known_transformers(transformer_ids))
+        if missing:
+            return jsonify({'error': f"Transformer not found: {', '.join(missing)}"}), 404
+
+        queue_readings(rows)
+
+        return jsonify({'message': 'Readings queued for upload', 'received': len(rows)}), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    try:
+        with engine.connect() as connection:
+            offset = get_offset(connection)
+        return jsonify({
+            'status': 'healthy',
+            'offset': offset,
+            'forwarding': forwarder.stats(),
+            'writer': writer.stats()
+        })
+    except Exception as e:
+        return jsonify({'status': 'unhealthy', 'error': str(e)}), 503
+
+
+if __name__ == '__main__':
+    if not UPSTREAM:
+        raise SystemExit('Set GATEWAY_UPSTREAM to the central server URL, e.g. http://10.0.0.5:5000')
+    logging.basicConfig(level=logging.INFO)
+    forwarder.start()
+
+    print(f"Starting LT Line Monitoring gateway (upstream: {UPSTREAM})...")
+    app.run(host='0.0.0.0', port=int(os.getenv('GATEWAY_PORT', '5000')), threaded=True)
@@ -0,0 +1,186 @@
+"""
+Idempotent reading ingest
+
+A reading is identified by (transformer_id, timestamp), backed by a unique
+index on the reading table. Devices that retry a POST after a timeout, or
+replay buffered readings after reconnecting, send the same timestamp again;
+those rows are skipped by the database instead of being stored twice:
+
+    SQLite / PostgreSQL  INSERT ... ON CONFLICT (transformer_id, timestamp) DO NOTHING
+    MySQL / MariaDB      INSERT ... ON DUPLICATE KEY UPDATE id = id
+
+(Not INSERT IGNORE: it would also turn foreign key violations and truncated
+values into warnings. On MySQL the affected-row count cannot tell skipped rows
+from inserted ones, because the driver sets CLIENT_FOUND_ROWS, so the keys
+that are already stored are looked up first and only the rest are inserted
+and counted. A duplicate that arrives concurrently between the lookup and the
+insert is still skipped by the index, but counted as new.)
+
+Batches are de-duplicated in memory first and inserted as multi-row INSERTs
+of up to BATCH_CHUNK_SIZE rows, so a replay of thousands of readings costs a
+few statements whether or not they are already stored.
+"""
+import math
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, insert, select, text, tuple_
+
+UNIQUE_INDEX_NAME = 'uq_reading_transformer_timestamp'
+READING_KEY = ('transformer_id', 'timestamp')
+BATCH_CHUNK_SIZE = 500
+MAX_BATCH_SIZE = 5000
+TRUE_STRINGS = ('true', '1', 'yes', 'on')
+FALSE_STRINGS = ('false', '0', 'no', 'off', '')
+
+
+def parse_timestamp(value):
+    """ISO 8601 timestamp as naive UTC; current time if missing or unparseable"""
+    if value:
+        try:
+            timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            return timestamp
+        except ValueError:
+            pass  # Use default timestamp if parsing fails
+    return datetime.utcnow()
+
+
+def parse_trip_status(value):
+    """trip_status as a bool; the strings "false" and "0" are not trips"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS + FALSE_STRINGS:
+        return value.strip().lower() in TRUE_STRINGS
+    raise ValueError('trip_status must be true or false')
+
+
+def prepare_reading(data):
+    """
+    Validate one reading from a request body and return the row to insert.
+    Raises ValueError with the API error message when a field is missing,
+    not a finite number or not a boolean.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('reading must be an object')
+    for field in ('transformer_id', 'voltage', 'current'):
+        if field not in data:
+            raise ValueError(f'{field} is required')
+    values = {}
+    for field in ('voltage', 'current'):
+        try:
+            values[field] = float(data[field])
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} must be a number')
+        # "nan", "inf" and JSON NaN/Infinity parse, but would poison the
+        # load statistics and are rejected by MySQL FLOAT columns
+        if not math.isfinite(values[field]):
+            raise ValueError(f'{field} must be a finite number')
+    return {
+        'transformer_id': data['transformer_id'],
+        'voltage': values['voltage'],
+        'current': values['current'],
+        'trip_status': parse_trip_status(data.get('trip_status')),
+        'timestamp': parse_timestamp(data.get('timestamp')),
+    }
+
+
+def dedupe_rows(rows):
+    """Drop rows repeating an earlier (transformer_id, timestamp) in the same batch"""
+    seen = set()
+    unique = []
+    for row in rows:
+        key = (row['transformer_id'], row['timestamp'])
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    return unique
+
+
+def insert_ignoring_duplicates(table, dialect_name):
+    """INSERT for `table` that skips rows whose (transformer_id, timestamp) exists"""
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing(index_elements=list(READING_KEY))
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(table).on_conflict_do_nothing(index_elements=list(READING_KEY))
+    if dialect_name in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        statement = mysql_insert(table)
+        return statement.on_duplicate_key_update(id=table.c.id)
+    return insert(table)
+
+
+def _dialect_name(executor):
+    """Dialect of a Session or Connection"""
+    dialect = getattr(executor, 'dialect', None) or executor.get_bind().dialect
+    return dialect.name
+
+
+def _counts_found_rows(dialect_name):
+    return dialect_name in ('mysql', 'mariadb')
+
+
+def new_rows(executor, table, rows):
+    """Rows whose (transformer_id, timestamp) is not stored yet"""
+    if not rows:
+        return rows
+    key = tuple_(table.c.transformer_id, table.c.timestamp)
+    existing = set(executor.execute(
+        select(table.c.transformer_id, table.c.timestamp)
+        .where(key.in_([(row['transformer_id'], row['timestamp']) for row in rows]))
+    ).all())
+    return [row for row in rows if (row['transformer_id'], row['timestamp']) not in existing]
+
+
+def batch_statements(table, dialect_name, rows):
+    """Multi-row INSERT statements covering `rows`, BATCH_CHUNK_SIZE rows each"""
+    for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+        yield insert_ignoring_duplicates(table, dialect_name).values(rows[start:start + BATCH_CHUNK_SIZE])
+
+
+def insert_reading(session, table, row):
+    """Insert one row through a Session or Connection; returns its id, or None for a duplicate"""
+    dialect_name = _dialect_name(session)
+    if _counts_found_rows(dialect_name) and not new_rows(session, table, [row]):
+        return None
+    result = session.execute(insert_ignoring_duplicates(table, dialect_name).values(row))
+    return result.inserted_primary_key[0] if result.rowcount else None
+
+
+def insert_readings(session, table, rows):
+    """Insert rows through a Session or Connection; returns how many were new"""
+    rows = dedupe_rows(rows)
+    dialect_name = _dialect_name(session)
+    if not _counts_found_rows(dialect_name):
+        return sum(session.execute(statement).rowcount for statement in batch_statements(table, dialect_name, rows))
+    inserted = 0
+    for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+        chunk = new_rows(session, table, rows[start:start + BATCH_CHUNK_SIZE])
+        if chunk:
+            session.execute(insert_ignoring_duplicates(table, dialect_name).values(chunk))
+            inserted += len(chunk)
+    return inserted
+
+
+def ensure_unique_index(connection, table):
+    """
+    Add the (transformer_id, timestamp) unique index to a reading table created
+    before it existed. Duplicate rows are deleted first, keeping the oldest id.
+    Returns the number of rows removed, or None if the index already existed.
+    """
+    inspector = inspect(connection)
+    existing = {index['name'] for index in inspector.get_indexes(table.name)}
+    existing |= {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}
+    if UNIQUE_INDEX_NAME in existing:
+        return None
+
+    removed = connection.execute(text(
+        f'DELETE FROM {table.name} WHERE id NOT IN ('
+        f'SELECT id FROM (SELECT MIN(id) AS id FROM {table.name} GROUP BY transformer_id, timestamp) AS keep)'
+    )).rowcount
+    connection.execute(text(f'CREATE UNIQUE INDEX {UNIQUE_INDEX_NAME} ON {table.name} (transformer_id, timestamp)'))
+    return removed
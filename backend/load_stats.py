@@ -0,0 +1,375 @@
+"""
+Online per-transformer load statistics and health scores
+
+Statistics are updated in the ingest path, one reading at a time, so views
+never re-query reading history:
+
+- current: all-time mean / stddev (Welford) and a rolling EWMA mean / stddev
+  that decays with time constant STATS_EWMA_SECONDS, so irregular reporting
+  intervals and batch uploads are weighted by time rather than by count
+- voltage: EWMA mean and its deviation from STATS_NOMINAL_VOLTAGE
+- load factor: mean current / peak current
+- utilization: EWMA current / STATS_RATED_CURRENT
+- trips: count and time of the last trip
+
+The state is held as one array('d') column per field with a slot per
+transformer, about 110 bytes per transformer. The fleet ranking
+(`top`) scans those arrays with heapq and never touches the reading table.
+
+Each transformer's stats follow its readings in timestamp order. A reading
+no newer than the last one applied is ignored: this covers device retries,
+gateway replays and late arrivals, so add_readings can feed every row
+without knowing which ones were duplicates.
+
+Checkpoints: transformers changed since the last checkpoint are written to
+the transformer_stats table every STATS_CHECKPOINT_INTERVAL seconds. At
+startup the checkpoint is loaded and readings newer than each transformer's
+checkpoint are replayed (catch_up), so a restart loses nothing.
+
+Like the recent-readings buffer, the stats live in the process that ingests:
+run a single worker, or they only cover that worker's share of readings.
+
+Health score (0-100, lower is worse):
+    100 - 40 * load penalty    (0 at <= 80% of rated current, full at >= 120%)
+        - 30 * voltage penalty (full at a 10% deviation from nominal)
+        - 30 * trip penalty    (decays with a 24 hour time constant after a trip)
+"""
+import heapq
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, String, Table, delete, insert, select
+
+FIELDS = (
+    'count',        # readings applied
+    'mean_i',       # Welford mean of current
+    'm2_i',         # Welford sum of squared deviations
+    'ewma_i',       # EWMA of current
+    'ewmvar_i',     # EWMA variance of current
+    'ewma_v',       # EWMA of voltage
+    'peak_i',       # highest current seen
+    'last_ts',      # epoch seconds of the last applied reading
+    'last_trip',    # epoch seconds of the last trip (NaN if none)
+    'trips',        # trip readings seen
+)
+_INITIAL = {field: 0.0 for field in FIELDS}
+_INITIAL['last_ts'] = -math.inf
+_INITIAL['last_trip'] = math.nan
+
+# Columns of the ranking endpoint and whether larger values rank first
+RANKINGS = {
+    'utilization': True,
+    'current': True,
+    'current_std': True,
+    'voltage_deviation': True,
+    'load_factor': False,
+    'health': False,
+    'since_trip': False,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(timestamp):
+    return (timestamp - _EPOCH).total_seconds()
+
+
+def _datetime(seconds):
+    return datetime.utcfromtimestamp(seconds) if math.isfinite(seconds) else None
+
+
+class LoadStats:
+    def __init__(self, nominal_voltage=230.0, rated_current=10.0, ewma_seconds=900.0):
+        self.nominal_voltage = nominal_voltage
+        self.rated_current = rated_current
+        self.ewma_seconds = ewma_seconds
+        self._slots = {}   # transformer_id -> index into the columns
+        self._ids = []     # index -> transformer_id
+        self._columns = {field: array('d') for field in FIELDS}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _slot(self, transformer_id):
+        slot = self._slots.get(transformer_id)
+        if slot is None:
+            slot = self._slots[transformer_id] = len(self._ids)
+            self._ids.append(transformer_id)
+            for field, column in self._columns.items():
+                column.append(_INITIAL[field])
+        return slot
+
+    def add(self, transformer_id, voltage, current, trip_status, timestamp):
+        """Apply one reading; returns False if it is not newer than the last one applied"""
+        ts = _epoch(timestamp)
+        c = self._columns
+        with self._lock:
+            slot = self._slot(transformer_id)
+            if ts <= c['last_ts'][slot]:
+                return False
+            count = c['count'][slot] + 1
+            c['count'][slot] = count
+
+            # Welford
+            delta = current - c['mean_i'][slot]
+            c['mean_i'][slot] += delta / count
+            c['m2_i'][slot] += delta * (current - c['mean_i'][slot])
+
+            # Time-decayed EWMA (first reading seeds it)
+            if count == 1:
+                c['ewma_i'][slot] = current
+                c['ewma_v'][slot] = voltage
+            else:
+                alpha = 1 - math.exp(-(ts - c['last_ts'][slot]) / self.ewma_seconds)
+                diff = current - c['ewma_i'][slot]
+                increment = alpha * diff
+                c['ewma_i'][slot] += increment
+                c['ewmvar_i'][slot] = (1 - alpha) * (c['ewmvar_i'][slot] + diff * increment)
+                c['ewma_v'][slot] += alpha * (voltage - c['ewma_v'][slot])
+
+            if current > c['peak_i'][slot]:
+                c['peak_i'][slot] = current
+            if trip_status:
+                c['trips'][slot] += 1
+                c['last_trip'][slot] = ts
+            c['last_ts'][slot] = ts
+            self._dirty.add(transformer_id)
+        return True
+
+    def add_rows(self, rows):
+        """Apply reading dicts (prepare_reading rows) in timestamp order"""
+        for row in sorted(rows, key=lambda row: row['timestamp']):
+            self.add(row['transformer_id'], row['voltage'], row['current'], row['trip_status'], row['timestamp'])
+
+    def last_timestamp(self, transformer_id):
+        with self._lock:
+            slot = self._slots.get(transformer_id)
+            return _datetime(self._columns['last_ts'][slot]) if slot is not None else None
+
+    def _derived(self, slot, now):
+        """Metrics of one slot (caller holds the lock)"""
+        c = self._columns
+        count = c['count'][slot]
+        ewma_i = c['ewma_i'][slot]
+        utilization = ewma_i / self.rated_current if self.rated_current else 0.0
+        voltage_deviation = (c['ewma_v'][slot] - self.nominal_voltage) / self.nominal_voltage * 100
+        since_trip = now - c['last_trip'][slot] if not math.isnan(c['last_trip'][slot]) else math.inf
+
+        load_penalty = min(max(utilization - 0.8, 0.0) / 0.4, 1.0)
+        voltage_penalty = min(abs(voltage_deviation) / 10, 1.0)
+        trip_penalty = math.exp(-max(since_trip, 0.0) / 86400) if math.isfinite(since_trip) else 0.0
+        return {
+            'current': ewma_i,
+            'current_std': math.sqrt(max(c['ewmvar_i'][slot], 0.0)),
+            'current_mean': c['mean_i'][slot],
+            'current_mean_std': math.sqrt(c['m2_i'][slot] / (count - 1)) if count > 1 else 0.0,
+            'peak_current': c['peak_i'][slot],
+            'load_factor': c['mean_i'][slot] / c['peak_i'][slot] if c['peak_i'][slot] else 0.0,
+            'utilization': utilization,
+            'voltage': c['ewma_v'][slot],
+            'voltage_deviation': abs(voltage_deviation),
+            'voltage_deviation_pct': voltage_deviation,
+            'since_trip': since_trip,
+            'health': 100 - 40 * load_penalty - 30 * voltage_penalty - 30 * trip_penalty,
+        }
+
+    def _record(self, slot, now):
+        c = self._columns
+        metrics = self._derived(slot, now)
+        return {
+            'transformer_id': self._ids[slot],
+            'readings': int(c['count'][slot]),
+            'current': round(metrics['current'], 3),
+            'current_std': round(metrics['current_std'], 3),
+            'current_mean': round(metrics['current_mean'], 3),
+            'current_mean_std': round(metrics['current_mean_std'], 3),
+            'peak_current': metrics['peak_current'],
+            'load_factor': round(metrics['load_factor'], 3),
+            'utilization': round(metrics['utilization'], 3),
+            'voltage': round(metrics['voltage'], 1),
+            'voltage_deviation_pct': round(metrics['voltage_deviation_pct'], 2),
+            'trips': int(c['trips'][slot]),
+            'last_trip_at': _datetime(c['last_trip'][slot]).isoformat()
+            if not math.isnan(c['last_trip'][slot]) else None,
+            'seconds_since_trip': round(metrics['since_trip']) if math.isfinite(metrics['since_trip']) else None,
+            'last_reading_at': _datetime(c['last_ts'][slot]).isoformat(),
+            'health': round(metrics['health'], 1),
+        }
+
+    def get(self, transformer_id, now=None):
+        """Stats of one transformer, or None if it has no readings yet"""
+        now = time.time() if now is None else now
+        with self._lock:
+            slot = self._slots.get(transformer_id)
+            if slot is None or not self._columns['count'][slot]:
+                return None
+            return self._record(slot, now)
+
+    def top(self, k=10, by='utilization', now=None):
+        """
+        The k transformers ranked by `by` (see RANKINGS): largest first for
+        load metrics, smallest first for load_factor, health and since_trip
+        """
+        now = time.time() if now is None else now
+        pick = heapq.nlargest if RANKINGS[by] else heapq.nsmallest
+        with self._lock:
+            slots = [slot for slot in range(len(self._ids)) if self._columns['count'][slot]]
+            ranked = pick(k, slots, key=self._sort_key(by, now))
+            return [self._record(slot, now) for slot in ranked]
+
+    def _sort_key(self, by, now):
+        """Key function over the raw columns, ordering slots like the `by` metric"""
+        c = self._columns
+        if by in ('utilization', 'current'):
+            return c['ewma_i'].__getitem__
+        if by == 'current_std':
+            return c['ewmvar_i'].__getitem__
+        if by == 'voltage_deviation':
+            ewma_v, nominal = c['ewma_v'], self.nominal_voltage
+            return lambda slot: abs(ewma_v[slot] - nominal)
+        if by == 'load_factor':
+            mean_i, peak_i = c['mean_i'], c['peak_i']
+            return lambda slot: mean_i[slot] / peak_i[slot] if peak_i[slot] else 0.0
+        if by == 'since_trip':
+            last_trip = c['last_trip']
+            return lambda slot: now - last_trip[slot] if not math.isnan(last_trip[slot]) else math.inf
+        return lambda slot: self._derived(slot, now)[by]
+
+    def fleet(self):
+        """Fleet totals: transformers tracked, mean utilization, trips"""
+        with self._lock:
+            active = [slot for slot in range(len(self._ids)) if self._columns['count'][slot]]
+            utilization = [self._columns['ewma_i'][slot] / self.rated_current for slot in active] \
+                if self.rated_current else []
+            return {
+                'transformers': len(active),
+                'mean_utilization': round(sum(utilization) / len(utilization), 3) if utilization else None,
+                'overloaded': sum(1 for value in utilization if value > 1),
+                'trips': int(sum(self._columns['trips'][slot] for slot in active)),
+            }
+
+    def stats(self):
+        """Memory use, for /health"""
+        with self._lock:
+            transformers = len(self._ids)
+            column_bytes = sum(sys.getsizeof(column) for column in self._columns.values())
+            dirty = len(self._dirty)
+        return {
+            'transformers': transformers,
+            'approx_bytes': column_bytes + sys.getsizeof(self._slots) + sys.getsizeof(self._ids),
+            'dirty': dirty,
+            'nominal_voltage': self.nominal_voltage,
+            'rated_current': self.rated_current,
+        }
+
+    # Checkpoints
+
+    def take_dirty(self):
+        """Rows for transformers changed since the last call"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return [
+                dict({field: self._columns[field][self._slots[tid]] for field in FIELDS}, transformer_id=tid)
+                for tid in dirty
+            ]
+
+    def restore(self, rows):
+        """Load checkpoint rows (as written by take_dirty)"""
+        with self._lock:
+            for row in rows:
+                slot = self._slot(row['transformer_id'])
+                for field in FIELDS:
+                    value = row[field]
+                    self._columns[field][slot] = _INITIAL[field] if value is None else value
+
+    def mark_dirty(self, transformer_ids):
+        with self._lock:
+            self._dirty.update(transformer_ids)
+
+
+def stats_table(metadata):
+    """Define the transformer_stats checkpoint table on the application's metadata"""
+    return Table(
+        'transformer_stats', metadata,
+        Column('transformer_id', String(50), primary_key=True),
+        *[Column(field, Float) for field in FIELDS],
+        Column('updated_at', DateTime, nullable=False),
+    )
+
+
+def _storable(value):
+    # MySQL has no infinities / NaN in FLOAT columns
+    return value if math.isfinite(value) else None
+
+
+def save_checkpoint(session, table, stats):
+    """Write transformers changed since the last checkpoint; returns how many"""
+    rows = stats.take_dirty()
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    try:
+        session.execute(delete(table).where(table.c.transformer_id.in_([row['transformer_id'] for row in rows])))
+        session.execute(insert(table), [
+            dict({field: _storable(row[field]) for field in FIELDS},
+                 transformer_id=row['transformer_id'], updated_at=now)
+            for row in rows
+        ])
+        session.commit()
+    except Exception:
+        session.rollback()
+        stats.mark_dirty(row['transformer_id'] for row in rows)
+        raise
+    return len(rows)
+
+
+def load_checkpoint(session, table, stats):
+    """Restore stats from the checkpoint table; returns how many transformers"""
+    rows = session.execute(select(table)).mappings().all()
+    stats.restore(rows)
+    return len(rows)
+
+
+def catch_up(stats, transformer_ids, load):
+    """
+    Replay readings newer than each transformer's checkpoint. `load(tid,
+    since)` returns READING_FIELDS tuples newer than `since` (None = all).
+    Returns the number of readings applied.
+    """
+    applied = 0
+    for transformer_id in transformer_ids:
+        rows = load(transformer_id, stats.last_timestamp(transformer_id))
+        for _, tid, voltage, current, trip_status, timestamp in sorted(rows, key=lambda row: row[5]):
+            applied += stats.add(tid, voltage, current, bool(trip_status), timestamp)
+    return applied
+
+
+def start_checkpointer(app, session_factory, table, stats, interval):
+    """Run save_checkpoint every `interval` seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    saved = save_checkpoint(session_factory(), table, stats)
+                    if saved:
+                        app.logger.info(f"Checkpointed load stats of {saved} transformers")
+                except Exception as e:
+                    app.logger.warning(f"Load stats checkpoint failed: {e}")
+
+    thread = threading.Thread(target=run, name='load-stats-checkpoint', daemon=True)
+    thread.start()
+    return thread
+
+
+def create_load_stats():
+    """Build the stats from STATS_NOMINAL_VOLTAGE / STATS_RATED_CURRENT / STATS_EWMA_SECONDS"""
+    return LoadStats(
+        nominal_voltage=float(os.getenv('STATS_NOMINAL_VOLTAGE', '230')),
+        rated_current=float(os.getenv('STATS_RATED_CURRENT', '10')),
+        ewma_seconds=float(os.getenv('STATS_EWMA_SECONDS', '900')),
+    )
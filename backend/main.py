@@ -1,16 +1,26 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from starlette.requests import HTTPConnection
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import asyncio
+import codecs
+import importlib
+import json
 import subprocess
 import tempfile
 import os
-import re
 import sys
-from typing import Optional
-import openai
+import traceback
+import warnings
+from typing import Optional, Tuple
 from dotenv import load_dotenv
+from worker_pool import OutputLimitExceeded, WorkerPool, WorkerCrashed
+from execution_scheduler import ExecutionScheduler, QueueFull
+from explanation_cache import ExplanationCache
+from error_translation import translator as error_translator
+from startup import StartupTracker
 
 # Load environment variables
 load_dotenv()
@@ -26,15 +36,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
+# Slow initialization runs in the background after startup; see startup.py
+startup = StartupTracker()
+
+# OpenAI client, created on first use (importing the SDK takes most of a second)
 openai_client = None
-try:
+_openai_client_task = None
+
+def ai_configured() -> bool:
     api_key = os.getenv("OPENAI_API_KEY")
-    if api_key and api_key != "your_openai_api_key_here":
-        openai_client = openai.OpenAI(api_key=api_key)
-except Exception as e:
-    print(f"OpenAI client initialization failed: {e}")
-    print("AI explanation feature will be disabled")
+    return bool(api_key) and api_key != "your_openai_api_key_here"
+
+def create_openai_client():
+    try:
+        import openai
+        return openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    except Exception as e:
+        print(f"OpenAI client initialization failed: {e}")
+        print("AI explanation feature will be disabled")
+        return None
+
+async def get_openai_client():
+    """
+    The shared OpenAI client, or None when AI is not configured. The SDK is
+    imported on a worker thread the first time, so the event loop keeps serving.
+    """
+    global openai_client, _openai_client_task
+    if openai_client is not None or not ai_configured():
+        return openai_client
+    if _openai_client_task is None:
+        _openai_client_task = asyncio.ensure_future(asyncio.to_thread(create_openai_client))
+    openai_client = await asyncio.shield(_openai_client_task)
+    return openai_client
+
+# AI explanation settings; bump PROMPT_VERSION whenever the prompt changes so
+# cached explanations made with the old prompt are not reused
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+PROMPT_VERSION = "1"
+
+# Upper bound on concurrent requests to the model
+explain_semaphore = asyncio.Semaphore(int(os.getenv("EXPLAIN_MAX_CONCURRENCY", "8")))
+
+# Cache of explanations keyed by normalized code + model + prompt version
+explanation_cache = ExplanationCache(
+    max_entries=int(os.getenv("EXPLAIN_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("EXPLAIN_CACHE_TTL", str(7 * 24 * 3600))),
+    path=os.getenv("EXPLAIN_CACHE_PATH") or None
+)
+
+# Warm interpreter pool for code execution (EXECUTION_POOL_SIZE=0 disables it)
+execution_pool = None
+if WorkerPool.is_supported() and int(os.getenv("EXECUTION_POOL_SIZE", str(os.cpu_count() or 1))) > 0:
+    execution_pool = WorkerPool(
+        size=int(os.getenv("EXECUTION_POOL_SIZE", str(os.cpu_count() or 1))),
+        max_runs=int(os.getenv("EXECUTION_MAX_RUNS", "50")),
+        memory_limit_mb=int(os.getenv("EXECUTION_MEMORY_LIMIT_MB", "256"))
+    )
+
+async def load_openai_client():
+    if await get_openai_client() is None:
+        raise RuntimeError("OpenAI client initialization failed")
+
+# Docker sandbox (DOCKER_ENABLED=true). Until its image and containers are
+# ready, code runs in the interpreter pool or a local subprocess.
+docker_executor = None
+DOCKER_STEPS = ("docker.import", "docker.client", "docker.image", "docker.containers")
+
+async def start_docker_executor():
+    global docker_executor
+    with startup.step("docker.import"):
+        module = await asyncio.to_thread(importlib.import_module, "docker_executor")
+    await module.docker_executor.initialize(tracker=startup)
+    if not module.docker_executor.is_available():
+        startup.skip_pending(*DOCKER_STEPS, reason="skipped")
+        raise RuntimeError("Docker not available")
+    docker_executor = module.docker_executor
+
+@app.on_event("startup")
+async def start_background_init():
+    if execution_pool:
+        startup.start("execution_pool", execution_pool.start())
+    else:
+        startup.disable("execution_pool")
+    
+    if ai_configured():
+        startup.start("openai_client", load_openai_client())
+    else:
+        startup.disable("openai_client", "OPENAI_API_KEY not set")
+    
+    if os.getenv("DOCKER_ENABLED", "false").lower() == "true":
+        startup.expect(*DOCKER_STEPS)
+        startup.start("docker", start_docker_executor())
+    else:
+        startup.disable("docker", "DOCKER_ENABLED is not true")
+
+@app.on_event("shutdown")
+async def stop_background_init():
+    await startup.stop()
+    if execution_pool:
+        await execution_pool.stop()
+    if docker_executor:
+        await docker_executor.shutdown()
 
 class CodeExecutionRequest(BaseModel):
     code: str
@@ -42,50 +144,112 @@ class CodeExecutionRequest(BaseModel):
 class CodeExplanationRequest(BaseModel):
     code: str
 
+class ErrorDetails(BaseModel):
+    type: str
+    message: str
+    tip: Optional[str] = None
+    line: Optional[int] = None
+    column: Optional[int] = None
+
 class ExecutionResponse(BaseModel):
     output: str
     error: Optional[str] = None
     execution_time: Optional[float] = None
+    error_details: Optional[ErrorDetails] = None
 
 class ExplanationResponse(BaseModel):
     explanation: str
     error: Optional[str] = None
 
-def translate_error_message(error_msg: str) -> str:
-    """
-    Translate Python error messages into beginner-friendly language
-    """
-    translations = {
-        r"SyntaxError: invalid syntax": "Syntax Error: There's a mistake in your code structure. Check for missing colons (:), parentheses, or quotes.",
-        r"IndentationError: expected an indented block": "Indentation Error: Python needs proper spacing. After lines ending with ':', the next line should be indented (4 spaces).",
-        r"IndentationError: unindent does not match any outer indentation level": "Indentation Error: Your spacing doesn't match. Make sure all lines at the same level have the same indentation.",
-        r"NameError: name '(.+?)' is not defined": r"Variable Error: The variable '\1' hasn't been created yet. Make sure you define it before using it.",
-        r"TypeError: unsupported operand type\(s\) for (.+?): '(.+?)' and '(.+?)'": r"Type Error: You can't use '\1' with \2 and \3. Make sure both values are compatible types.",
-        r"ZeroDivisionError": "Division Error: You're trying to divide by zero, which isn't allowed in math!",
-        r"IndexError: list index out of range": "List Error: You're trying to access an item that doesn't exist in the list. Check the list length.",
-        r"KeyError: '(.+?)'": r"Dictionary Error: The key '\1' doesn't exist in the dictionary. Check your spelling or add the key first.",
-        r"ValueError: (.+)": r"Value Error: \1. Make sure you're using the right type of value.",
-        r"AttributeError: '(.+?)' object has no attribute '(.+?)'": r"Attribute Error: \1 doesn't have a '\2' method or property. Check the documentation for available methods.",
-    }
+def translate_error(error: str, filename: str = "<main>",
+                    executor: Optional[str] = None) -> Tuple[str, Optional[ErrorDetails]]:
+    """
+    Translate interpreter error output into beginner-friendly language.
+    Returns (friendly text, structured details); details is None when the
+    output does not end in an exception. `executor` picks executor-specific tips.
+    """
+    translated = error_translator.translate(error, filename, executor)
+    if translated is None:
+        return error, None
+    return translated.text, ErrorDetails(
+        type=translated.type,
+        message=translated.message,
+        tip=translated.tip,
+        line=translated.line
+    )
+
+def build_execution_response(output: str, error: str, filename: str = "<main>",
+                             executor: Optional[str] = None) -> ExecutionResponse:
+    """
+    Turn raw stdout/stderr into the API response. `filename` is the name the
+    code ran under, used to report the line of the error; `executor` is where
+    it ran ("docker", "pool" or "subprocess").
+    """
+    output = output.strip()
+    error = error.strip()
     
-    friendly_error = error_msg
-    for pattern, replacement in translations.items():
-        friendly_error = re.sub(pattern, replacement, friendly_error, flags=re.IGNORECASE)
+    if error:
+        friendly_error, details = translate_error(error, filename, executor)
+        return ExecutionResponse(output=output, error=friendly_error, error_details=details)
     
-    # Add helpful suggestions
-    if "SyntaxError" in error_msg:
-        friendly_error += "\n💡 Tip: Check for missing parentheses, quotes, or colons."
-    elif "IndentationError" in error_msg:
-        friendly_error += "\n💡 Tip: Use 4 spaces for indentation after colons (:)."
-    elif "NameError" in error_msg:
-        friendly_error += "\n💡 Tip: Make sure you've defined the variable before using it."
+    return ExecutionResponse(output=output or "Code executed successfully (no output)")
+
+TIMEOUT_MESSAGE = "Execution timed out after 10 seconds. Your code might have an infinite loop."
+
+def hide_temp_path(text: str, path: str) -> str:
+    """Show the temporary file the subprocess path runs as <main>, like the pool does"""
+    return text.replace(path, "<main>")
+
+# Code larger than this skips the in-process syntax check and goes straight to the sandbox
+PRECHECK_MAX_CODE_SIZE = 100_000
+precheck_stats = {"checked": 0, "syntax_errors": 0}
+
+def check_syntax(code: str) -> Optional[ExecutionResponse]:
+    """
+    Compile (without running) the code in-process. Returns the friendly error
+    response for SyntaxError/IndentationError, or None if the code compiles
+    and should be sent to the sandbox.
+    """
+    if len(code) > PRECHECK_MAX_CODE_SIZE:
+        return None
     
-    return friendly_error
+    precheck_stats["checked"] += 1
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            compile(code, "<main>", "exec", dont_inherit=True)
+        return None
+    except SyntaxError as e:
+        precheck_stats["syntax_errors"] += 1
+        # Same text the interpreter would print, so the same rules apply
+        stderr = "".join(traceback.format_exception_only(type(e), e)).strip()
+        friendly_error, details = translate_error(stderr)
+        if details is None:
+            details = ErrorDetails(type=type(e).__name__, message=e.msg)
+        details.line = e.lineno
+        details.column = e.offset
+        return ExecutionResponse(
+            output="",
+            error=friendly_error,
+            execution_time=0.0,
+            error_details=details
+        )
+    except (ValueError, MemoryError, RecursionError):
+        # e.g. null bytes or pathological nesting: let the sandbox report it
+        return None
 
 async def execute_python_code_safely(code: str) -> ExecutionResponse:
     """
-    Execute Python code safely in a subprocess with timeout
+    Execute Python code safely with timeout: in a Docker container once the
+    sandbox is ready, else in a warm pool worker, else in a fresh subprocess
     """
+    if docker_executor is not None and docker_executor.is_available():
+        stdout, stderr = await docker_executor.execute_code(code, timeout=10)
+        return build_execution_response(stdout, stderr, filename="<stdin>", executor="docker")
+    
+    if execution_pool:
+        return await run_in_pool(code)
+    
     try:
         # Create a temporary file with the code
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp_file:
@@ -106,19 +270,13 @@ async def execute_python_code_safely(code: str) -> ExecutionResponse:
                 stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=10.0)
             except asyncio.TimeoutError:
                 process.kill()
-                return ExecutionResponse(
-                    output="",
-                    error="Execution timed out after 10 seconds. Your code might have an infinite loop."
-                )
-            
-            output = stdout.decode('utf-8', errors='replace').strip()
-            error = stderr.decode('utf-8', errors='replace').strip()
+                return ExecutionResponse(output="", error=TIMEOUT_MESSAGE)
             
-            if error:
-                friendly_error = translate_error_message(error)
-                return ExecutionResponse(output=output, error=friendly_error)
-            
-            return ExecutionResponse(output=output or "Code executed successfully (no output)")
+            return build_execution_response(
+                stdout.decode('utf-8', errors='replace'),
+                hide_temp_path(stderr.decode('utf-8', errors='replace'), tmp_file_path),
+                executor="subprocess"
+            )
             
         finally:
             # Clean up temporary file
@@ -133,18 +291,159 @@ async def execute_python_code_safely(code: str) -> ExecutionResponse:
             error=f"Internal error: {str(e)}"
         )
 
-async def explain_code_with_ai(code: str) -> ExplanationResponse:
+# Streaming execution limits
+STREAM_OUTPUT_LIMIT = int(os.getenv("STREAM_OUTPUT_LIMIT", str(1024 * 1024)))  # bytes
+STREAM_BUFFER_CHUNKS = int(os.getenv("STREAM_BUFFER_CHUNKS", "64"))
+DISCONNECT_POLL_SECONDS = 1.0  # how often a silent stream checks that its client is still there
+OUTPUT_LIMIT_MESSAGE = f"Execution stopped: your program printed more than {STREAM_OUTPUT_LIMIT} bytes of output."
+
+async def run_in_pool(code: str, emit=None) -> ExecutionResponse:
+    """Run code in a warm pool worker, streaming its output to `emit` if given"""
+    try:
+        if emit is None:
+            stdout, stderr = await execution_pool.execute(code, timeout=10.0)
+        else:
+            stdout, stderr = await execution_pool.execute(code, timeout=10.0, emit=emit,
+                                                          output_limit=STREAM_OUTPUT_LIMIT)
+        return build_execution_response(stdout, stderr, executor="pool")
+    except asyncio.TimeoutError:
+        return ExecutionResponse(output="", error=TIMEOUT_MESSAGE)
+    except OutputLimitExceeded:
+        return ExecutionResponse(output="", error=OUTPUT_LIMIT_MESSAGE)
+    except WorkerCrashed:
+        return ExecutionResponse(
+            output="",
+            error="Execution stopped: your code used too much memory or CPU time."
+        )
+    except Exception as e:
+        return ExecutionResponse(output="", error=f"Internal error: {str(e)}")
+
+async def stream_python_execution(code: str, events: asyncio.Queue) -> ExecutionResponse:
     """
-    Use OpenAI to explain the code in beginner-friendly terms
+    Execute Python code where /api/execute would (Docker sandbox, else warm
+    pool, else subprocess) and put ("stdout" | "stderr", text) chunks on
+    `events` as they are produced. `events` is bounded: when the client reads
+    slowly the executor stops reading output, which in turn pauses the
+    program. Returns the final ExecutionResponse summary; runs stopped early
+    report the output streamed so far.
     """
-    if not openai_client:
-        return ExplanationResponse(
-            explanation="",
-            error="AI explanation not available. OpenAI API key not configured."
+    collected = {"stdout": [], "stderr": []}
+    
+    async def emit(name, text):
+        collected[name].append(text)
+        await events.put((name, text))
+    
+    if docker_executor is not None and docker_executor.is_available():
+        stdout, stderr = await docker_executor.execute_code(
+            code, timeout=10, emit=emit, output_limit=STREAM_OUTPUT_LIMIT
         )
+        response = build_execution_response(stdout, stderr, filename="<stdin>", executor="docker")
+    elif execution_pool:
+        response = await run_in_pool(code, emit)
+    else:
+        response = await stream_python_subprocess(code, emit)
+    if not response.output:
+        response.output = "".join(collected["stdout"]).strip()
+    return response
+
+async def stream_python_subprocess(code: str, emit) -> ExecutionResponse:
+    """
+    Run code in an unbuffered subprocess, awaiting emit(name, text) for each
+    chunk of output. The process is killed once it writes more than
+    STREAM_OUTPUT_LIMIT bytes, and when the run is cancelled. stderr is
+    passed on a line at a time so the temporary file's path can be hidden.
+    """
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp_file:
+        tmp_file.write(code)
+        tmp_file_path = tmp_file.name
+    
+    process = None
+    collected = {"stdout": [], "stderr": []}
+    written = 0
+    limit_exceeded = False
     
     try:
-        prompt = f"""
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", tmp_file_path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=tempfile.gettempdir()
+        )
+        
+        async def send(name, text):
+            if name == "stderr":
+                text = hide_temp_path(text, tmp_file_path)
+            collected[name].append(text)
+            await emit(name, text)
+        
+        async def pump(stream, name):
+            nonlocal written, limit_exceeded
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            partial_line = ""
+            while True:
+                chunk = await stream.read(4096)
+                if not chunk or limit_exceeded:
+                    break
+                # Coalesce writes that arrive within a few ms into one event
+                try:
+                    while len(chunk) < 4096:
+                        more = await asyncio.wait_for(stream.read(4096 - len(chunk)), timeout=0.01)
+                        if not more:
+                            break
+                        chunk += more
+                except asyncio.TimeoutError:
+                    pass
+                if written + len(chunk) > STREAM_OUTPUT_LIMIT:
+                    chunk = chunk[:STREAM_OUTPUT_LIMIT - written]
+                    limit_exceeded = True
+                    process.kill()
+                written += len(chunk)
+                text = decoder.decode(chunk)
+                if name == "stderr":
+                    # Hold back an unfinished line: the path may continue in the next chunk
+                    text = partial_line + text
+                    cut = text.rfind("\n") + 1
+                    text, partial_line = text[:cut], text[cut:]
+                if text:
+                    await send(name, text)
+            if partial_line:
+                await send(name, partial_line)
+        
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"), process.wait()),
+                timeout=10.0
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return ExecutionResponse(output="".join(collected["stdout"]).strip(), error=TIMEOUT_MESSAGE)
+        
+        if limit_exceeded:
+            await process.wait()
+            return ExecutionResponse(output="".join(collected["stdout"]).strip(), error=OUTPUT_LIMIT_MESSAGE)
+        
+        return build_execution_response(
+            "".join(collected["stdout"]), "".join(collected["stderr"]), executor="subprocess"
+        )
+    
+    except Exception as e:
+        return ExecutionResponse(output="", error=f"Internal error: {str(e)}")
+    
+    finally:
+        if process is not None and process.returncode is None:
+            process.kill()  # cancelled: the client went away
+        try:
+            os.unlink(tmp_file_path)
+        except OSError:
+            pass
+
+def build_explanation_messages(code: str) -> list:
+    """
+    Chat messages asking the model to explain the code
+    """
+    prompt = f"""
 You are a Python programming tutor helping beginners understand code. 
 Explain the following Python code in simple, clear terms that a beginner can understand.
 
@@ -161,21 +460,34 @@ Please provide:
 
 Keep your explanation friendly, clear, and educational. Use simple language and avoid jargon when possible.
 """
+    return [
+        {"role": "system", "content": "You are a helpful Python programming tutor for beginners."},
+        {"role": "user", "content": prompt}
+    ]
+
+AI_NOT_CONFIGURED = "AI explanation not available. OpenAI API key not configured."
 
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful Python programming tutor for beginners."},
-                    {"role": "user", "content": prompt}
-                ],
+async def explain_code_with_ai(code: str) -> ExplanationResponse:
+    """
+    Use OpenAI to explain the code in beginner-friendly terms
+    """
+    client = await get_openai_client()
+    if not client:
+        return ExplanationResponse(explanation="", error=AI_NOT_CONFIGURED)
+    
+    async def request_explanation():
+        async with explain_semaphore:
+            response = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=build_explanation_messages(code),
                 max_tokens=500,
                 temperature=0.7
             )
-        )
-        
-        explanation = response.choices[0].message.content
+        return response.choices[0].message.content
+    
+    try:
+        key = ExplanationCache.make_key(code, OPENAI_MODEL, PROMPT_VERSION)
+        explanation = await explanation_cache.get_or_compute(key, request_explanation)
         return ExplanationResponse(explanation=explanation)
         
     except Exception as e:
@@ -184,20 +496,292 @@ Keep your explanation friendly, clear, and educational. Use simple language and
             error=f"AI explanation failed: {str(e)}"
         )
 
+async def stream_explanation_with_ai(code: str):
+    """
+    Yield ("token", text) pieces as the model generates them, then
+    ("result", ExplanationResponse). Cached explanations are sent as one piece.
+    Concurrent requests for the same code share one upstream stream, which is
+    closed when the last of them goes away; completed ones are cached.
+    """
+    client = await get_openai_client()
+    if not client:
+        yield "result", ExplanationResponse(explanation="", error=AI_NOT_CONFIGURED)
+        return
+    
+    async def request_tokens():
+        async with explain_semaphore:
+            stream = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=build_explanation_messages(code),
+                max_tokens=500,
+                temperature=0.7,
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        yield text
+            finally:
+                await stream.close()  # release the connection, also when cancelled
+    
+    key = ExplanationCache.make_key(code, OPENAI_MODEL, PROMPT_VERSION)
+    pieces = explanation_cache.stream_or_compute(key, request_tokens)
+    parts = []
+    try:
+        async for text in pieces:
+            parts.append(text)
+            yield "token", text
+    except Exception as e:
+        yield "result", ExplanationResponse(explanation="".join(parts), error=f"AI explanation failed: {str(e)}")
+        return
+    finally:
+        await pieces.aclose()
+    
+    yield "result", ExplanationResponse(explanation="".join(parts))
+
+# Bounded, fair scheduling of executions (EXECUTION_WORKERS defaults to the core count)
+execution_scheduler = ExecutionScheduler(
+    execute_python_code_safely,
+    workers=int(os.getenv("EXECUTION_WORKERS", str(os.cpu_count() or 1))),
+    max_queue=int(os.getenv("EXECUTION_QUEUE_LIMIT", "64")),
+    max_queue_per_client=int(os.getenv("EXECUTION_CLIENT_QUEUE_LIMIT", "8")),
+    retry_after=int(os.getenv("EXECUTION_RETRY_AFTER", "5"))
+)
+
+@app.on_event("startup")
+async def start_execution_scheduler():
+    await execution_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_execution_scheduler():
+    await execution_scheduler.stop()
+
+def get_client_id(http_request: HTTPConnection) -> str:
+    """
+    Identify the client for fair queuing: X-Client-Id header, else the peer address
+    """
+    client_id = http_request.headers.get("X-Client-Id")
+    if client_id:
+        return client_id[:64]
+    return http_request.client.host if http_request.client else "unknown"
+
+def queue_full_response(e: QueueFull) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The server is busy running other code. Please try again in a few seconds."},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def job_result(job) -> ExecutionResponse:
+    if job.result is None:
+        return ExecutionResponse(output="", error=f"Internal error: {job.error}")
+    job.result.execution_time = round(job.run_time, 4)
+    return job.result
+
+def close_events(events: asyncio.Queue):
+    """
+    End an event stream without waiting for its reader: when the buffer is
+    full the oldest chunk is dropped (the final result repeats all output)
+    """
+    while True:
+        try:
+            events.put_nowait(None)
+            return
+        except asyncio.QueueFull:
+            events.get_nowait()
+
+def submit_streaming_job(client_id: str, code: str):
+    """
+    Queue a streaming execution. Returns (job, events); events yields
+    ("stdout" | "stderr", text) chunks and ends with None.
+    """
+    events = asyncio.Queue(maxsize=STREAM_BUFFER_CHUNKS)
+    
+    async def run(code):
+        try:
+            return await stream_python_execution(code, events)
+        finally:
+            close_events(events)
+    
+    job = execution_scheduler.submit(client_id, code, run_fn=run)
+    return job, events
+
+async def streaming_job_events(job, events, is_disconnected=None):
+    """
+    Output chunks followed by the final ExecutionResponse as a "result" event.
+    `is_disconnected` is polled while no output arrives; the job is cancelled
+    when it returns True or the consumer stops early.
+    """
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), timeout=DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                continue
+            if item is None:
+                break
+            yield item
+        await job.done.wait()
+        yield "result", jsonable_encoder(job_result(job))
+    finally:
+        execution_scheduler.cancel(job)
+
 @app.get("/")
 async def root():
     return {"message": "Python IDE Backend API", "status": "running"}
 
 @app.post("/api/execute", response_model=ExecutionResponse)
-async def execute_code(request: CodeExecutionRequest):
+async def execute_code(request: CodeExecutionRequest, http_request: Request):
     """
     Execute Python code safely and return output or error
     """
     if not request.code.strip():
         raise HTTPException(status_code=400, detail="No code provided")
     
-    result = await execute_python_code_safely(request.code)
-    return result
+    syntax_error = check_syntax(request.code)
+    if syntax_error:
+        return syntax_error
+    
+    try:
+        job = await execution_scheduler.run(get_client_id(http_request), request.code)
+    except QueueFull as e:
+        return queue_full_response(e)
+    return job_result(job)
+
+@app.post("/api/execute/stream")
+async def execute_code_stream(request: CodeExecutionRequest, http_request: Request):
+    """
+    Execute Python code and stream output as server-sent events:
+    'stdout' / 'stderr' events as output is produced, then one 'result' event
+    """
+    if not request.code.strip():
+        raise HTTPException(status_code=400, detail="No code provided")
+    
+    syntax_error = check_syntax(request.code)
+    if syntax_error:
+        result = json.dumps(jsonable_encoder(syntax_error))
+        return StreamingResponse(iter([f"event: result\ndata: {result}\n\n"]), media_type="text/event-stream")
+    
+    try:
+        job, events = submit_streaming_job(get_client_id(http_request), request.code)
+    except QueueFull as e:
+        return queue_full_response(e)
+    
+    async def sse():
+        stream = streaming_job_events(job, events, http_request.is_disconnected)
+        try:
+            async for event, data in stream:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            await stream.aclose()  # cancels the job if the client went away
+    
+    return StreamingResponse(sse(), media_type="text/event-stream")
+
+@app.websocket("/api/execute/ws")
+async def execute_code_ws(websocket: WebSocket):
+    """
+    WebSocket variant of /api/execute/stream. The client sends {"code": "..."};
+    the server sends {"type": "stdout" | "stderr", "data": "..."} messages and
+    finally {"type": "result", "data": ExecutionResponse}. The client sends
+    nothing else: a disconnect (or any further message) cancels the run.
+    """
+    await websocket.accept()
+    stream = receiver = None
+    try:
+        message = await websocket.receive_json()
+        code = message.get("code", "") if isinstance(message, dict) else ""
+        if not code.strip():
+            await websocket.send_json({"type": "error", "data": "No code provided"})
+            await websocket.close(code=1003)
+            return
+        
+        syntax_error = check_syntax(code)
+        if syntax_error:
+            await websocket.send_json({"type": "result", "data": jsonable_encoder(syntax_error)})
+            await websocket.close()
+            return
+        
+        try:
+            job, events = submit_streaming_job(get_client_id(websocket), code)
+        except QueueFull as e:
+            await websocket.send_json({"type": "error", "data": "Server busy", "retry_after": e.retry_after})
+            await websocket.close(code=1013)  # Try again later
+            return
+        
+        receiver = asyncio.create_task(websocket.receive())
+        
+        async def client_gone():
+            return receiver.done()
+        
+        stream = streaming_job_events(job, events, client_gone)
+        async for event, data in stream:
+            await websocket.send_json({"type": event, "data": data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if stream is not None:
+            await stream.aclose()  # cancels the job if the client went away
+        if receiver is not None:
+            receiver.cancel()
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: CodeExecutionRequest, http_request: Request):
+    """
+    Queue code for execution and return a job id to poll or stream
+    """
+    if not request.code.strip():
+        raise HTTPException(status_code=400, detail="No code provided")
+    
+    syntax_error = check_syntax(request.code)
+    if syntax_error:
+        job = execution_scheduler.record_finished(get_client_id(http_request), request.code, syntax_error)
+        return {"job_id": job.id, "status": job.status}
+    
+    try:
+        job = execution_scheduler.submit(get_client_id(http_request), request.code)
+    except QueueFull as e:
+        return queue_full_response(e)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Current status of a job, with its result once finished
+    """
+    job = execution_scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.done.is_set():
+        job_result(job)
+    return jsonable_encoder(job.to_dict())
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """
+    Server-sent events: a 'status' event on every change, then one 'result' event
+    """
+    job = execution_scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_status = None
+        while not job.done.is_set():
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps({'job_id': job.id, 'status': job.status})}\n\n"
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+        job_result(job)
+        yield f"event: result\ndata: {json.dumps(jsonable_encoder(job.to_dict()))}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.post("/api/explain", response_model=ExplanationResponse)
 async def explain_code(request: CodeExplanationRequest):
@@ -210,6 +794,32 @@ async def explain_code(request: CodeExplanationRequest):
     result = await explain_code_with_ai(request.code)
     return result
 
+@app.post("/api/explain/stream")
+async def explain_code_stream(request: CodeExplanationRequest, http_request: Request):
+    """
+    Explain Python code using AI, streaming tokens as server-sent events:
+    'token' events while the model writes, then one 'result' event
+    """
+    if not request.code.strip():
+        raise HTTPException(status_code=400, detail="No code provided")
+    
+    async def sse():
+        stream = stream_explanation_with_ai(request.code)
+        try:
+            async for event, data in stream:
+                if await http_request.is_disconnected():
+                    break
+                yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+        finally:
+            await stream.aclose()  # lets the shared upstream stream close if nobody else reads it
+    
+    return StreamingResponse(sse(), media_type="text/event-stream")
+
+def current_executor() -> str:
+    if docker_executor is not None and docker_executor.is_available():
+        return "docker"
+    return "pool" if execution_pool else "subprocess"
+
 @app.get("/api/health")
 async def health_check():
     """
@@ -218,13 +828,24 @@ async def health_check():
     return {
         "status": "healthy",
         "ai_available": openai_client is not None,
+        "executor": current_executor(),
+        "startup": startup.status(),
+        "docker": docker_executor.stats() if docker_executor else None,
+        "explanation_cache": explanation_cache.stats(),
+        "execution_pool": execution_pool.stats() if execution_pool else None,
+        "scheduler": execution_scheduler.stats(),
+        "syntax_precheck": {
+            **precheck_stats,
+            "sandbox_runs_saved": precheck_stats["syntax_errors"]
+        },
+        "error_rules": len(error_translator),
         "python_version": f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
     }
 
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting Python IDE Backend Server...")
-    print(f"🤖 OpenAI API available: {openai_client is not None}")
+    print(f"🤖 OpenAI API configured: {ai_configured()}")
     print("📡 Server will be available at: http://localhost:8000")
     print("🔗 API docs available at: http://localhost:8000/docs")
     print("⏹️  Press Ctrl+C to stop the server")
@@ -0,0 +1,237 @@
+"""
+In-memory ring buffer of the most recent readings per transformer
+
+The dashboard polls get_readings for the last 25-50 readings and
+get_latest_reading every few seconds. Each transformer gets a fixed-size,
+preallocated slot array holding its newest RECENT_BUFFER_SIZE readings as
+READING_FIELDS tuples, newest at `head - 1`, so those requests are answered
+without touching the database:
+
+- add_reading pushes the inserted row (O(1) for in-order timestamps)
+- add_readings and compaction drop the transformer's buffer; the next read
+  reloads it with one query
+- a buffer is loaded on first use and warmed for every transformer at startup
+- `since` id cursors are answered from the buffer only when it can show no
+  reading with a higher id is missing (a late, back-dated reading may have
+  been dropped or evicted); otherwise they go to the database
+
+Memory is bounded by RECENT_BUFFER_SIZE rows per transformer known to the
+database (about 250 bytes per row) and reported by stats().
+
+Multiple workers: every process has its own buffers and only sees readings
+it ingested itself. With gunicorn -w N (or several app instances) set
+RECENT_BUFFER_MAX_AGE to the staleness you accept, e.g. the response cache
+TTL; each buffer is then reloaded from the database once it is that old.
+0 (default) keeps buffers until invalidated, correct for a single process.
+RECENT_BUFFER_SIZE=0 disables the buffer.
+"""
+import os
+import sys
+import threading
+import time
+
+
+class _Ring:
+    __slots__ = ('rows', 'head', 'size', 'loaded_at', 'complete', 'first_added_id', 'hidden_id')
+
+    def __init__(self, capacity, rows_newest_first, loaded_at):
+        self.rows = [None] * capacity
+        self.head = 0  # next slot to write
+        self.size = 0
+        self.loaded_at = loaded_at
+        # What an id cursor needs to know (see covers_ids): whether the load
+        # returned every stored reading, the lowest id pushed since, and the
+        # highest id of a reading that is stored but not buffered
+        self.complete = len(rows_newest_first) < capacity
+        self.first_added_id = None
+        self.hidden_id = 0
+        for row in reversed(rows_newest_first[:capacity]):
+            self._append(row)
+
+    def _hide(self, row):
+        if row[0] is not None and row[0] > self.hidden_id:
+            self.hidden_id = row[0]
+
+    def _append(self, row):
+        capacity = len(self.rows)
+        if self.size == capacity:
+            self._hide(self.rows[self.head])  # Evicting the oldest
+        self.rows[self.head] = row
+        self.head = (self.head + 1) % capacity
+        if self.size < capacity:
+            self.size += 1
+
+    def newest(self, limit):
+        capacity = len(self.rows)
+        return [self.rows[(self.head - 1 - i) % capacity] for i in range(min(limit, self.size))]
+
+    def push(self, row):
+        if row[0] is not None and (self.first_added_id is None or row[0] < self.first_added_id):
+            self.first_added_id = row[0]
+        if self.size == 0 or row[5] >= self.rows[(self.head - 1) % len(self.rows)][5]:
+            self._append(row)
+            return
+        # Late reading: put it in timestamp order, dropping it if it is older
+        # than everything kept in a full buffer
+        ordered = self.newest(self.size)[::-1]
+        if self.size == len(self.rows) and row[5] < ordered[0][5]:
+            self._hide(row)
+            return
+        ordered.append(row)
+        ordered.sort(key=lambda r: r[5])
+        for dropped in ordered[:-len(self.rows)]:
+            self._hide(dropped)
+        self.head = self.size = 0
+        for kept in ordered[-len(self.rows):]:
+            self._append(kept)
+
+    def covers_ids(self, since):
+        """
+        Whether every stored reading with an id above `since` is buffered.
+        Readings stored before the load have ids below the first one pushed
+        after it (ids only grow), so they are all <= since once
+        since >= first_added_id - 1, unless the load returned everything.
+        """
+        if self.hidden_id > since:
+            return False
+        return self.complete or (self.first_added_id is not None and since >= self.first_added_id - 1)
+
+
+def _row_bytes(row):
+    """Approximate memory of one buffered row (tuple + values, plus its slot)"""
+    return 8 + sys.getsizeof(row) + sum(
+        sys.getsizeof(value) for value in row if value is not None and not isinstance(value, bool)
+    )
+
+
+class RecentReadings:
+    def __init__(self, capacity=100, max_age=0):
+        self.capacity = capacity
+        self.max_age = max_age
+        self._rings = {}        # transformer_id -> _Ring
+        self._generations = {}  # transformer_id -> count of writes/invalidations
+        self._row_bytes = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.cursor_fallbacks = 0
+
+    def _fresh(self, ring):
+        return ring is not None and (not self.max_age or time.monotonic() - ring.loaded_at < self.max_age)
+
+    def get(self, transformer_id, limit):
+        """Newest `limit` rows, newest first, or None if not buffered"""
+        with self._lock:
+            ring = self._rings.get(transformer_id)
+            if self._fresh(ring):
+                self.hits += 1
+                return ring.newest(limit)
+            self.misses += 1
+            return None
+
+    def covers(self, limit):
+        """Whether requests for `limit` rows are answered from the buffer"""
+        return 0 < limit <= self.capacity
+
+    def read(self, transformer_id, limit, load):
+        """
+        Serve `limit` rows from the buffer, loading it on a miss. `load(n)`
+        returns the newest n rows from the database, or None if the
+        transformer does not exist. Limits above the capacity go to `load`.
+        """
+        if not self.covers(limit):
+            return load(limit)
+        rows = self.get(transformer_id, limit)
+        if rows is not None:
+            return rows
+        with self._lock:
+            generation = self._generations.get(transformer_id, 0)
+        rows = load(self.capacity)
+        if rows is not None:
+            self.fill(transformer_id, rows, generation)
+            rows = rows[:limit]
+        return rows
+
+    def read_since(self, transformer_id, limit, since, load):
+        """
+        Like read(), for an id cursor: the newest `limit` rows with an id above
+        `since`. A late (back-dated) reading can have a high id but an old
+        timestamp, so the whole buffer is searched, and `load(limit, since)`
+        answers instead when the buffer cannot show it holds every such row.
+        """
+        if not self.covers(limit):
+            return load(limit, since)
+        if self.read(transformer_id, self.capacity, load) is None:
+            return None
+        with self._lock:
+            ring = self._rings.get(transformer_id)
+            rows = ring.newest(ring.size) if ring is not None and ring.covers_ids(since) else None
+            if rows is None:
+                self.cursor_fallbacks += 1
+        if rows is None:
+            return load(limit, since)
+        return [row for row in rows if row[0] is not None and row[0] > since][:limit]
+
+    def fill(self, transformer_id, rows, generation=None):
+        """
+        Install rows loaded from the database (newest first). Skipped if the
+        transformer was written to since `generation` was read, since the
+        load may not include that write.
+        """
+        if not self.capacity:
+            return
+        ring = _Ring(self.capacity, list(rows), time.monotonic())
+        with self._lock:
+            if generation is not None and self._generations.get(transformer_id, 0) != generation:
+                return
+            self._rings[transformer_id] = ring
+            if self._row_bytes is None and ring.size:
+                self._row_bytes = _row_bytes(ring.newest(1)[0])
+
+    def add(self, transformer_id, row):
+        """Record a newly inserted reading (READING_FIELDS tuple)"""
+        with self._lock:
+            self._generations[transformer_id] = self._generations.get(transformer_id, 0) + 1
+            ring = self._rings.get(transformer_id)
+            if ring is not None:
+                ring.push(row)
+
+    def invalidate(self, transformer_id):
+        """Drop a transformer's buffer; the next read reloads it"""
+        with self._lock:
+            self._generations[transformer_id] = self._generations.get(transformer_id, 0) + 1
+            self._rings.pop(transformer_id, None)
+
+    def warm(self, transformer_ids, load):
+        """Load buffers for the given transformers; `load(transformer_id, n)` returns rows"""
+        for transformer_id in transformer_ids:
+            with self._lock:
+                generation = self._generations.get(transformer_id, 0)
+            self.fill(transformer_id, load(transformer_id, self.capacity), generation)
+
+    def stats(self):
+        with self._lock:
+            rows = sum(ring.size for ring in self._rings.values())
+            transformers = len(self._rings)
+        per_row = self._row_bytes or 0
+        # Slot arrays are preallocated, so empty slots count too
+        slot_bytes = sys.getsizeof([None] * self.capacity) if self.capacity else 0
+        return {
+            'capacity': self.capacity,
+            'max_age': self.max_age,
+            'transformers': transformers,
+            'readings': rows,
+            'approx_bytes': transformers * slot_bytes + rows * (per_row - 8),
+            'max_bytes_per_transformer': slot_bytes + self.capacity * max(per_row - 8, 0),
+            'hits': self.hits,
+            'misses': self.misses,
+            'cursor_fallbacks': self.cursor_fallbacks,
+        }
+
+
+def create_recent_readings():
+    """Build the buffer from RECENT_BUFFER_SIZE / RECENT_BUFFER_MAX_AGE"""
+    return RecentReadings(
+        capacity=int(os.getenv('RECENT_BUFFER_SIZE', '100')),
+        max_age=float(os.getenv('RECENT_BUFFER_MAX_AGE', '0')),
+    )
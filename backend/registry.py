@@ -0,0 +1,311 @@
+"""
+Paginated, searchable transformer registry
+
+get_transformers with any of PAGE_PARAMS returns one page of lightweight
+rows instead of the whole registry:
+
+    ?limit=50            page size (1-500)
+    ?after=<next>        keyset cursor from the previous page's "next"
+    ?q=sector b          full-text search on transformer_id and location,
+                         every word prefix-matched
+    ?prefix=TX01         transformer_id or location starts with
+    ?tripped=true        only transformers whose latest reading tripped
+    ?sort=location       transformer_id | location | created_at | last_reading_at
+    ?order=desc
+
+Pages are read with keyset pagination (WHERE sort_key > last seen ORDER BY
+sort_key LIMIT n) on indexed columns, so a page costs the same whatever its
+position or the fleet size; no total count is computed.
+
+The tripped state and time of the latest reading are kept on the transformer
+row (updated on ingest) so the "currently tripped" filter and sort do not
+touch the reading table. Search uses a FULLTEXT index on MySQL and an FTS5
+table kept in sync by triggers on SQLite, falling back to LIKE elsewhere.
+"""
+import base64
+import json
+import re
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import and_, inspect, literal_column, or_, select, table as table_clause, text, update
+from sqlalchemy.exc import OperationalError
+
+PAGE_PARAMS = ('limit', 'after', 'q', 'prefix', 'tripped', 'sort', 'order')
+SORT_COLUMNS = ('transformer_id', 'location', 'created_at', 'last_reading_at')
+PROJECTION = ('transformer_id', 'location', 'created_at', 'tripped', 'last_reading_at')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+SEARCH_INDEX_NAME = 'ft_transformer_search'
+FTS_TABLE = 'transformer_fts'
+FT_MIN_TOKEN = 3  # InnoDB innodb_ft_min_token_size; shorter words use LIKE
+
+_WORD = re.compile(r'\w+')
+_search_backends = {}  # dialect name -> 'fulltext' | 'fts5', set by ensure_registry_schema
+
+
+class RegistryQuery(NamedTuple):
+    q: Optional[str]
+    prefix: Optional[str]
+    tripped: Optional[bool]
+    sort: str
+    descending: bool
+    limit: int
+    after: Optional[tuple]  # (sort value, transformer_id) of the last row seen
+
+
+def wants_page(args):
+    """Whether the request asks for a page rather than the full registry"""
+    return any(name in args for name in PAGE_PARAMS)
+
+
+def parse_registry_args(args):
+    """Build a RegistryQuery from query parameters; raises ValueError with the API message"""
+    sort = args.get('sort', 'transformer_id')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    tripped = args.get('tripped')
+    if tripped is not None:
+        if tripped.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError('tripped must be true or false')
+        tripped = tripped.lower() in ('true', '1')
+
+    after = args.get('after')
+    if after:
+        after = decode_cursor(after, sort)
+
+    return RegistryQuery(
+        q=(args.get('q') or '').strip()[:200] or None,
+        prefix=(args.get('prefix') or '').strip()[:200] or None,
+        tripped=tripped,
+        sort=sort,
+        descending=order == 'desc',
+        limit=limit,
+        after=after or None,
+    )
+
+
+def encode_cursor(sort, row):
+    """Opaque `next` cursor for the last row of a page"""
+    value = row[PROJECTION.index(sort)]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, row[0]], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, transformer_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError
+        if value is not None and sort in ('created_at', 'last_reading_at'):
+            value = datetime.fromisoformat(value)
+        return value, str(transformer_id)
+    except (ValueError, TypeError):
+        raise ValueError('after is not a valid cursor for this sort') from None
+
+
+def search_backend(dialect_name):
+    return _search_backends.get(dialect_name, 'like')
+
+
+def _contains_word(table, word):
+    return or_(
+        table.c.transformer_id.contains(word, autoescape=True),
+        table.c.location.contains(word, autoescape=True),
+    )
+
+
+def search_condition(table, q, backend):
+    """WHERE clause matching every word of `q` (as a prefix) in transformer_id or location"""
+    words = _WORD.findall(q)
+    if not words:
+        return None
+    if backend == 'fts5':
+        match = ' '.join(f'"{word}"*' for word in words)
+        return table.c.transformer_id.in_(
+            select(literal_column('transformer_id')).select_from(table_clause(FTS_TABLE))
+            .where(text(f'{FTS_TABLE} MATCH :fts_query').bindparams(fts_query=match))
+        )
+    if backend == 'fulltext':
+        long_words = [word for word in words if len(word) >= FT_MIN_TOKEN]
+        conditions = [_contains_word(table, word) for word in words if len(word) < FT_MIN_TOKEN]
+        if long_words:
+            conditions.append(text(
+                'MATCH (transformer_id, location) AGAINST (:ft_query IN BOOLEAN MODE)'
+            ).bindparams(ft_query=' '.join(f'+{word}*' for word in long_words)))
+        return and_(*conditions)
+    return and_(*[_contains_word(table, word) for word in words])
+
+
+def _after_condition(sort_column, key, after, descending):
+    """Rows after (value, transformer_id) in the page order; NULLs sort first ascending (MySQL/SQLite)"""
+    value, last_id = after
+    if sort_column is key:
+        return key < last_id if descending else key > last_id
+    if not descending:
+        if value is None:
+            return or_(and_(sort_column.is_(None), key > last_id), sort_column.isnot(None))
+        return or_(sort_column > value, and_(sort_column == value, key > last_id))
+    if value is None:
+        return and_(sort_column.is_(None), key < last_id)
+    return or_(sort_column < value, and_(sort_column == value, key < last_id), sort_column.is_(None))
+
+
+def page_statement(table, query, dialect_name):
+    """SELECT for one page (limit + 1 rows, the extra one tells whether a next page exists)"""
+    stmt = select(*[table.c[name] for name in PROJECTION])
+    if query.q:
+        condition = search_condition(table, query.q, search_backend(dialect_name))
+        if condition is not None:
+            stmt = stmt.where(condition)
+    if query.prefix:
+        stmt = stmt.where(or_(
+            table.c.transformer_id.startswith(query.prefix, autoescape=True),
+            table.c.location.startswith(query.prefix, autoescape=True),
+        ))
+    if query.tripped is not None:
+        stmt = stmt.where(table.c.tripped == query.tripped)
+
+    key = table.c.transformer_id
+    sort_column = table.c[query.sort]
+    if query.after is not None:
+        stmt = stmt.where(_after_condition(sort_column, key, query.after, query.descending))
+    order = [sort_column] if sort_column is key else [sort_column, key]
+    return stmt.order_by(*[c.desc() if query.descending else c.asc() for c in order]).limit(query.limit + 1)
+
+
+def page_payload(rows, query):
+    """Response body for a page of rows from page_statement"""
+    has_more = len(rows) > query.limit
+    rows = rows[:query.limit]
+    return {
+        'transformers': [dict(zip(PROJECTION, row)) for row in rows],
+        'next': encode_cursor(query.sort, rows[-1]) if has_more else None,
+    }
+
+
+# Latest-reading state on the transformer row
+
+def latest_reading_update(table, transformer_id, timestamp, trip_status):
+    """UPDATE recording a reading as the transformer's latest unless a newer one is stored"""
+    return update(table)\
+        .where(table.c.transformer_id == transformer_id)\
+        .where(or_(table.c.last_reading_at.is_(None), table.c.last_reading_at <= timestamp))\
+        .values(last_reading_at=timestamp, tripped=bool(trip_status))
+
+
+def newest_readings(rows):
+    """The newest row of each transformer in a batch, by transformer_id"""
+    newest = {}
+    for row in rows:
+        current = newest.get(row['transformer_id'])
+        if current is None or row['timestamp'] >= current['timestamp']:
+            newest[row['transformer_id']] = row
+    return newest
+
+
+def backfill_latest_readings(connection, table, reading_table):
+    """Set tripped / last_reading_at from the reading table (existing data, demo data)"""
+    connection.execute(text(
+        f'UPDATE {table.name} SET last_reading_at = ('
+        f'SELECT MAX(r.timestamp) FROM {reading_table.name} r WHERE r.transformer_id = {table.name}.transformer_id)'
+    ))
+    connection.execute(text(
+        f'UPDATE {table.name} SET tripped = COALESCE(('
+        f'SELECT r.trip_status FROM {reading_table.name} r WHERE r.transformer_id = {table.name}.transformer_id '
+        f'AND r.timestamp = {table.name}.last_reading_at), 0)'
+    ))
+
+
+# Schema
+
+def ensure_registry_schema(connection, table, reading_table):
+    """
+    Bring a transformer table created before the registry columns existed up
+    to date (columns, indexes, backfill) and create the search index.
+    Returns the search backend in use.
+    """
+    inspector = inspect(connection)
+    columns = {column['name'] for column in inspector.get_columns(table.name)}
+    added = False
+    if 'tripped' not in columns:
+        boolean = table.c.tripped.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN tripped {boolean} NOT NULL DEFAULT 0'))
+        added = True
+    if 'last_reading_at' not in columns:
+        timestamp = table.c.last_reading_at.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN last_reading_at {timestamp} NULL'))
+        added = True
+    if added:
+        backfill_latest_readings(connection, table, reading_table)
+
+    existing = {index['name'] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(connection)
+
+    return ensure_search_index(connection, table, existing)
+
+
+def ensure_search_index(connection, table, existing_indexes=()):
+    dialect_name = connection.dialect.name
+    backend = 'like'
+    if dialect_name in ('mysql', 'mariadb'):
+        if SEARCH_INDEX_NAME not in existing_indexes:
+            connection.execute(text(
+                f'CREATE FULLTEXT INDEX {SEARCH_INDEX_NAME} ON {table.name} (transformer_id, location)'
+            ))
+        backend = 'fulltext'
+    elif dialect_name == 'sqlite':
+        try:
+            backend = _ensure_fts5(connection, table)
+        except OperationalError:
+            pass  # SQLite built without FTS5: search falls back to LIKE
+    _search_backends[dialect_name] = backend
+    return backend
+
+
+def _ensure_fts5(connection, table):
+    """
+    FTS5 table keyed by transformer_id (not rowid, which VACUUM may renumber
+    for tables without an INTEGER PRIMARY KEY), maintained by triggers that
+    only fire when the searchable columns change.
+    """
+    created = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': FTS_TABLE}).first() is None
+    connection.execute(text(f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(transformer_id, location)'))
+    name = table.name
+    connection.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {name} BEGIN '
+        f'INSERT INTO {FTS_TABLE} (transformer_id, location) VALUES (new.transformer_id, new.location); END'
+    ))
+    connection.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {name} BEGIN '
+        f'DELETE FROM {FTS_TABLE} WHERE transformer_id = old.transformer_id; END'
+    ))
+    connection.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF transformer_id, location ON {name} BEGIN '
+        f'DELETE FROM {FTS_TABLE} WHERE transformer_id = old.transformer_id; '
+        f'INSERT INTO {FTS_TABLE} (transformer_id, location) VALUES (new.transformer_id, new.location); END'
+    ))
+    if created:
+        connection.execute(text(
+            f'INSERT INTO {FTS_TABLE} (transformer_id, location) SELECT transformer_id, location FROM {name}'
+        ))
+    return 'fts5'
@@ -0,0 +1,306 @@
+"""
+Response cache for the read endpoints
+
+Cached entries are keyed by route + query parameters and tagged with the
+transformer they belong to, so ingest can invalidate exactly the affected
+responses. Two backends are available:
+
+- MemoryBackend: per-process LRU with per-key TTL (default)
+- DiskBackend:   SQLite file shared by all workers on the host, for
+                 multi-worker deployments (gunicorn -w N)
+
+Invalidation only reaches the backend of the process that ingested the
+reading. With the memory backend and several workers, the other workers keep
+serving their copy until it expires, so either use the disk backend or keep
+CACHE_DEFAULT_TTL as short as the staleness you can accept.
+
+Each tag has a generation that invalidation bumps. A response is stored only
+if its tag's generation did not change while the view was running, so a
+request that read the database just before an ingest cannot put the stale
+response back after the ingest invalidated it.
+
+Responses carry an ETag and Cache-Control header; a matching If-None-Match
+is answered with 304 Not Modified.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+# Tag shared by every response that lists the whole registry
+REGISTRY_TAG = 'transformers'
+
+# Tag shared by fleet-wide views built from the readings of every transformer
+READINGS_TAG = 'readings'
+
+
+def transformer_tag(transformer_id):
+    """Tag for all cached responses that belong to one transformer"""
+    return f'tx:{transformer_id}'
+
+
+class MemoryBackend:
+    """In-process LRU cache with per-key expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, tag, value)
+        self._tags = {}                # tag -> set(keys)
+        self._generations = {}         # tag -> times invalidated
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, tag, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def generation(self, tag):
+        with self._lock:
+            return self._generations.get(tag, 0)
+
+    def set(self, key, value, ttl, tag=None, generation=None):
+        """Store value, unless `tag` was invalidated since `generation` was read"""
+        with self._lock:
+            if generation is not None and self._generations.get(tag, 0) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, tag, value)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete_tag(self, tag):
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, tag, _ = self._entries.pop(key)
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+class DiskBackend:
+    """SQLite-backed cache shared between worker processes on one host"""
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            ' key TEXT PRIMARY KEY, tag TEXT, expires_at REAL, last_used REAL,'
+            ' status INTEGER, mimetype TEXT, etag TEXT, body BLOB)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_tag ON response_cache (tag)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_last_used ON response_cache (last_used)')
+        conn.execute('CREATE TABLE IF NOT EXISTS response_cache_tag (tag TEXT PRIMARY KEY, generation INTEGER)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT expires_at, body, status, mimetype, etag FROM response_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] <= now:
+            conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE response_cache SET last_used = ? WHERE key = ?', (now, key))
+        return row[1], row[2], row[3], row[4]
+
+    def _generation(self, conn, tag):
+        row = conn.execute('SELECT generation FROM response_cache_tag WHERE tag = ?', (tag,)).fetchone()
+        return row[0] if row else 0
+
+    def generation(self, tag):
+        return self._generation(self._conn(), tag)
+
+    def set(self, key, value, ttl, tag=None, generation=None):
+        """Store value, unless `tag` was invalidated (by any worker) since `generation` was read"""
+        now = time.time()
+        body, status, mimetype, etag = value
+        conn = self._conn()
+        # One write transaction, so an invalidation cannot slip between the check and the insert
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if generation is None or self._generation(conn, tag) == generation:
+                conn.execute(
+                    'INSERT OR REPLACE INTO response_cache'
+                    ' (key, tag, expires_at, last_used, status, mimetype, etag, body)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, tag, now + ttl, now, status, mimetype, etag, body)
+                )
+            overflow = conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    'DELETE FROM response_cache WHERE key IN'
+                    ' (SELECT key FROM response_cache ORDER BY last_used LIMIT ?)', (overflow,)
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete_tag(self, tag):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO response_cache_tag (tag, generation) VALUES (?, 1)'
+                ' ON CONFLICT (tag) DO UPDATE SET generation = generation + 1', (tag,)
+            )
+            conn.execute('DELETE FROM response_cache WHERE tag = ?', (tag,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        self._conn().execute('DELETE FROM response_cache')
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+class ResponseCache:
+    """Caches successful GET responses and serves conditional requests"""
+
+    def __init__(self, backend=None, default_ttl=5, max_age=0, enabled=True):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.default_ttl = default_ttl
+        self.max_age = max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from environment variables:
+        CACHE_BACKEND (memory|disk|none), CACHE_PATH, CACHE_MAX_ENTRIES,
+        CACHE_DEFAULT_TTL, CACHE_MAX_AGE
+        """
+        kind = os.getenv('CACHE_BACKEND', 'memory').lower()
+        max_entries = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+        if kind == 'disk':
+            backend = DiskBackend(os.getenv('CACHE_PATH', 'response_cache.db'), max_entries)
+        else:
+            backend = MemoryBackend(max_entries)
+        return cls(
+            backend=backend,
+            default_ttl=float(os.getenv('CACHE_DEFAULT_TTL', '5')),
+            max_age=int(os.getenv('CACHE_MAX_AGE', '0')),
+            enabled=kind != 'none',
+        )
+
+    @staticmethod
+    def make_key():
+        """Cache key for the current request: path + sorted query parameters"""
+        args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        return f'{request.path}?{args}'
+
+    def cached(self, ttl=None, tag=None, tag_arg=None):
+        """
+        Decorator for GET views. Entries are tagged either with a fixed `tag`
+        or, when `tag_arg` names a URL parameter, with that transformer's tag.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                key = self.make_key()
+                cached = self.backend.get(key)
+                if cached is not None:
+                    self.hits += 1
+                    return self._build_response(*cached)
+
+                self.misses += 1
+                entry_tag = transformer_tag(kwargs[tag_arg]) if tag_arg else tag
+                # Read before the view queries the database (see the module docstring)
+                generation = self.backend.generation(entry_tag) if entry_tag is not None else None
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+
+                body = response.get_data()
+                etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+                self.backend.set(
+                    key, (body, response.status_code, response.mimetype, etag),
+                    ttl if ttl is not None else self.default_ttl, entry_tag, generation
+                )
+                return self._build_response(body, response.status_code, response.mimetype, etag)
+            return wrapper
+        return decorator
+
+    def invalidate_transformer(self, transformer_id):
+        """Drop every cached response for one transformer"""
+        self.backend.delete_tag(transformer_tag(transformer_id))
+
+    def invalidate_registry(self):
+        """Drop cached transformer listings"""
+        self.backend.delete_tag(REGISTRY_TAG)
+
+    def invalidate_readings(self):
+        """Drop cached fleet-wide reading views"""
+        self.backend.delete_tag(READINGS_TAG)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _build_response(self, body, status, mimetype, etag):
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, status=status, mimetype=mimetype)
+        response.set_etag(etag)
+        if self.max_age > 0:
+            response.headers['Cache-Control'] = f'public, max-age={self.max_age}'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
@@ -15,6 +15,8 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db, Transformer, Reading
+from ingest import ensure_unique_index
+from registry import backfill_latest_readings, ensure_registry_schema
 from sqlalchemy import text
 
 # Load environment variables
@@ -26,6 +28,11 @@ def create_database_tables():
     with app.app_context():
         try:
             db.create_all()
+            with db.engine.begin() as connection:
+                removed = ensure_unique_index(connection, Reading.__table__)
+                ensure_registry_schema(connection, Transformer.__table__, Reading.__table__)
+            if removed:
+                print(f"  - Removed {removed} duplicate readings")
             print("✓ Database tables created successfully!")
             return True
         except Exception as e:
@@ -143,6 +150,8 @@ def create_sample_readings(days_back=7, readings_per_day=288):
                 db.session.commit()
                 print(f"    ✓ Added {days_back * readings_per_day} readings")
             
+            with db.engine.begin() as connection:
+                backfill_latest_readings(connection, Transformer.__table__, Reading.__table__)
             print(f"✓ Created {total_readings} sample readings!")
             return True
             
@@ -0,0 +1,243 @@
+"""
+Hash-sharded reading storage
+
+With READING_SHARDS set, reading rows live on N databases instead of the
+primary. Each transformer's readings belong to one shard, chosen by
+consistent hashing of transformer_id (a ring of READING_SHARD_VNODES points
+per shard). Adding a shard moves only about 1/N of the transformers.
+Transformer metadata stays on the primary (db.session / read replicas).
+
+- Ingest and per-transformer queries open a session on the owning shard
+  (ShardRouter.session / run_read).
+- Fleet-wide queries run on every shard in parallel and are merged
+  (ShardRouter.scatter).
+- `flask rebalance-readings` copies the readings of transformers that are not
+  on their owning shard (after adding a shard, or when moving an unsharded
+  database) and then deletes them from the source. A copy is idempotent, so
+  an interrupted run can be restarted.
+
+Reading ids are assigned per shard, so a transformer moved by a rebalance
+gets new ids for its readings. A `since` id cursor issued before the move
+belongs to the old shard's sequence: it can re-deliver moved readings, or
+skip new ones until the new shard's ids pass it. Delta clients must drop
+their id cursors after a rebalance and reload (the dashboard reloads its
+full window every minute), or sync by timestamp.
+
+Configuration:
+    READING_SHARDS         comma-separated shard URIs or hosts (same user,
+                           password and database as the primary), optionally
+                           named: "s0=mysql://...,s1=mysql://...". Unnamed
+                           shards are named shard0, shard1, ... by position, so
+                           append new shards at the end.
+                           Local test: "sqlite:///shard0.db,sqlite:///shard1.db"
+    READING_SHARD_VNODES   ring points per shard (128)
+"""
+import bisect
+import contextlib
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import Column, MetaData, Table, UniqueConstraint, and_, create_engine, delete, func, select
+from sqlalchemy.orm import Session
+
+from db_routing import replica_uris_from_hosts
+from ingest import ensure_unique_index, insert_readings
+
+logger = logging.getLogger(__name__)
+
+REBALANCE_BATCH_SIZE = 1000
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to shard names"""
+
+    def __init__(self, names, vnodes=128):
+        points = sorted((_hash(f'{name}#{i}'), name) for name in names for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def owner(self, key):
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._names[index]
+
+
+def shard_specs_from_env(value, user, password, database):
+    """Turn a READING_SHARDS value into [(name, uri)]"""
+    specs = []
+    for position, entry in enumerate(part.strip() for part in value.split(',')):
+        if not entry:
+            continue
+        name, sep, target = entry.partition('=')
+        if not sep or '://' in name:
+            name, target = f'shard{position}', entry
+        specs.append((name.strip(), replica_uris_from_hosts(target, user, password, database)[0]))
+    return specs
+
+
+def shard_reading_table(metadata, reading_table):
+    """
+    Copy of the reading table for a shard: same columns and unique key, but
+    without the foreign key to transformer, which lives on the primary
+    """
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in reading_table.columns
+    ]
+    constraints = [
+        UniqueConstraint(*[column.name for column in constraint.columns], name=constraint.name)
+        for constraint in reading_table.constraints if isinstance(constraint, UniqueConstraint)
+    ]
+    return Table(reading_table.name, metadata, *columns, *constraints)
+
+
+class Shard:
+    def __init__(self, name, uri, engine):
+        self.name = name
+        self.uri = uri
+        self.engine = engine
+
+    @property
+    def location(self):
+        # Hide credentials in status output
+        return self.uri.split('@')[-1]
+
+
+class ShardRouter:
+    """Routes reading queries to the shard that owns each transformer"""
+
+    def __init__(self, specs=(), reading_table=None, vnodes=128, engine_options=None):
+        options = {'pool_pre_ping': True, 'pool_recycle': 3600}
+        options.update(engine_options or {})
+        self.shards = {name: Shard(name, uri, create_engine(uri, **options)) for name, uri in specs}
+        self.ring = HashRing(self.shards, vnodes) if self.shards else None
+        self.metadata = MetaData()
+        self.table = shard_reading_table(self.metadata, reading_table) if reading_table is not None else None
+        self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='shard') \
+            if self.shards else None
+
+    @property
+    def enabled(self):
+        return bool(self.shards)
+
+    def shard_for(self, transformer_id):
+        return self.shards[self.ring.owner(transformer_id)]
+
+    def group(self, transformer_ids):
+        """{shard: [transformer_id, ...]} for a set of transformers"""
+        groups = {}
+        for transformer_id in transformer_ids:
+            groups.setdefault(self.shard_for(transformer_id), []).append(transformer_id)
+        return groups
+
+    @contextlib.contextmanager
+    def session(self, transformer_id=None, shard=None):
+        """Session on the owning shard; commits on success, rolls back on error"""
+        shard = shard or self.shard_for(transformer_id)
+        with Session(bind=shard.engine) as session:
+            try:
+                yield session
+                session.commit()
+            except BaseException:
+                session.rollback()
+                raise
+
+    def run_read(self, transformer_id, fn):
+        """Call fn(session) on the shard that owns transformer_id"""
+        with Session(bind=self.shard_for(transformer_id).engine) as session:
+            return fn(session)
+
+    def scatter(self, fn):
+        """Call fn(session) on every shard in parallel; results in shard order"""
+        def run(shard):
+            with Session(bind=shard.engine) as session:
+                return fn(session)
+        return list(self._pool.map(run, self.shards.values()))
+
+    def create_all(self):
+        """Create the reading table on every shard"""
+        for shard in self.shards.values():
+            with shard.engine.begin() as connection:
+                self.metadata.create_all(connection)
+                ensure_unique_index(connection, self.table)
+
+    def status(self):
+        return {
+            'shards': {name: shard.location for name, shard in self.shards.items()},
+            'vnodes': len(self.ring._points) // len(self.shards) if self.ring else 0,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+# Fleet-wide queries: run on each shard (or the primary) and merged
+
+def latest_readings_statement(Reading, columns):
+    """Newest reading of every transformer, as `columns` tuples"""
+    latest = select(Reading.transformer_id, func.max(Reading.timestamp).label('timestamp'))\
+        .group_by(Reading.transformer_id).subquery()
+    return select(*columns).join(latest, and_(
+        Reading.transformer_id == latest.c.transformer_id, Reading.timestamp == latest.c.timestamp
+    ))
+
+
+def trip_counts_statement(Reading, since):
+    """(transformer_id, trip readings) for trips at or after `since`"""
+    return select(Reading.transformer_id, func.count())\
+        .where(Reading.trip_status.is_(True), Reading.timestamp >= since)\
+        .group_by(Reading.transformer_id)
+
+
+def merge_rows(results, key=lambda row: row[0]):
+    """Concatenate per-shard row lists, sorted by `key`"""
+    return sorted((row for rows in results for row in rows), key=key)
+
+
+def rebalance(router, sources, dry_run=False, batch_size=REBALANCE_BATCH_SIZE):
+    """
+    Move readings to their owning shard. `sources` is [(name, engine)] of
+    every database that may hold readings: all shards, plus the primary when
+    migrating an unsharded deployment. Returns {(source, target): readings}.
+    """
+    table = router.table
+    columns = [c for c in table.columns if c.name != 'id']
+    moved = {}
+    for source_name, engine in sources:
+        with Session(bind=engine) as source:
+            transformer_ids = source.scalars(select(table.c.transformer_id).distinct()).all()
+            for transformer_id in transformer_ids:
+                target = router.shard_for(transformer_id)
+                if target.name == source_name:
+                    continue
+                key = (source_name, target.name)
+                if dry_run:
+                    count = source.scalar(
+                        select(func.count()).select_from(table).where(table.c.transformer_id == transformer_id)
+                    )
+                    moved[key] = moved.get(key, 0) + count
+                    continue
+                while True:
+                    rows = source.execute(
+                        select(table.c.id, *columns)
+                        .where(table.c.transformer_id == transformer_id)
+                        .order_by(table.c.id)
+                        .limit(batch_size)
+                    ).all()
+                    if not rows:
+                        break
+                    # Copy first (duplicates are skipped, so a rerun is safe), then delete
+                    with router.session(shard=target) as session:
+                        insert_readings(session, table, [
+                            {column.name: value for column, value in zip(columns, row[1:])} for row in rows
+                        ])
+                    source.execute(delete(table).where(table.c.id.in_([row.id for row in rows])))
+                    source.commit()
+                    moved[key] = moved.get(key, 0) + len(rows)
+                logger.info(f"Moved readings of {transformer_id} from {source_name} to {target.name}")
+    return moved
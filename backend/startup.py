@@ -0,0 +1,111 @@
+"""
+Background initialization for the IDE backend
+
+Slow setup (importing the OpenAI SDK, starting interpreter workers, building
+the Docker image and warming containers) runs in background tasks after the
+server starts listening, so the first request does not wait for it. Each step
+is recorded with its status and duration and reported by /api/health.
+
+Step status: pending -> running -> ready | failed, or disabled. Until the
+Docker steps are ready, code runs through the local interpreter paths.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self._steps = OrderedDict()  # name -> dict(status, started_at, duration_ms, error)
+        self._tasks = set()
+
+    def _entry(self, name):
+        entry = self._steps.get(name)
+        if entry is None:
+            entry = self._steps[name] = {'status': 'pending', 'started_at': None, 'duration_ms': None, 'error': None}
+        return entry
+
+    def expect(self, *names):
+        """Register steps that will run later so health shows them as pending"""
+        for name in names:
+            self._entry(name)
+
+    def disable(self, name, reason=None):
+        entry = self._entry(name)
+        entry['status'] = 'disabled'
+        entry['error'] = reason
+
+    def skip_pending(self, *names, reason=None):
+        """Disable steps that never started because an earlier step failed"""
+        for name in names:
+            entry = self._steps.get(name)
+            if entry is not None and entry['status'] == 'pending':
+                self.disable(name, reason)
+
+    @contextlib.contextmanager
+    def step(self, name):
+        """Time the enclosed block; exceptions mark the step failed and propagate"""
+        entry = self._entry(name)
+        entry['status'] = 'running'
+        entry['error'] = None
+        started = time.monotonic()
+        entry['started_at'] = started
+        try:
+            yield
+        except BaseException as e:
+            entry['status'] = 'failed'
+            entry['error'] = str(e) or type(e).__name__
+            raise
+        else:
+            entry['status'] = 'ready'
+        finally:
+            entry['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+    def start(self, name, coro):
+        """Run coro as a background step named `name`"""
+        self._entry(name)
+
+        async def run():
+            try:
+                with self.step(name):
+                    return await coro
+            except Exception as e:
+                logger.warning(f"Startup step {name} failed: {e}")
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def is_ready(self, name):
+        entry = self._steps.get(name)
+        return entry is not None and entry['status'] == 'ready'
+
+    async def stop(self):
+        """Cancel steps still running (server shutting down)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def status(self):
+        steps = {}
+        for name, entry in self._steps.items():
+            steps[name] = {
+                'status': entry['status'],
+                'started_after_ms': (
+                    round((entry['started_at'] - self.created_at) * 1000, 1)
+                    if entry['started_at'] is not None else None
+                ),
+                'duration_ms': entry['duration_ms'],
+                'error': entry['error'],
+            }
+        return {
+            'complete': all(entry['status'] not in ('pending', 'running') for entry in self._steps.values()),
+            'uptime': round(time.monotonic() - self.created_at, 1),
+            'steps': steps,
+        }
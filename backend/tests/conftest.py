@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import MetaData, create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import make_reading_table  # noqa: E402
+
+
+@pytest.fixture
+def reading_table():
+    return make_reading_table(MetaData())
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "test.db"}')
+    yield engine
+    engine.dispose()
@@ -0,0 +1,17 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Table, UniqueConstraint
+
+from ingest import UNIQUE_INDEX_NAME
+
+
+def make_reading_table(metadata):
+    """Same columns and unique key as the Reading model"""
+    return Table(
+        'reading', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50), nullable=False),
+        Column('voltage', Float, nullable=False),
+        Column('current', Float, nullable=False),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+        UniqueConstraint('transformer_id', 'timestamp', name=UNIQUE_INDEX_NAME),
+    )
@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('aiosqlite')
+
+# Never the MySQL server or demo database a developer's .env points at
+os.environ['ASYNC_DATABASE_URL'] = 'sqlite+aiosqlite://'
+
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+import app_async  # noqa: E402
+import registry  # noqa: E402
+
+
+def reading(seconds, transformer_id='TX1', **fields):
+    return {'transformer_id': transformer_id, 'voltage': 230.0, 'current': 5.0, 'trip_status': False,
+            'timestamp': f'2024-01-01T00:00:{seconds:02d}', **fields}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The search backend the lifespan detects is only for this database
+    monkeypatch.setattr(registry, '_search_backends', {})
+    monkeypatch.setattr(app_async, 'engine', create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "async.db"}'))
+    with TestClient(app_async.app) as client:
+        assert client.post('/add_transformer', json={'transformer_id': 'TX1', 'location': 'Sector A'}).status_code == 201
+        yield client
+
+
+def test_transformers_are_registered_once(client):
+    again = client.post('/add_transformer', json={'transformer_id': 'TX1', 'location': 'Sector B'})
+    assert again.status_code == 409 and again.json() == {'error': 'Transformer already exists'}
+
+    transformers = client.get('/get_transformers').json()['transformers']
+    assert [(t['transformer_id'], t['location']) for t in transformers] == [('TX1', 'Sector A')]
+
+
+@pytest.mark.parametrize('path, body, message', [
+    ('/add_transformer', {'transformer_id': 'TX2'}, 'transformer_id and location are required'),
+    ('/add_reading', {'transformer_id': 'TX1', 'current': 5}, 'voltage is required'),
+    ('/add_readings', {'readings': []}, 'readings must be a non-empty list'),
+    ('/add_readings', {'readings': [reading(0, voltage='NaN')]}, 'readings[0]: voltage must be a finite number'),
+])
+def test_invalid_bodies_get_the_flask_error_shape(client, path, body, message):
+    response = client.post(path, json=body)
+    assert response.status_code == 400 and response.json() == {'error': message}
+
+
+def test_single_readings_and_retries(client):
+    first = client.post('/add_reading', json=reading(0))
+    assert first.status_code == 201 and first.json()['reading']['timestamp'] == '2024-01-01T00:00:00'
+
+    retry = client.post('/add_reading', json=reading(0, voltage=231.0))
+    assert retry.status_code == 200 and retry.json()['duplicate']
+    assert retry.json()['reading'] == first.json()['reading']
+
+    unknown = client.post('/add_reading', json=reading(0, 'TX9'))
+    assert unknown.status_code == 404 and unknown.json() == {'error': 'Transformer not found'}
+
+
+def test_batches_skip_stored_readings(client):
+    response = client.post('/add_readings', json={'readings': [reading(s) for s in (0, 10, 20)]})
+    assert response.status_code == 201 and response.json()['inserted'] == 3
+
+    replay = client.post('/add_readings', json={'readings': [reading(s) for s in (10, 20)]})
+    assert replay.status_code == 200 and replay.json()['duplicates'] == 2
+
+    missing = client.post('/add_readings', json={'readings': [reading(0, 'TX9'), reading(0, 'TX8')]})
+    assert missing.status_code == 404 and missing.json() == {'error': 'Transformer not found: TX8, TX9'}
+
+
+def test_readings_are_read_back_newest_first(client):
+    body = gzip.compress(json.dumps({'readings': [reading(s, trip_status=s == 20) for s in (0, 20, 10)]}).encode())
+    response = client.post('/add_readings', content=body,
+                           headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/json'})
+    assert response.json()['inserted'] == 3
+
+    readings = client.get('/get_readings/TX1', params={'limit': 2}).json()['readings']
+    assert [r['timestamp'] for r in readings] == ['2024-01-01T00:00:20', '2024-01-01T00:00:10']
+
+    latest = client.get('/get_latest_reading/TX1').json()['latest_reading']
+    assert latest['timestamp'] == '2024-01-01T00:00:20' and latest['trip_status'] is True
+    # The registry columns follow the newest reading
+    page = client.get('/get_transformers', params={'limit': 10, 'tripped': 'true'}).json()
+    assert [t['transformer_id'] for t in page['transformers']] == ['TX1']
+
+
+def test_unknown_transformers_and_formats(client):
+    assert client.get('/get_readings/TX9').json() == {'error': 'Transformer not found'}
+    assert client.get('/get_latest_reading/TX1').json() == {'error': 'No readings found'}
+    assert client.get('/get_readings/TX1', params={'format': 'xml'}).status_code == 400
+
+
+def test_large_responses_are_gzipped(client):
+    client.post('/add_readings', json={'readings': [reading(s) for s in range(50)]})
+    response = client.get('/get_readings/TX1', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip' and len(response.json()['readings']) == 50
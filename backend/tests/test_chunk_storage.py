@@ -0,0 +1,171 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import MetaData, func, insert, select
+from sqlalchemy.orm import Session
+
+from chunk_storage import chunk_table, compact_readings, decode_chunk, encode_chunk, fetch_range_rows, \
+    fetch_recent_rows, merge_latest_rows, merge_trip_counts, window_start
+from sharding import latest_readings_statement, trip_counts_statement
+from tests.helpers import make_reading_table
+
+START = datetime(2024, 1, 1)
+
+
+def columns(timestamps, seed=1):
+    rng = random.Random(seed)
+    voltage = [round(230 + rng.gauss(0, 2), 1) for _ in timestamps]
+    current = [round(max(0.0, 5 + rng.gauss(0, 0.5)), 3) for _ in timestamps]
+    trips = [rng.random() < 0.05 for _ in timestamps]
+    return list(timestamps), voltage, current, trips
+
+
+@pytest.mark.parametrize('timestamps', [
+    [START + timedelta(seconds=5 * i) for i in range(720)],
+    [START + timedelta(seconds=5 * i, milliseconds=i % 7) for i in range(200)],
+    [START + timedelta(seconds=5 * i, microseconds=random.Random(i).randint(0, 999_999)) for i in range(200)],
+    # Gaps and bursts exercise every delta-of-delta bucket
+    [START + timedelta(seconds=s) for s in (0, 1, 2, 3, 60, 61, 3600, 3601, 90000, 90001, 10 ** 7)],
+    [START],
+    [datetime(1969, 12, 31, 23, 59, 59), datetime(1970, 1, 1, 0, 0, 1)],
+])
+def test_round_trip(timestamps):
+    original = columns(timestamps)
+    assert decode_chunk(encode_chunk(*original)) == tuple(original)
+
+
+def test_round_trip_of_arbitrary_floats():
+    timestamps = [START + timedelta(seconds=i) for i in range(6)]
+    voltage = [0.0, -0.0, 1e-300, -123.456, 1e300, 230.1]
+    current = [float('inf'), 5.0, 5.0, 5.0, -float('inf'), 0.1 + 0.2]
+    trips = [True, False, False, True, True, False]
+    assert decode_chunk(encode_chunk(timestamps, voltage, current, trips)) == (timestamps, voltage, current, trips)
+
+
+def test_empty_chunk():
+    assert decode_chunk(encode_chunk([], [], [], [])) == ([], [], [], [])
+
+
+def test_constant_series_is_compact():
+    timestamps = [START + timedelta(seconds=5 * i) for i in range(720)]
+    blob = encode_chunk(timestamps, [230.0] * 720, [5.0] * 720, [False] * 720)
+    # Unchanged delta, voltage and current cost one bit each, plus the trip bit
+    assert len(blob) < 720 * 4 / 8 + 64
+
+
+def test_unknown_version_is_rejected():
+    blob = bytearray(encode_chunk([START], [230.0], [5.0], [False]))
+    blob[0] = 99
+    with pytest.raises(ValueError):
+        decode_chunk(bytes(blob))
+
+
+def test_window_start():
+    assert window_start(datetime(2024, 1, 1, 10, 59, 59), 3600) == datetime(2024, 1, 1, 10)
+    assert window_start(datetime(2024, 1, 1, 11), 3600) == datetime(2024, 1, 1, 11)
+
+
+def make_store(engine):
+    metadata = MetaData()
+    reading = make_reading_table(metadata)
+    chunks = chunk_table(metadata)
+    metadata.create_all(engine)
+    return reading, chunks
+
+
+def add(session, reading, transformer_id, offsets):
+    session.execute(insert(reading), [
+        {'transformer_id': transformer_id, 'voltage': 230.0 + s % 3, 'current': 5.0 + s % 7 / 10,
+         'trip_status': s % 11 == 0, 'timestamp': START + timedelta(seconds=s)}
+        for s in offsets
+    ])
+    session.commit()
+
+
+def test_compaction_keeps_every_reading(sqlite_engine):
+    reading, chunks = make_store(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        add(session, reading, 'TX1', range(0, 3 * 3600, 60))
+        before = fetch_recent_rows(session, reading, chunks, 'TX1', 1000)
+        compacted = []
+
+        moved = compact_readings(session, reading, chunks, before=START + timedelta(hours=2),
+                                 chunk_seconds=3600, on_compacted=compacted.append)
+
+        assert moved == 120
+        assert compacted == ['TX1']
+        assert session.scalar(select(func.count()).select_from(chunks)) == 2
+        after = fetch_recent_rows(session, reading, chunks, 'TX1', 1000)
+        assert [row[1:] for row in after] == [row[1:] for row in before]
+        # Compacted readings have no id; raw ones keep theirs
+        assert all(row[0] is None for row in after[60:]) and all(row[0] is not None for row in after[:60])
+
+
+def test_recent_rows_page_across_chunks(sqlite_engine):
+    reading, chunks = make_store(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        add(session, reading, 'TX1', range(0, 3 * 3600, 60))
+        compact_readings(session, reading, chunks, before=START + timedelta(hours=3), chunk_seconds=3600)
+
+        rows = fetch_recent_rows(session, reading, chunks, 'TX1', 90)
+
+        newest = 3 * 3600 - 60
+        assert [row[5] for row in rows] == [START + timedelta(seconds=s) for s in range(newest, newest - 90 * 60, -60)]
+
+
+def test_late_reading_is_merged_into_its_chunk(sqlite_engine):
+    reading, chunks = make_store(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        add(session, reading, 'TX1', range(0, 3600, 60))
+        compact_readings(session, reading, chunks, before=START + timedelta(hours=1), chunk_seconds=3600)
+        add(session, reading, 'TX1', [30, 60])  # a new back-dated reading and a retry of a compacted one
+
+        # Until the next compaction the retry is in both places but returned once
+        assert len(fetch_range_rows(session, reading, chunks, 'TX1', START, START + timedelta(hours=1))) == 61
+
+        compact_readings(session, reading, chunks, before=START + timedelta(hours=1), chunk_seconds=3600)
+
+        assert session.scalar(select(func.count()).select_from(chunks)) == 1
+        assert session.scalar(select(func.count()).select_from(reading)) == 0
+        rows = fetch_range_rows(session, reading, chunks, 'TX1', START, START + timedelta(hours=1))
+        assert [row[5] for row in rows] == sorted([START + timedelta(seconds=s) for s in range(0, 3600, 60)]
+                                                  + [START + timedelta(seconds=30)])
+
+
+def test_fleet_views_include_compacted_readings(sqlite_engine):
+    reading, chunks = make_store(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        add(session, reading, 'TX1', range(0, 3600, 60))   # all compacted below
+        add(session, reading, 'TX2', range(0, 7200, 60))   # the second hour stays raw
+        before = START + timedelta(hours=1)
+
+        def latest():
+            rows = session.execute(latest_readings_statement(reading.c, reading.c)).all()
+            return sorted(merge_latest_rows(session, chunks, rows), key=lambda row: row[1])
+
+        def trips():
+            counts = session.execute(trip_counts_statement(reading.c, START)).all()
+            return dict(merge_trip_counts(session, reading, chunks, counts, START))
+
+        expected_latest, expected_trips = [row[1:] for row in latest()], trips()
+        assert expected_trips == {'TX1': 6, 'TX2': 11}
+
+        compact_readings(session, reading, chunks, before=before, chunk_seconds=3600)
+        assert session.execute(latest_readings_statement(reading.c, reading.c)).all()[0][1] == 'TX2'
+
+        assert [row[1:] for row in latest()] == expected_latest
+        assert latest()[0][0] is None  # TX1's newest reading comes from its chunk
+        assert trips() == expected_trips
+
+
+def test_trips_retried_after_compaction_count_once(sqlite_engine):
+    reading, chunks = make_store(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        add(session, reading, 'TX1', [0, 60])
+        compact_readings(session, reading, chunks, before=START + timedelta(hours=1), chunk_seconds=3600)
+        add(session, reading, 'TX1', [0])  # a device retry of the compacted trip reading
+
+        counts = session.execute(trip_counts_statement(reading.c, START)).all()
+        assert merge_trip_counts(session, reading, chunks, counts, START) == [('TX1', 1)]
+        assert merge_trip_counts(session, reading, chunks, [], START + timedelta(seconds=1)) == []
@@ -0,0 +1,125 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify, request
+
+from compression import DecompressRequestMiddleware, choose_encoding, decompress_body, init_compression
+
+ROWS = [{'transformer_id': f'TX{i:03d}', 'voltage': 230.0 + i % 5, 'current': 5.0} for i in range(200)]
+
+
+@pytest.mark.parametrize('header, brotli_available, expected', [
+    ('gzip, deflate, br', True, 'br'),
+    ('gzip, deflate, br', False, 'gzip'),
+    ('br;q=0.5, gzip;q=0.8', True, 'gzip'),
+    ('gzip;q=0', False, None),
+    ('*', False, 'gzip'),
+    ('*;q=0.1, gzip;q=0', False, None),
+    ('identity', True, None),
+    ('', True, None),
+    (None, True, None),
+])
+def test_accept_encoding_negotiation(header, brotli_available, expected):
+    assert choose_encoding(header, brotli_available) == expected
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('COMPRESS_MIN_SIZE', '500')
+    app = Flask(__name__)
+    init_compression(app)
+
+    @app.route('/rows')
+    def rows():
+        response = jsonify(ROWS[:int(request.args.get('n', len(ROWS)))])
+        response.set_etag('abc')
+        return response
+
+    @app.route('/stream')
+    def stream():
+        return Response((json.dumps(row) + '\n' for row in ROWS), mimetype='application/x-ndjson')
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return jsonify({'received': len(request.get_json()['readings'])})
+
+    return app.test_client()
+
+
+def test_large_json_is_gzipped_for_clients_that_accept_it(client):
+    response = client.get('/rows', headers={'Accept-Encoding': 'gzip, deflate'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == ROWS
+    assert len(response.data) < len(json.dumps(ROWS)) / 4
+    # The bytes changed, so the ETag is only a weak validator now
+    assert response.headers['ETag'] == 'W/"abc"'
+
+
+@pytest.mark.parametrize('path, headers', [
+    ('/rows', {}),                                   # client did not ask
+    ('/rows', {'Accept-Encoding': 'gzip;q=0'}),      # client refused
+    ('/rows?n=2', {'Accept-Encoding': 'gzip'}),      # below COMPRESS_MIN_SIZE
+])
+def test_left_uncompressed(client, path, headers):
+    response = client.get(path, headers=headers)
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == ROWS[:len(response.get_json())]
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    chunks = list(response.response)
+
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    # Each chunk is sync-flushed, so it decodes as soon as it arrives
+    decoder = zlib.decompressobj(31)
+    first = decoder.decompress(chunks[0])
+    assert first == (json.dumps(ROWS[0]) + '\n').encode()
+    body = first + decoder.decompress(b''.join(chunks[1:]))
+    assert decoder.eof and [json.loads(line) for line in body.splitlines()] == ROWS
+
+
+def test_gzip_request_bodies_are_decoded(client):
+    body = gzip.compress(json.dumps({'readings': ROWS}).encode())
+    response = client.post('/echo', data=body, headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/json'})
+    assert response.status_code == 200 and response.get_json() == {'received': len(ROWS)}
+
+
+@pytest.mark.parametrize('body, encoding, error', [
+    (b'not gzip', 'gzip', 'invalid gzip body'),
+    (b'{}', 'br', 'unsupported Content-Encoding: br'),
+])
+def test_bad_request_bodies_are_rejected(client, body, encoding, error):
+    response = client.post('/echo', data=body, headers={'Content-Encoding': encoding, 'Content-Type': 'application/json'})
+    assert response.status_code == 400 and response.get_json()['error'].startswith(error)
+
+
+def test_decompressed_size_is_limited():
+    bomb = gzip.compress(b'0' * 10000)
+    assert decompress_body(bomb, 'gzip', limit=10000) == b'0' * 10000
+    with pytest.raises(ValueError, match='larger than 9999 bytes'):
+        decompress_body(bomb, 'gzip', limit=9999)
+
+
+def test_asgi_middleware_decodes_request_bodies():
+    testclient = pytest.importorskip('starlette.testclient')
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def echo(request):
+        return JSONResponse({'received': len((await request.json())['readings']),
+                             'length': request.headers['content-length']})
+
+    app = DecompressRequestMiddleware(Starlette(routes=[Route('/echo', echo, methods=['POST'])]))
+    client = testclient.TestClient(app)
+    payload = json.dumps({'readings': ROWS}).encode()
+
+    response = client.post('/echo', content=gzip.compress(payload), headers={'Content-Encoding': 'gzip'})
+    assert response.json() == {'received': len(ROWS), 'length': str(len(payload))}
+    response = client.post('/echo', content=b'not gzip', headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from serialization import fetch_reading_rows, newer_rows, parse_since, reading_cursor, readings_payload
+
+START = datetime(2024, 1, 1)
+
+
+def test_parse_since():
+    assert parse_since(' 42 ') == 42
+    assert parse_since('2024-01-01T10:00:00') == datetime(2024, 1, 1, 10)
+    assert parse_since('2024-01-01T10:00:00Z') == datetime(2024, 1, 1, 10)
+    assert parse_since('2024-01-01T12:00:00+02:00') == datetime(2024, 1, 1, 10)
+    with pytest.raises(ValueError):
+        parse_since('yesterday')
+
+
+def test_newer_rows_and_cursor():
+    rows = [(3, 'TX1', 230.0, 5.0, False, START + timedelta(seconds=10)),
+            (None, 'TX1', 230.0, 5.0, False, START + timedelta(seconds=20)),  # compacted
+            (5, 'TX1', 230.0, 5.0, False, START)]
+
+    assert [row[0] for row in newer_rows(rows, 3)] == [5]
+    assert [row[0] for row in newer_rows(rows, START + timedelta(seconds=5))] == [3, None]
+    assert reading_cursor(rows) == 5
+    assert reading_cursor([rows[1]]) == (START + timedelta(seconds=20)).isoformat()
+    assert reading_cursor([], 7) == 7
+    assert reading_cursor([], START) == START.isoformat()
+
+
+def test_id_cursor_delivers_each_reading_once(sqlite_engine, reading_table):
+    reading_table.metadata.create_all(sqlite_engine)
+
+    def add(session, seconds):
+        session.execute(insert(reading_table), [
+            {'transformer_id': 'TX1', 'voltage': 230.0, 'current': 5.0, 'trip_status': False,
+             'timestamp': START + timedelta(seconds=s)} for s in seconds
+        ])
+        session.commit()
+
+    with Session(sqlite_engine) as session:
+        add(session, range(0, 100, 10))
+        first = readings_payload('TX1', fetch_reading_rows(session, reading_table.c, 'TX1', 50))
+        assert len(first['readings']) == 10
+
+        add(session, [200, 5])  # a new reading and a late, back-dated one
+        since = parse_since(str(first['cursor']))
+        second = readings_payload('TX1', fetch_reading_rows(session, reading_table.c, 'TX1', 50, since), since=since)
+        assert [r['timestamp'] for r in second['readings']] == [START + timedelta(seconds=200),
+                                                                 START + timedelta(seconds=5)]
+
+        since = parse_since(str(second['cursor']))
+        third = readings_payload('TX1', fetch_reading_rows(session, reading_table.c, 'TX1', 50, since), since=since)
+        assert third['readings'] == [] and third['cursor'] == second['cursor']
+
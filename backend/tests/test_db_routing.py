@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from db_routing import REGISTRY_KEY, ReplicaRouter, replica_uris_from_hosts
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('db_routing.time.monotonic', clock)
+    return clock
+
+
+def make_db(path, name):
+    """SQLite file whose `whoami` table says which database answered"""
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE whoami (name TEXT)'))
+        connection.execute(text('INSERT INTO whoami VALUES (:name)'), {'name': name})
+    engine.dispose()
+    return f'sqlite:///{path}'
+
+
+def whoami(session):
+    return session.execute(text('SELECT name FROM whoami')).scalar()
+
+
+@pytest.fixture
+def primary(tmp_path):
+    engine = create_engine(make_db(tmp_path / 'primary.db', 'primary'))
+    session = Session(bind=engine)
+    yield SimpleNamespace(session=session)
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def make_router(tmp_path, primary, clock):
+    routers = []
+
+    def make(names, **options):
+        uris = [make_db(tmp_path / f'{name}.db', name) if name else f'sqlite:///{tmp_path / "empty.db"}'
+                for name in names]
+        router = ReplicaRouter(primary, uris, **options)
+        routers.append(router)
+        return router
+    yield make
+    for router in routers:
+        for replica in router.replicas:
+            replica.engine.dispose()
+
+
+def test_round_robin_over_replicas(make_router):
+    router = make_router(['r1', 'r2'])
+    assert [router.run_read(whoami) for _ in range(4)] == ['r1', 'r2', 'r1', 'r2']
+    assert router.status()['replica_reads'] == 4 and router.status()['primary_reads'] == 0
+
+
+def test_no_replicas_reads_the_primary(make_router):
+    router = make_router([])
+    assert router.run_read(whoami) == 'primary'
+
+
+def test_failed_replica_falls_back_and_is_skipped(make_router):
+    router = make_router(['r1', None], retry_interval=10)  # the second one has no tables
+
+    assert [router.run_read(whoami) for _ in range(4)] == ['r1', 'primary', 'r1', 'r1']
+    status = router.status()
+    assert status['failovers'] == 1
+    assert [r['healthy'] for r in status['replicas']] == [True, False]
+
+
+def test_failed_replica_is_rechecked_after_the_retry_interval(make_router, clock, tmp_path):
+    router = make_router(['r1', None], retry_interval=10)
+    router.run_read(whoami)
+    router.run_read(whoami)  # marks the second replica failed
+    make_db(tmp_path / 'empty.db', 'r2')  # it comes back
+
+    clock.now += 5
+    assert [router.run_read(whoami) for _ in range(2)] == ['r1', 'r1']
+    clock.now += 5
+    assert [router.run_read(whoami) for _ in range(2)] == ['r2', 'r1']
+    assert router.replicas[1].healthy
+
+
+def test_all_replicas_down_reads_the_primary(make_router):
+    router = make_router([None])
+    assert router.run_read(whoami) == 'primary'
+    assert router.run_read(whoami) == 'primary'
+    assert router.status()['failovers'] == 1
+
+
+def test_reads_stay_on_the_primary_during_the_lag_window(make_router, clock):
+    router = make_router(['r1'], lag_window=2.0)
+    router.mark_write('TX1', REGISTRY_KEY)
+
+    assert router.run_read(whoami, key='TX1') == 'primary'
+    assert router.run_read(whoami, key=REGISTRY_KEY) == 'primary'
+    assert router.run_read(whoami, key='TX2') == 'r1'
+    assert router.run_read(whoami) == 'r1'
+
+    clock.now += 1.9
+    assert router.run_read(whoami, key='TX1') == 'primary'
+    clock.now += 0.1
+    assert router.run_read(whoami, key='TX1') == 'r1'
+
+
+def test_non_database_errors_are_not_failovers(make_router):
+    router = make_router(['r1'])
+
+    def broken(session):
+        raise KeyError('bug in the view')
+
+    with pytest.raises(KeyError):
+        router.run_read(broken)
+    assert router.replicas[0].healthy and router.status()['failovers'] == 0
+
+
+def test_replica_uris_from_hosts():
+    assert replica_uris_from_hosts('db1, db2:3307,,sqlite:///r.db', 'u', 'p', 'lt') == [
+        'mysql://u:p@db1/lt', 'mysql://u:p@db2:3307/lt', 'sqlite:///r.db',
+    ]
@@ -0,0 +1,166 @@
+import asyncio
+import socket as pysocket
+import struct
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('docker')
+
+from docker_executor import DockerExecutor  # noqa: E402
+
+
+class FakeContainer:
+    def __init__(self, number):
+        self.id = f'container{number}'
+        self.removed = False
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeApi:
+    """
+    The exec part of the docker API. Commands run on this machine, with
+    `python` standing for this interpreter; output goes back in docker's
+    multiplexed stream format
+    """
+
+    def __init__(self):
+        self.execs = {}
+
+    def exec_create(self, container, cmd, stdin=False, user='', workdir=None):
+        exec_id = f'exec{len(self.execs)}'
+        self.execs[exec_id] = {'container': container, 'cmd': cmd, 'stdin': stdin, 'exit_code': None}
+        return {'Id': exec_id}
+
+    def exec_start(self, exec_id, socket=False):
+        ours, theirs = pysocket.socketpair()
+        threading.Thread(target=self._run, args=(self.execs[exec_id], theirs), daemon=True).start()
+        return ours
+
+    def exec_inspect(self, exec_id):
+        return {'ExitCode': self.execs[exec_id]['exit_code']}
+
+    def _run(self, record, sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        record['received'] = b''.join(chunks)
+        cmd = [sys.executable if arg == 'python' else arg for arg in record['cmd']]
+        done = subprocess.run(cmd, input=record['received'], capture_output=True)
+        for stream, data in ((1, done.stdout), (2, done.stderr)):
+            if data:
+                sock.sendall(struct.pack('>BxxxL', stream, len(data)) + data)
+        # Killed by a signal: docker reports 128 + the signal number
+        record['exit_code'] = done.returncode if done.returncode >= 0 else 128 - done.returncode
+        sock.close()
+
+
+class FakeClient:
+    def __init__(self):
+        self.api = FakeApi()
+        self.started = []
+        self.images = SimpleNamespace(get=lambda name: None)
+        self.containers = SimpleNamespace(run=self._run)
+
+    def _run(self, image, command, **options):
+        container = FakeContainer(len(self.started))
+        self.started.append(container)
+        return container
+
+
+def execute(code, timeout=5, emit=None, output_limit=None, **options):
+    client = FakeClient()
+
+    async def main():
+        executor = DockerExecutor(client_factory=lambda: client, pool_size=1, max_concurrency=1, **options)
+        await executor.initialize()
+        assert executor.is_available()
+        result = await executor.execute_code(code, timeout=timeout, emit=emit, output_limit=output_limit)
+        await asyncio.gather(*executor._background)  # let the container recycle
+        await executor.shutdown()
+        return result
+    return asyncio.run(main()), client
+
+
+def test_code_is_sent_on_stdin_not_argv():
+    code = '# padding\n' * 30000 + 'print(42)'
+    assert len(code) > 256 * 1024
+    (stdout, stderr), client = execute(code)
+
+    assert (stdout, stderr) == ('42', '')
+    [record] = client.api.execs.values()
+    assert record['cmd'][-2:] == ['python', '-'] and record['stdin']
+    assert record['received'] == code.encode()
+
+
+def test_tracebacks_name_stdin():
+    (stdout, stderr), _ = execute('print("before")\n1 / 0')
+    assert stdout == 'before'
+    assert 'File "<stdin>", line 2' in stderr and stderr.endswith('ZeroDivisionError: division by zero')
+
+
+def test_timeout_is_reported_by_the_timer():
+    (stdout, stderr), _ = execute('print("started")\nwhile True:\n    pass', timeout=1)
+    assert stdout == '' and stderr.startswith('Execution timed out after 1 seconds')
+
+
+@pytest.mark.parametrize('code', ['import sys\nprint("done")\nsys.exit(124)',
+                                  'import os\nprint("done", flush=True)\nos._exit(137)'])
+def test_timeout_exit_codes_from_the_program_are_not_timeouts(code):
+    (stdout, stderr), _ = execute(code)
+    assert stdout == 'done' and 'timed out' not in stderr
+
+
+def test_killed_program_gets_an_explanation():
+    (stdout, stderr), _ = execute('import os, signal\nos.kill(os.getpid(), signal.SIGKILL)', mem_limit='64m')
+    assert stdout == '' and stderr == 'Your program was killed, probably for using more than 64m of memory.'
+
+
+def test_container_is_replaced_after_max_uses():
+    _, client = execute('print(1)', max_uses=1)
+    assert client.started[0].removed
+    assert len(client.started) == 2
+
+
+def collector():
+    chunks = []
+
+    async def emit(name, text):
+        chunks.append((name, text))
+    return chunks, emit
+
+
+def test_streamed_output():
+    chunks, emit = collector()
+    (stdout, stderr), client = execute('import sys\nprint("out")\nprint("err", file=sys.stderr)', emit=emit)
+
+    assert sorted(chunks) == [('stderr', 'err\n'), ('stdout', 'out\n')]
+    assert (stdout, stderr) == ('out', 'err')
+    [record] = client.api.execs.values()
+    assert record['cmd'][-3:] == ['python', '-u', '-']
+
+
+def test_streamed_timeout_notice_is_not_forwarded():
+    chunks, emit = collector()
+    (_, stderr), _ = execute('print("started")\nwhile True:\n    pass', timeout=1, emit=emit)
+
+    assert chunks == [('stdout', 'started\n')]
+    assert stderr.startswith('Execution timed out')
+
+
+def test_streamed_output_limit():
+    chunks, emit = collector()
+    (stdout, stderr), client = execute('print("x" * 5000)', emit=emit, output_limit=100)
+
+    assert chunks == [('stdout', 'x' * 100)]
+    assert stdout == 'x' * 100
+    assert stderr == 'Execution stopped: your program printed more than 100 bytes of output.'
+    assert client.started[0].removed  # still running: never reused
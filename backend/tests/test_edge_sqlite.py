@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, select
+
+from edge_sqlite import SingleWriter, configure_sqlite, edge_pragmas_from_env, sqlite_settings
+
+items = Table(
+    'item', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('name', String(50), unique=True, nullable=False),
+)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    for name in ('SQLITE_PROFILE', 'SQLITE_SYNCHRONOUS', 'SQLITE_BUSY_TIMEOUT'):
+        monkeypatch.delenv(name, raising=False)
+    engine = create_engine(f'sqlite:///{tmp_path / "edge.db"}')
+    configure_sqlite(engine, edge_pragmas_from_env())
+    items.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def add(name):
+    def write(session):
+        return session.execute(insert(items).values(name=name)).inserted_primary_key[0]
+    return write
+
+
+def names(engine):
+    with engine.connect() as connection:
+        return sorted(connection.scalars(select(items.c.name)))
+
+
+def hold(writer):
+    """Occupy the writer thread until the returned event is set, so later submits queue up"""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker(session):
+        started.set()
+        release.wait(5)
+    future = writer.submit(blocker)
+    assert started.wait(5)
+    return future, release
+
+
+def test_queued_writes_are_committed_together(engine):
+    writer = SingleWriter(engine, checkpoint_interval=0)
+    blocked, release = hold(writer)
+    futures = [writer.submit(add(f'item{i}')) for i in range(10)]
+    release.set()
+
+    assert sorted(future.result(5) for future in futures) == list(range(1, 11))
+    blocked.result(5)
+    assert writer.stats()['jobs'] == 11 and writer.stats()['commits'] == 2
+    assert names(engine) == sorted(f'item{i}' for i in range(10))
+
+
+def test_group_size_is_bounded(engine):
+    writer = SingleWriter(engine, checkpoint_interval=0, max_batch=4)
+    blocked, release = hold(writer)
+    futures = [writer.submit(add(f'item{i}')) for i in range(10)]
+    release.set()
+
+    for future in futures:
+        future.result(5)
+    assert writer.commits == 1 + 3
+
+
+def test_a_failing_write_only_fails_its_own_caller(engine):
+    writer = SingleWriter(engine, checkpoint_interval=0)
+    writer.run(add('taken'))
+    blocked, release = hold(writer)
+
+    def half_done(session):
+        session.execute(insert(items).values(name='partial'))
+        raise ValueError('device sent garbage')
+    futures = [writer.submit(fn) for fn in (add('first'), half_done, add('taken'), add('last'))]
+    release.set()
+
+    assert futures[0].result(5) and futures[3].result(5)
+    with pytest.raises(ValueError, match='garbage'):
+        futures[1].result(5)
+    with pytest.raises(Exception, match='UNIQUE constraint failed'):
+        futures[2].result(5)
+    # The failed writes left nothing behind; the others were retried one by one
+    assert names(engine) == ['first', 'last', 'taken']
+    assert writer.jobs == 6 and writer.commits == 4
+
+
+def test_edge_pragmas_are_applied_to_every_connection(engine, monkeypatch):
+    assert sqlite_settings(engine) == {
+        'journal_mode': 'wal', 'synchronous': 1, 'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -65536, 'busy_timeout': 5000,
+    }
+    monkeypatch.setenv('SQLITE_SYNCHRONOUS', 'FULL')
+    assert edge_pragmas_from_env()['synchronous'] == 'FULL'
+    monkeypatch.setenv('SQLITE_PROFILE', 'default')
+    assert edge_pragmas_from_env() is None
+
+
+def test_checkpoint_truncates_a_large_wal(engine):
+    writer = SingleWriter(engine, checkpoint_interval=0)
+    writer.run(lambda session: session.execute(insert(items), [{'name': f'item{i}'} for i in range(2000)]))
+    wal = f'{engine.url.database}-wal'
+    assert os.path.getsize(wal) > 0
+
+    writer.checkpoint()
+    assert writer.last_checkpoint['mode'] == 'PASSIVE' and not writer.last_checkpoint['busy']
+    assert writer.last_checkpoint['checkpointed'] == writer.last_checkpoint['wal_pages'] > 0
+
+    writer.wal_limit = 0
+    writer.checkpoint()
+    assert writer.last_checkpoint['mode'] == 'TRUNCATE' and os.path.getsize(wal) == 0
+    assert writer.checkpoints == 2 and len(names(engine)) == 2000
+
+
+def test_writer_thread_checkpoints_on_its_interval(engine):
+    writer = SingleWriter(engine, checkpoint_interval=0.05)
+    writer.run(add('item'))
+    deadline = time.monotonic() + 5
+    while writer.checkpoints < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.checkpoints >= 2 and writer.commits == 1
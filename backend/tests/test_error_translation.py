@@ -0,0 +1,105 @@
+import subprocess
+import sys
+
+from error_translation import ErrorTranslator, translator
+
+RULES = [
+    {'type': 'NameError', 'pattern': "name '(.+?)' is not defined", 'message': "Variable Error: '\\1' is not defined."},
+    {'type': 'ValueError', 'pattern': '(.+)', 'message': 'Value Error: \\1.'},
+    {'type': 'ZeroDivisionError', 'message': 'Division Error: dividing by zero.'},
+    {'type': 'JSONDecodeError', 'pattern': '(.+)', 'message': "JSON Error: \\1."},
+]
+TIPS = {
+    'NameError': 'Define it first.',
+    'ModuleNotFoundError': {'docker': 'The sandbox cannot install packages.', 'default': 'Check the spelling.'},
+}
+
+
+def run(code):
+    """stderr of running code the way the subprocess executor does"""
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True).stderr
+
+
+def traceback_text(*body):
+    return '\n'.join(['Traceback (most recent call last):', '  File "<main>", line 3, in <module>',
+                      '    f()', '  File "<main>", line 2, in f', '    raise X', *body])
+
+
+def test_rule_message_tip_and_user_line():
+    result = ErrorTranslator(RULES, TIPS).translate(traceback_text("NameError: name 'x' is not defined"))
+
+    assert result.type == 'NameError'
+    assert result.message == "Variable Error: 'x' is not defined."
+    assert result.tip == 'Define it first.'
+    assert result.line == 2
+    assert result.text.startswith('Traceback') and result.text.endswith('💡 Tip: Define it first.')
+
+
+def test_multi_line_message_and_notes_are_kept():
+    stderr = traceback_text('ValueError: first line', 'second line', 'a note added with add_note()')
+    result = ErrorTranslator(RULES, TIPS).translate(stderr)
+
+    assert result.type == 'ValueError'
+    assert result.message == 'Value Error: first line.\nsecond line\na note added with add_note()'
+
+
+def test_notes_from_a_real_traceback():
+    stderr = run("e = ValueError('bad value')\ne.add_note('while reading row 3')\nraise e")
+    result = translator.translate(stderr, filename='<string>')
+
+    assert result.type == 'ValueError'
+    assert result.message.endswith('while reading row 3')
+    assert result.line == 3
+
+
+def test_dotted_exception_names_use_the_last_component():
+    stderr = run("import json\njson.loads('{')")
+    assert 'json.decoder.JSONDecodeError' in stderr
+    result = ErrorTranslator(RULES, TIPS).translate(stderr, filename='<string>')
+
+    assert result.type == 'JSONDecodeError'
+    assert result.message.startswith('JSON Error: Expecting property name')
+    assert result.line == 2
+
+
+def test_chained_tracebacks_report_the_last_exception():
+    stderr = run("try:\n    1 / 0\nexcept ZeroDivisionError:\n    undefined_name")
+    assert 'During handling of the above exception' in stderr
+    result = ErrorTranslator(RULES, TIPS).translate(stderr, filename='<string>')
+
+    assert result.type == 'NameError'
+    assert result.message == "Variable Error: 'undefined_name' is not defined."
+    assert result.line == 4
+
+
+def test_bare_exception_name():
+    result = ErrorTranslator(RULES, TIPS).translate(traceback_text('ZeroDivisionError'))
+    assert result.type == 'ZeroDivisionError' and result.message == 'Division Error: dividing by zero.'
+
+
+def test_syntax_error_without_a_traceback_header():
+    stderr = run('x = (1,\nprint(x')
+    result = translator.translate(stderr, filename='<string>')
+
+    assert result.type == 'SyntaxError'
+    assert result.line is not None
+
+
+def test_unmatched_exception_keeps_the_original_message():
+    result = ErrorTranslator(RULES, TIPS).translate(traceback_text('KeyError: 3'))
+    assert result.type == 'KeyError' and result.message == 'KeyError: 3' and result.tip is None
+
+
+def test_tips_depend_on_the_executor():
+    stderr = run('import not_a_real_module')
+    translate = ErrorTranslator(RULES, TIPS).translate
+
+    assert translate(stderr, executor='docker').tip == 'The sandbox cannot install packages.'
+    assert translate(stderr, executor='pool').tip == 'Check the spelling.'
+    assert translate(stderr).tip == 'Check the spelling.'
+
+
+def test_output_without_an_exception():
+    translate = ErrorTranslator(RULES, TIPS).translate
+    assert translate('just some warning text\non stderr') is None
+    assert translate('') is None
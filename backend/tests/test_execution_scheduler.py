@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from execution_scheduler import ExecutionScheduler, QueueFull
+
+
+def scheduled(test, **options):
+    """Run test(scheduler) against a started scheduler whose jobs run their code as a coroutine function"""
+    async def main():
+        scheduler = ExecutionScheduler(lambda code: code(), **options)
+        await scheduler.start()
+        try:
+            return await test(scheduler)
+        finally:
+            await scheduler.stop()
+    return asyncio.run(main())
+
+
+def test_round_robin_between_clients():
+    order = []
+
+    def job(name):
+        async def run():
+            order.append(name)
+            return name
+        return run
+
+    async def test(scheduler):
+        jobs = [scheduler.submit('a', job(f'a{i}')) for i in range(3)] + [scheduler.submit('b', job('b0'))]
+        await asyncio.gather(*(job.done.wait() for job in jobs))
+        return [job.result for job in jobs]
+
+    assert scheduled(test, workers=1) == ['a0', 'a1', 'a2', 'b0']
+    assert order == ['a0', 'b0', 'a1', 'a2']
+
+
+def test_queue_limits():
+    async def test(scheduler):
+        blocker = asyncio.Event()
+        scheduler.submit('a', blocker.wait)
+        await asyncio.sleep(0)  # the worker takes it
+        scheduler.submit('a', blocker.wait)
+        with pytest.raises(QueueFull) as rejected:
+            scheduler.submit('a', blocker.wait)
+        blocker.set()
+        return rejected.value.retry_after, scheduler.stats()['rejected']
+
+    assert scheduled(test, workers=1, max_queue_per_client=1, retry_after=7) == (7, 1)
+
+
+def test_failed_job_keeps_the_worker():
+    async def fail():
+        raise ValueError('broken')
+
+    async def ok():
+        return 'ok'
+
+    async def test(scheduler):
+        failed, done = scheduler.submit('a', fail), scheduler.submit('a', ok)
+        await done.done.wait()
+        return failed.status, failed.error, done.result
+
+    assert scheduled(test, workers=1) == ('failed', 'broken', 'ok')
+
+
+def test_cancel_running_and_queued_jobs():
+    started, stopped = asyncio.Event(), []
+
+    async def forever():
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        finally:
+            stopped.append(True)
+
+    async def never():
+        raise AssertionError('a cancelled queued job ran')
+
+    async def ok():
+        return 'ok'
+
+    async def test(scheduler):
+        running = scheduler.submit('a', forever)
+        queued, after = scheduler.submit('a', never), scheduler.submit('a', ok)
+        await started.wait()
+        scheduler.cancel(queued)
+        scheduler.cancel(running)
+        await asyncio.wait_for(after.done.wait(), timeout=5)
+        scheduler.cancel(after)  # already finished: no effect
+        return running.status, queued.status, after.status, after.result
+
+    assert scheduled(test, workers=1) == ('cancelled', 'cancelled', 'done', 'ok')
+    assert stopped == [True]
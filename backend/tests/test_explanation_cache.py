@@ -0,0 +1,159 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from explanation_cache import ExplanationCache, normalize_code
+
+
+class StubCompletions:
+    """Stands in for client.chat.completions: answers after a short delay and counts calls"""
+
+    def __init__(self, answer='It prints hello.', fail=False):
+        self.answer = answer
+        self.fail = fail
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError('upstream down')
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))])
+
+
+def stub_client(**options):
+    return SimpleNamespace(chat=SimpleNamespace(completions=StubCompletions(**options)))
+
+
+def test_keys_ignore_whitespace_but_not_model_or_prompt():
+    key = ExplanationCache.make_key('print(1)\n', 'm', '1')
+    assert ExplanationCache.make_key('\r\n\nprint(1)   \r\n\n', 'm', '1') == key
+    assert ExplanationCache.make_key('print(2)', 'm', '1') != key
+    assert ExplanationCache.make_key('print(1)', 'other', '1') != key
+    assert ExplanationCache.make_key('print(1)', 'm', '2') != key
+    assert normalize_code('  a  \r\n\tb\t\n\n') == '  a\n\tb'
+
+
+def test_lru_eviction():
+    cache = ExplanationCache(max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'  # now most recently used
+    cache.set('c', 'C')
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('A', None, 'C')
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('explanation_cache.time.time', lambda: now[0])
+    cache = ExplanationCache(ttl=60)
+    cache.set('a', 'A')
+    now[0] += 59
+    assert cache.get('a') == 'A'
+    now[0] += 1
+    assert cache.get('a') is None
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'explanations.db')
+    ExplanationCache(path=path).set('a', 'A')
+
+    restarted = ExplanationCache(path=path)
+    assert restarted.get('a') == 'A'
+    assert restarted.get('a') == 'A'
+    assert (restarted.disk_hits, restarted.memory_hits) == (1, 1)
+
+
+def test_concurrent_requests_share_one_call():
+    cache = ExplanationCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'answer'
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_compute('k', compute) for _ in range(5)))
+        return results + [await cache.get_or_compute('k', compute)]
+
+    assert asyncio.run(main()) == ['answer'] * 6
+    assert len(calls) == 1
+    assert cache.stats()['misses'] == 1 and cache.stats()['coalesced'] == 4 and cache.memory_hits == 1
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = ExplanationCache()
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError('upstream down')
+        return 'answer'
+
+    async def main():
+        first = await asyncio.gather(*(cache.get_or_compute('k', compute) for _ in range(3)),
+                                     return_exceptions=True)
+        return first, await cache.get_or_compute('k', compute)
+
+    first, retried = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert retried == 'answer' and len(attempts) == 2
+
+
+def test_a_caller_leaving_does_not_cancel_the_call_for_others():
+    cache = ExplanationCache()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return 'answer'
+
+    async def main():
+        leaving = asyncio.ensure_future(cache.get_or_compute('k', compute))
+        staying = asyncio.ensure_future(cache.get_or_compute('k', compute))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == 'answer'
+    assert cache.get('k') == 'answer'
+
+
+@pytest.fixture
+def explain(monkeypatch):
+    """main.explain_code_with_ai wired to a stub client and an empty cache"""
+    main = pytest.importorskip('main')
+    monkeypatch.setattr(main, 'explanation_cache', ExplanationCache())
+
+    def use(client):
+        monkeypatch.setattr(main, 'openai_client', client)
+        return main.explain_code_with_ai
+    return use
+
+
+def test_explain_endpoint_calls_the_model_once_per_snippet(explain):
+    client = stub_client()
+    explain_code = explain(client)
+
+    async def main():
+        first = await asyncio.gather(*(explain_code('print("hello")') for _ in range(3)))
+        return first + [await explain_code('print("hello")  \n')]
+
+    results = asyncio.run(main())
+    assert [r.explanation for r in results] == ['It prints hello.'] * 4
+    assert all(r.error is None for r in results)
+    [call] = client.chat.completions.calls
+    assert 'print("hello")' in call['messages'][-1]['content']
+
+
+def test_explain_endpoint_reports_upstream_errors(explain):
+    client = stub_client(fail=True)
+    explain_code = explain(client)
+
+    result = asyncio.run(explain_code('print(1)'))
+    assert result.explanation == '' and result.error == 'AI explanation failed: upstream down'
+    asyncio.run(explain_code('print(1)'))
+    assert len(client.chat.completions.calls) == 2
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from explanation_cache import ExplanationCache
+
+main = pytest.importorskip('main')
+openai = pytest.importorskip('openai')
+
+TOKENS = ['This ', 'code ', 'prints ', 'hello.']
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """/v1/chat/completions streaming the server's tokens in OpenAI's SSE format"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server.requests.append(body)
+        if server.fail:
+            self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': {'message': 'model overloaded'}}).encode())
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for token in server.tokens:
+                chunk = {'id': 'c1', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                         'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                self.wfile.flush()
+                time.sleep(server.delay)
+            self.wfile.write(b'data: [DONE]\n\n')
+            server.finished += 1
+        except (BrokenPipeError, ConnectionResetError):
+            server.aborted += 1
+
+
+@pytest.fixture
+def fake_openai():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAI)
+    server.daemon_threads = True
+    server.requests, server.tokens, server.delay, server.fail = [], TOKENS, 0.02, False
+    server.finished = server.aborted = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def run(fake_openai, monkeypatch):
+    """Run a coroutine function with main wired to the fake server and an empty cache"""
+    monkeypatch.setattr(main, 'explanation_cache', ExplanationCache())
+
+    def run(test):
+        async def with_client():
+            client = openai.AsyncOpenAI(api_key='test', base_url=f'http://127.0.0.1:{fake_openai.server_port}/v1',
+                                        max_retries=0)
+            monkeypatch.setattr(main, 'openai_client', client)
+            try:
+                return await test()
+            finally:
+                await client.close()
+        return asyncio.run(with_client())
+    return run
+
+
+async def collect(code='print("hello")'):
+    return [item async for item in main.stream_explanation_with_ai(code)]
+
+
+def tokens_and_result(items):
+    *tokens, (event, result) = items
+    assert event == 'result' and all(name == 'token' for name, _ in tokens)
+    return [text for _, text in tokens], result
+
+
+def test_tokens_stream_in_order_and_are_cached(run, fake_openai):
+    async def test():
+        return await collect(), await collect('print("hello")  \n')
+
+    first, second = run(test)
+
+    tokens, result = tokens_and_result(first)
+    assert tokens == TOKENS and result.explanation == ''.join(TOKENS) and result.error is None
+    assert tokens_and_result(second) == ([''.join(TOKENS)], result)
+    assert len(fake_openai.requests) == 1 and fake_openai.requests[0]['stream'] is True
+
+
+def test_concurrent_requests_share_one_upstream_stream(run, fake_openai):
+    async def test():
+        early = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.05)  # joins after some tokens were streamed
+        late = asyncio.ensure_future(collect())
+        plain = asyncio.ensure_future(main.explain_code_with_ai('print("hello")'))
+        return await early, await late, await plain
+
+    early, late, plain = run(test)
+
+    assert tokens_and_result(early)[0] == TOKENS
+    assert tokens_and_result(late)[0] == TOKENS  # replayed from the start
+    assert plain.explanation == ''.join(TOKENS)
+    assert len(fake_openai.requests) == 1
+
+
+def test_disconnect_closes_the_upstream_stream(run, fake_openai):
+    fake_openai.tokens = ['token '] * 200
+    fake_openai.delay = 0.01
+
+    async def test():
+        stream = main.stream_explanation_with_ai('print("hello")')
+        first = await stream.__anext__()
+        await stream.aclose()  # the browser went away
+        for _ in range(300):
+            if fake_openai.aborted:
+                break
+            await asyncio.sleep(0.01)
+        return first
+
+    assert run(test) == ('token', 'token ')
+    assert fake_openai.aborted == 1 and fake_openai.finished == 0
+    assert main.explanation_cache.stats()['entries'] == 0
+
+
+def test_upstream_errors_are_reported_and_not_cached(run, fake_openai):
+    fake_openai.fail = True
+
+    async def test():
+        return await collect(), await collect()
+
+    first, second = run(test)
+
+    [(event, result)] = first
+    assert event == 'result' and result.explanation == '' and result.error.startswith('AI explanation failed:')
+    assert second == first and len(fake_openai.requests) == 2
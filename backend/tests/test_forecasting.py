@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import MetaData, insert
+from sqlalchemy.orm import Session
+
+from chunk_storage import chunk_table, compact_readings
+from tests.helpers import make_reading_table
+
+np = pytest.importorskip('numpy')
+
+from forecasting import HOURS_AHEAD, FleetForecast, Forecaster, HourlyHistory, fit_fleet, history_matrices, \
+    hourly_history, merge_history  # noqa: E402
+
+START = datetime(2024, 1, 1)
+FIRST_HOUR = int((START - datetime(1970, 1, 1)).total_seconds()) // 3600
+
+
+def daily_load(days, base=5.0, swing=2.0, growth=0.0):
+    hours = np.arange(days * 24)
+    return base + swing * np.sin((hours % 24) / 24 * 2 * np.pi) + growth * (hours // 24)
+
+
+def test_history_matrices_layout():
+    history = HourlyHistory(
+        np.array(['TX2', 'TX1', 'TX1', 'TX1', 'TX2']),
+        np.array([FIRST_HOUR, FIRST_HOUR, FIRST_HOUR, FIRST_HOUR + 2, FIRST_HOUR + 5]),
+        np.array([10.0, 4.0, 8.0, 3.0, 99.0]),
+        np.array([2, 1, 1, 1, 1]),
+        np.array([6.0, 4.0, 9.0, 3.0, 99.0]),
+    )
+
+    ids, mean, peak = history_matrices(history, FIRST_HOUR, 4)
+
+    assert ids == ['TX1', 'TX2']
+    assert mean.shape == peak.shape == (2, 4)
+    # Repeated (transformer, hour) entries are combined; the hour outside the window is dropped
+    np.testing.assert_allclose(mean, [[6.0, np.nan, 3.0, np.nan], [5.0, np.nan, np.nan, np.nan]])
+    np.testing.assert_allclose(peak, [[9.0, np.nan, 3.0, np.nan], [6.0, np.nan, np.nan, np.nan]])
+
+
+def test_fit_shapes_and_noise_free_profile():
+    mean = np.vstack([daily_load(7), daily_load(7, base=2.0), np.full(7 * 24, np.nan)])
+    forecast, spread, peak_forecast, peak_spread = fit_fleet(mean, mean * 1.2)
+
+    assert forecast.shape == peak_forecast.shape == (3, HOURS_AHEAD)
+    assert spread.shape == peak_spread.shape == (3,)
+    np.testing.assert_allclose(forecast[0], daily_load(1), atol=1e-9)
+    np.testing.assert_allclose(forecast[1], daily_load(1, base=2.0), atol=1e-9)
+    np.testing.assert_allclose(spread[:2], 0.0, atol=1e-9)
+    # No history at all: forecast 0 rather than NaN
+    assert not np.isnan(forecast).any() and (forecast[2] == 0).all()
+
+
+def test_fit_follows_a_trend():
+    load = daily_load(14, growth=0.5)
+    forecast, spread, _, _ = fit_fleet(load[None, :], load[None, :])
+
+    np.testing.assert_allclose(forecast[0], daily_load(15, growth=0.5)[-24:], atol=1e-9)
+    assert spread[0] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_fit_tolerates_missing_readings():
+    rng = np.random.default_rng(0)
+    load = daily_load(14, growth=0.5) + rng.normal(0, 0.2, 14 * 24)
+    load[rng.random(load.shape) < 0.2] = np.nan
+    forecast, spread, _, _ = fit_fleet(load[None, :], load[None, :])
+
+    assert not np.isnan(forecast).any()
+    assert forecast[0].mean() == pytest.approx(daily_load(15, growth=0.5)[-24:].mean(), abs=0.3)
+    assert 0.1 < spread[0] < 1.0  # noise of 0.2 plus what the gaps cost the profile
+
+
+def test_fleet_forecast_risk_ranking():
+    days = 7
+    mean = np.vstack([daily_load(days, base=b) for b in (3.0, 9.0, 11.0)])
+    result = FleetForecast(['low', 'high', 'over'], START, *fit_fleet(mean, mean + 1.0), rated_current=10.0,
+                           generated_at=START, history_hours=days * 24, fit_seconds=0.0)
+
+    risk = result.at_risk(threshold=1.0)
+    assert [row['transformer_id'] for row in risk['transformers']] == ['over', 'high']
+    assert risk['at_risk'] == 2 and risk['transformers_forecast'] == 3
+
+    detail = result.for_transformer('low')
+    assert len(detail['hours']) == len(detail['current']) == len(detail['upper']) == len(detail['peak']) == 24
+    assert detail['peak_upper'] >= detail['peak_current']
+    assert result.for_transformer('missing') is None
+
+
+def test_hourly_history_includes_compacted_readings(sqlite_engine):
+    metadata = MetaData()
+    reading = make_reading_table(metadata)
+    chunks = chunk_table(metadata)
+    metadata.create_all(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        session.execute(insert(reading), [
+            {'transformer_id': 'TX1', 'voltage': 230.0, 'current': float(minute % 4), 'trip_status': False,
+             'timestamp': START + timedelta(minutes=minute)} for minute in range(0, 180, 15)
+        ])
+        session.commit()
+        compact_readings(session, reading, chunks, before=START + timedelta(hours=1), chunk_seconds=3600)
+
+        history = hourly_history(session, reading, chunks, START, START + timedelta(hours=3))
+        ids, mean, peak = history_matrices(history, FIRST_HOUR, 3)
+
+    assert ids == ['TX1']
+    # Currents 0, 3, 2, 1 in every hour: minutes 0, 15, 30, 45
+    np.testing.assert_allclose(mean, [[1.5, 1.5, 1.5]])
+    np.testing.assert_allclose(peak, [[3.0, 3.0, 3.0]])
+
+
+def test_concurrent_first_requests_share_one_fit():
+    loads = []
+
+    def load_history(start, end):
+        loads.append(start)
+        time.sleep(0.2)  # a slow history query: every request arrives before it ends
+        return merge_history([])
+    forecaster = Forecaster(load_history, rated_current=10.0, days=2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(forecaster.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(loads) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
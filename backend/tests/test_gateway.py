@@ -0,0 +1,216 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+
+# Not the gateway.db a developer's .env may point at
+os.environ['GATEWAY_DATABASE_URL'] = 'sqlite://'
+
+import gateway  # noqa: E402
+from edge_sqlite import SingleWriter  # noqa: E402
+
+START = datetime(2024, 1, 1)
+
+
+class StubUpstream(ThreadingHTTPServer):
+    """
+    Central server stand-in. `answer(path, payload)` returns the status for
+    a request; every request is recorded as (path, payload, status)
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.requests = []
+        self.answer = lambda path, payload: 201
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def delivered(self):
+        """transformer_id/timestamp of every reading the server accepted, in order"""
+        return [(reading['transformer_id'], reading['timestamp'])
+                for path, payload, status in self.requests if path == '/add_readings' and status == 201
+                for reading in payload['readings']]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        status = self.server.answer(self.path, payload)
+        self.server.requests.append((self.path, payload, status))
+        data = json.dumps({'error': f'HTTP {status}'} if status >= 400 else {'message': 'ok'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = StubUpstream()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(gateway, 'UPSTREAM', server.url)
+    monkeypatch.setattr(gateway, 'TIMEOUT', 5)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "gateway.db"}')
+    gateway.metadata.create_all(engine)
+    yield engine, SingleWriter(engine, checkpoint_interval=0)
+    engine.dispose()
+
+
+def queue(writer, transformer_id, seconds, location=None):
+    """Queue readings (and first a registration, given a location) as the device API does"""
+    def write(session):
+        if location is not None:
+            session.execute(insert(gateway.transformer_table).values(transformer_id=transformer_id, location=location))
+            session.execute(insert(gateway.outbox_table).values(
+                kind='transformer', received_at=START,
+                body=json.dumps({'transformer_id': transformer_id, 'location': location}),
+            ))
+        session.execute(insert(gateway.outbox_table), [
+            {'kind': 'reading', 'received_at': START, 'body': gateway.dumps({
+                'transformer_id': transformer_id, 'voltage': 230.0, 'current': 5.0, 'trip_status': False,
+                'timestamp': START + timedelta(seconds=s),
+            }).decode()}
+            for s in seconds
+        ])
+    writer.run(write)
+
+
+def expected(transformer_id, seconds):
+    return [(transformer_id, (START + timedelta(seconds=s)).isoformat()) for s in seconds]
+
+
+def offset(engine):
+    with engine.connect() as connection:
+        return gateway.get_offset(connection)
+
+
+def rejected(engine):
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(gateway.rejected_table))
+
+
+def test_outage_then_resume_from_the_offset(store, upstream):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer, batch_size=4)
+    queue(writer, 'TX1', range(6), location='Sector A')
+    upstream.answer = lambda path, payload: 503
+
+    with pytest.raises(gateway.UpstreamError):
+        forwarder.run_once()
+    assert forwarder.pending()[0] == 7 and offset(engine) == 0
+
+    upstream.answer = lambda path, payload: 201
+    assert forwarder.run_once() == 4
+    assert forwarder.run_once() == 3
+    assert forwarder.pending()[0] == 0 and offset(engine) == 7
+    assert upstream.delivered() == expected('TX1', range(6))
+    assert forwarder.run_once() == 0
+
+
+def test_batch_is_sent_again_when_its_offset_was_lost(store, upstream, monkeypatch):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer)
+    queue(writer, 'TX1', range(3))
+
+    def crash(session, seq):
+        raise RuntimeError('power cut before the offset was saved')
+    with monkeypatch.context() as patch:
+        patch.setattr(gateway, 'set_offset', crash)
+        with pytest.raises(RuntimeError):
+            forwarder.run_once()
+    assert offset(engine) == 0
+
+    assert forwarder.run_once() == 3
+    # Same readings with the same timestamps: the central server skips the repeat
+    assert upstream.delivered() == expected('TX1', range(3)) * 2
+    assert forwarder.pending()[0] == 0
+
+
+def test_unknown_transformer_is_registered_and_the_batch_retried(store, upstream):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer)
+    writer.run(lambda session: session.execute(
+        insert(gateway.transformer_table).values(transformer_id='TX1', location='Sector A')
+    ))
+    queue(writer, 'TX1', range(2))
+    registered = []
+
+    def answer(path, payload):
+        if path == '/add_transformer':
+            registered.append(payload)
+            return 201
+        return 201 if registered else 404
+    upstream.answer = answer
+
+    assert forwarder.run_once() == 2
+    assert registered == [{'transformer_id': 'TX1', 'location': 'Sector A'}]
+    assert upstream.delivered() == expected('TX1', range(2))
+    assert rejected(engine) == 0
+
+
+def test_wrong_upstream_path_is_retried_not_rejected(store, upstream):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer)
+    queue(writer, 'TX1', range(2), location='Sector A')
+    upstream.answer = lambda path, payload: 404
+
+    with pytest.raises(gateway.UpstreamError):
+        forwarder.run_once()
+    assert forwarder.pending()[0] == 3 and rejected(engine) == 0
+
+
+@pytest.mark.parametrize('status', [401, 403, 404, 408, 429])
+def test_temporary_answers_keep_the_readings(store, upstream, status):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer)
+    queue(writer, 'TX1', range(2))
+    upstream.answer = lambda path, payload: 201 if path == '/add_transformer' else status
+
+    with pytest.raises(gateway.UpstreamError):
+        forwarder.run_once()
+    assert forwarder.pending()[0] == 2 and offset(engine) == 0 and rejected(engine) == 0
+
+
+def test_invalid_batch_is_rejected_and_skipped(store, upstream):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer)
+    queue(writer, 'TX1', range(2))
+    upstream.answer = lambda path, payload: 400
+
+    assert forwarder.run_once() == 2
+    assert rejected(engine) == 2 and forwarder.pending()[0] == 0 and offset(engine) == 2
+
+
+def test_too_large_batches_are_split(store, upstream):
+    engine, writer = store
+    forwarder = gateway.Forwarder(engine, writer, batch_size=8)
+    queue(writer, 'TX1', range(10))
+    upstream.answer = lambda path, payload: 413 if len(payload['readings']) > 3 else 201
+
+    assert forwarder.run_once() == 8
+    assert forwarder.batch_size == 2
+    assert forwarder.run_once() == 2
+    assert upstream.delivered() == expected('TX1', range(10))
+    assert rejected(engine) == 0 and offset(engine) == 10
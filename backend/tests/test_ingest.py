@@ -0,0 +1,126 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, insert, inspect, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+import ingest
+from ingest import (
+    UNIQUE_INDEX_NAME, ensure_unique_index, insert_ignoring_duplicates, insert_reading, insert_readings,
+    prepare_reading,
+)
+
+START = datetime(2024, 1, 1)
+
+
+def reading(seconds, transformer_id='TX1', **fields):
+    return {'transformer_id': transformer_id, 'voltage': 230.0, 'current': 5.0, 'trip_status': False,
+            'timestamp': START + timedelta(seconds=seconds), **fields}
+
+
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-Infinity', float('nan'), float('inf')])
+def test_non_finite_values_are_rejected(value):
+    with pytest.raises(ValueError, match='current must be a finite number'):
+        prepare_reading({'transformer_id': 'TX1', 'voltage': 230, 'current': value})
+
+
+def test_json_nan_and_infinity_are_rejected():
+    with pytest.raises(ValueError, match='voltage must be a finite number'):
+        prepare_reading(json.loads('{"transformer_id": "TX1", "voltage": NaN, "current": 5}'))
+    with pytest.raises(ValueError, match='current must be a finite number'):
+        prepare_reading(json.loads('{"transformer_id": "TX1", "voltage": 230, "current": Infinity}'))
+
+
+def test_numbers_in_strings_are_accepted():
+    row = prepare_reading({'transformer_id': 'TX1', 'voltage': '230.5', 'current': '5'})
+    assert (row['voltage'], row['current']) == (230.5, 5.0)
+    with pytest.raises(ValueError, match='voltage must be a number'):
+        prepare_reading({'transformer_id': 'TX1', 'voltage': 'high', 'current': 5})
+
+
+@pytest.mark.parametrize('value, tripped', [
+    (True, True), (False, False), (None, False), (1, True), (0, False),
+    ('true', True), ('True', True), ('1', True), ('yes', True),
+    ('false', False), ('FALSE', False), ('0', False), ('no', False), ('', False),
+])
+def test_trip_status_strings_are_parsed(value, tripped):
+    row = prepare_reading({'transformer_id': 'TX1', 'voltage': 230, 'current': 5, 'trip_status': value})
+    assert row['trip_status'] is tripped
+
+
+@pytest.mark.parametrize('value', ['tripped', 2, [True]])
+def test_unknown_trip_status_is_rejected(value):
+    with pytest.raises(ValueError, match='trip_status must be true or false'):
+        prepare_reading({'transformer_id': 'TX1', 'voltage': 230, 'current': 5, 'trip_status': value})
+
+
+def test_insert_reading_skips_a_retry(sqlite_engine, reading_table):
+    reading_table.metadata.create_all(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        first = insert_reading(session, reading_table, reading(0))
+        again = insert_reading(session, reading_table, reading(0, voltage=231.0))
+        session.commit()
+
+        assert first is not None and again is None
+        assert session.execute(select(reading_table.c.id, reading_table.c.voltage)).all() == [(first, 230.0)]
+
+
+@pytest.fixture(params=['on conflict', 'lookup first'])
+def dedupe_path(request, monkeypatch):
+    """SQLite's own path, and the one MySQL takes (look up stored keys, insert the rest)"""
+    if request.param == 'lookup first':
+        monkeypatch.setattr(ingest, '_counts_found_rows', lambda dialect_name: True)
+    return request.param
+
+
+def test_insert_readings_counts_only_new_rows(sqlite_engine, reading_table, dedupe_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'BATCH_CHUNK_SIZE', 3)
+    reading_table.metadata.create_all(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        assert insert_readings(session, reading_table, [reading(s) for s in (0, 10, 20)]) == 3
+        # A replay of stored readings, a repeat within the batch and new ones, across several chunks
+        batch = [reading(s) for s in (0, 10, 30, 30, 40, 20, 50)] + [reading(0, 'TX2')]
+        assert insert_readings(session, reading_table, batch) == 4
+        session.commit()
+
+        stored = session.execute(select(reading_table.c.transformer_id, reading_table.c.timestamp)).all()
+        assert sorted(stored) == sorted([('TX1', START + timedelta(seconds=s)) for s in (0, 10, 20, 30, 40, 50)]
+                                        + [('TX2', START)])
+
+
+def test_statements_per_dialect(reading_table):
+    row = reading(0)
+    mysql_sql = str(insert_ignoring_duplicates(reading_table, 'mysql').values(row).compile(dialect=mysql.dialect()))
+    sqlite_sql = str(insert_ignoring_duplicates(reading_table, 'sqlite').values(row).compile(dialect=sqlite.dialect()))
+
+    assert mysql_sql.startswith('INSERT INTO reading ') and 'IGNORE' not in mysql_sql
+    assert mysql_sql.endswith('ON DUPLICATE KEY UPDATE id = reading.id')
+    assert sqlite_sql.endswith('ON CONFLICT (transformer_id, timestamp) DO NOTHING')
+
+
+def test_unique_index_is_added_after_removing_duplicates(sqlite_engine):
+    # A reading table from before the unique index existed
+    legacy = Table(
+        'reading', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('transformer_id', String(50), nullable=False),
+        Column('voltage', Float, nullable=False),
+        Column('current', Float, nullable=False),
+        Column('trip_status', Boolean),
+        Column('timestamp', DateTime),
+    )
+    legacy.metadata.create_all(sqlite_engine)
+    with sqlite_engine.begin() as connection:
+        connection.execute(insert(legacy), [reading(0), reading(0, voltage=231.0), reading(10), reading(0),
+                                            reading(0, 'TX2')])
+
+        assert ensure_unique_index(connection, legacy) == 2
+        assert ensure_unique_index(connection, legacy) is None
+
+        assert UNIQUE_INDEX_NAME in {index['name'] for index in inspect(connection).get_indexes('reading')}
+        # The oldest copy is kept
+        assert connection.execute(select(legacy.c.id, legacy.c.voltage).order_by(legacy.c.id)).all() == \
+            [(1, 230.0), (3, 230.0), (5, 230.0)]
+        assert insert_readings(connection, legacy, [reading(0), reading(20)]) == 1
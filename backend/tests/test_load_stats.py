@@ -0,0 +1,96 @@
+import math
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from load_stats import LoadStats
+
+START = datetime(2024, 1, 1)
+NOW = (START - datetime(1970, 1, 1)).total_seconds()
+
+
+def feed(stats, transformer_id, currents, step=60, voltage=230.0, trips=()):
+    for i, current in enumerate(currents):
+        stats.add(transformer_id, voltage, current, i in trips, START + timedelta(seconds=step * i))
+
+
+def test_welford_matches_statistics():
+    rng = random.Random(3)
+    currents = [rng.uniform(2, 12) for _ in range(500)]
+    stats = LoadStats()
+    feed(stats, 'TX1', currents)
+
+    record = stats.get('TX1', now=NOW)
+    assert record['readings'] == 500
+    assert record['current_mean'] == pytest.approx(statistics.fmean(currents), abs=1e-3)
+    assert record['current_mean_std'] == pytest.approx(statistics.stdev(currents), abs=1e-3)
+    assert record['peak_current'] == max(currents)
+    assert record['load_factor'] == pytest.approx(statistics.fmean(currents) / max(currents), abs=1e-3)
+
+
+def test_ewma_decays_with_elapsed_time():
+    stats = LoadStats(rated_current=10.0, ewma_seconds=900.0)
+    currents, gaps = [4.0, 8.0, 6.0, 10.0], [0, 60, 900, 3600]
+    ewma = var = None
+    ts = 0
+    for current, gap in zip(currents, gaps):
+        ts += gap
+        stats.add('TX1', 230.0, current, False, START + timedelta(seconds=ts))
+        if ewma is None:
+            ewma, var = current, 0.0
+        else:
+            alpha = 1 - math.exp(-gap / 900.0)
+            diff = current - ewma
+            ewma += alpha * diff
+            var = (1 - alpha) * (var + diff * alpha * diff)
+
+    record = stats.get('TX1', now=NOW)
+    assert record['current'] == round(ewma, 3)
+    assert record['current_std'] == round(math.sqrt(var), 3)
+    assert record['utilization'] == round(ewma / 10.0, 3)
+
+
+def test_equally_spaced_readings_converge_to_the_level():
+    stats = LoadStats(ewma_seconds=300.0)
+    feed(stats, 'TX1', [2.0] * 10 + [9.0] * 200)
+    assert stats.get('TX1', now=NOW)['current'] == pytest.approx(9.0, abs=1e-3)
+
+
+def test_stale_and_duplicate_readings_are_ignored():
+    stats = LoadStats()
+    assert stats.add('TX1', 230.0, 5.0, False, START + timedelta(minutes=1))
+    assert not stats.add('TX1', 230.0, 50.0, True, START + timedelta(minutes=1))
+    assert not stats.add('TX1', 230.0, 50.0, True, START)
+    record = stats.get('TX1', now=NOW)
+    assert record['readings'] == 1 and record['trips'] == 0 and record['peak_current'] == 5.0
+
+
+def test_health_and_rankings():
+    stats = LoadStats(nominal_voltage=230.0, rated_current=10.0)
+    feed(stats, 'healthy', [5.0] * 10)
+    feed(stats, 'overloaded', [12.0] * 10)
+    feed(stats, 'sagging', [5.0] * 10, voltage=207.0)
+    feed(stats, 'tripped', [5.0] * 10, trips={9})
+    now = NOW + 9 * 60
+
+    health = {tid: stats.get(tid, now=now)['health'] for tid in ('healthy', 'overloaded', 'sagging', 'tripped')}
+    assert health == {'healthy': 100.0, 'overloaded': 60.0, 'sagging': 70.0, 'tripped': 70.0}
+    assert [r['transformer_id'] for r in stats.top(1, 'utilization', now=now)] == ['overloaded']
+    assert [r['transformer_id'] for r in stats.top(1, 'voltage_deviation', now=now)] == ['sagging']
+    assert [r['transformer_id'] for r in stats.top(1, 'since_trip', now=now)] == ['tripped']
+    assert stats.top(4, 'health', now=now)[-1]['transformer_id'] == 'healthy'
+    assert stats.fleet() == {'transformers': 4, 'mean_utilization': 0.675, 'overloaded': 1, 'trips': 1}
+
+
+def test_checkpoint_round_trip():
+    stats = LoadStats()
+    feed(stats, 'TX1', [3.0, 4.0, 8.0], trips={1})
+    restored = LoadStats()
+    restored.restore(stats.take_dirty())
+
+    assert restored.get('TX1', now=NOW) == stats.get('TX1', now=NOW)
+    assert stats.take_dirty() == []
+    # The restored state keeps rejecting readings it already applied
+    assert not restored.add('TX1', 230.0, 1.0, False, START + timedelta(seconds=120))
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import MetaData, create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from sharding import ShardRouter, rebalance
+from tests.helpers import make_reading_table
+
+START = datetime(2024, 1, 1)
+TRANSFORMERS = [f'TX{i:03d}' for i in range(40)]
+
+
+def readings(transformer_ids, per_transformer=5):
+    return [
+        {'transformer_id': tx, 'voltage': 230.0 + i, 'current': 5.0 + i / 10, 'trip_status': i == 0,
+         'timestamp': START + timedelta(minutes=i)}
+        for tx in transformer_ids for i in range(per_transformer)
+    ]
+
+
+def contents(engine, table):
+    """{transformer_id: sorted reading values} of one database, ids left out"""
+    with Session(engine) as session:
+        rows = session.execute(select(*[c for c in table.columns if c.name != 'id'])).all()
+    found = {}
+    for row in rows:
+        found.setdefault(row[0], []).append(tuple(row[1:]))
+    return {tx: sorted(values) for tx, values in found.items()}
+
+
+@pytest.fixture
+def make_router(tmp_path, reading_table):
+    routers = []
+
+    def make(shards):
+        router = ShardRouter([(f'shard{i}', f'sqlite:///{tmp_path / f"shard{i}.db"}') for i in range(shards)],
+                             reading_table)
+        router.create_all()
+        routers.append(router)
+        return router
+    yield make
+    for router in routers:
+        router.close()
+        for shard in router.shards.values():
+            shard.engine.dispose()
+
+
+@pytest.fixture
+def primary(tmp_path):
+    """An unsharded database holding every transformer's readings"""
+    engine = create_engine(f'sqlite:///{tmp_path / "primary.db"}')
+    table = make_reading_table(MetaData())
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(table), readings(TRANSFORMERS))
+    yield engine
+    engine.dispose()
+
+
+def sources(router, primary=None):
+    found = [(name, shard.engine) for name, shard in router.shards.items()]
+    return found + [('primary', primary)] if primary is not None else found
+
+
+def test_migrates_the_primary_onto_shards(make_router, primary):
+    router = make_router(3)
+    expected = contents(primary, router.table)
+
+    moved = rebalance(router, sources(router, primary), batch_size=7)
+
+    assert sum(moved.values()) == len(TRANSFORMERS) * 5
+    assert {source for source, _ in moved} == {'primary'}
+    assert contents(primary, router.table) == {}
+    merged = {}
+    for name, shard in router.shards.items():
+        on_shard = contents(shard.engine, router.table)
+        assert all(router.shard_for(tx).name == name for tx in on_shard)
+        merged.update(on_shard)
+    assert merged == expected
+
+
+def test_dry_run_reports_without_moving(make_router, primary):
+    router = make_router(2)
+    before = contents(primary, router.table)
+
+    planned = rebalance(router, sources(router, primary), dry_run=True)
+
+    assert contents(primary, router.table) == before
+    assert all(contents(shard.engine, router.table) == {} for shard in router.shards.values())
+    assert rebalance(router, sources(router, primary)) == planned
+
+
+def test_adding_a_shard_moves_only_to_it(make_router, primary):
+    two = make_router(2)
+    rebalance(two, sources(two, primary))
+    grown = make_router(3)
+
+    moved = rebalance(grown, sources(grown))
+
+    assert moved and all(target == 'shard2' for _, target in moved)
+    for name, shard in grown.shards.items():
+        assert all(grown.shard_for(tx).name == name for tx in contents(shard.engine, grown.table))
+
+
+def test_rerun_after_an_interrupted_move_is_safe(make_router, primary):
+    router = make_router(2)
+    expected = contents(primary, router.table)
+    # An earlier run copied some readings but stopped before deleting them
+    copied = [row for row in readings(TRANSFORMERS[:10]) if row['timestamp'] < START + timedelta(minutes=3)]
+    for shard, ids in router.group(TRANSFORMERS[:10]).items():
+        with router.session(shard=shard) as session:
+            session.execute(insert(router.table), [row for row in copied if row['transformer_id'] in ids])
+
+    rebalance(router, sources(router, primary), batch_size=4)
+    assert rebalance(router, sources(router, primary)) == {}
+
+    merged = {}
+    for shard in router.shards.values():
+        merged.update(contents(shard.engine, router.table))
+    assert merged == expected  # no duplicates, nothing lost
+    assert contents(primary, router.table) == {}
+
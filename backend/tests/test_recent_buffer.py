@@ -0,0 +1,158 @@
+import time
+from datetime import datetime, timedelta
+
+from recent_buffer import RecentReadings
+
+START = datetime(2024, 1, 1)
+
+
+def row(reading_id, seconds, transformer_id='TX1'):
+    return (reading_id, transformer_id, 230.0, 5.0, False, START + timedelta(seconds=seconds))
+
+
+class Store:
+    """Stand-in for the reading table: rows by id, loads newest first by timestamp"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.loads = 0
+
+    def add(self, buffer, new):
+        self.rows.append(new)
+        buffer.add(new[1], new)
+
+    def newest(self, limit, since=None):
+        self.loads += 1
+        rows = [r for r in self.rows if since is None or r[0] > since]
+        return sorted(rows, key=lambda r: r[5], reverse=True)[:limit]
+
+
+def test_serves_newest_first_and_loads_once():
+    store = Store(row(i, 10 * i) for i in range(1, 11))
+    buffer = RecentReadings(capacity=5)
+
+    assert buffer.read('TX1', 3, store.newest) == [row(10, 100), row(9, 90), row(8, 80)]
+    store.add(buffer, row(11, 110))
+    assert buffer.read('TX1', 2, store.newest) == [row(11, 110), row(10, 100)]
+    assert store.loads == 1
+    assert buffer.stats()['hits'] == 1 and buffer.stats()['misses'] == 1
+
+
+def test_unknown_transformer_is_not_buffered():
+    buffer = RecentReadings(capacity=5)
+    assert buffer.read('TX9', 3, lambda n: None) is None
+    assert buffer.stats()['transformers'] == 0
+
+
+def test_limit_above_capacity_goes_to_the_database():
+    store = Store(row(i, i) for i in range(1, 21))
+    buffer = RecentReadings(capacity=5)
+    assert len(buffer.read('TX1', 10, store.newest)) == 10
+    assert buffer.stats()['transformers'] == 0
+
+
+def test_out_of_order_reading_is_kept_in_timestamp_order():
+    store = Store(row(i, 10 * i) for i in range(1, 6))
+    buffer = RecentReadings(capacity=10)
+    buffer.read('TX1', 1, store.newest)
+
+    store.add(buffer, row(6, 25))  # back-dated between 20 and 30
+    store.add(buffer, row(7, 60))
+
+    assert [r[0] for r in buffer.read('TX1', 10, store.newest)] == [7, 5, 4, 3, 6, 2, 1]
+    assert buffer.read('TX1', 10, store.newest) == store.newest(10)
+
+
+def test_late_reading_older_than_a_full_buffer_is_dropped():
+    store = Store(row(i, 10 * i) for i in range(1, 11))
+    buffer = RecentReadings(capacity=5)
+    buffer.read('TX1', 1, store.newest)
+
+    store.add(buffer, row(11, 5))
+
+    assert [r[0] for r in buffer.read('TX1', 5, store.newest)] == [10, 9, 8, 7, 6]
+
+
+def test_late_reading_pushes_out_the_oldest():
+    store = Store(row(i, 10 * i) for i in range(1, 11))
+    buffer = RecentReadings(capacity=5)
+    buffer.read('TX1', 1, store.newest)
+
+    store.add(buffer, row(11, 75))
+
+    assert [r[0] for r in buffer.read('TX1', 5, store.newest)] == [10, 9, 8, 11, 7]
+
+
+def test_id_cursor_finds_a_late_reading_in_the_buffer():
+    store = Store(row(i, 10 * i) for i in range(1, 4))
+    buffer = RecentReadings(capacity=10)
+    buffer.read('TX1', 1, store.newest)
+
+    store.add(buffer, row(4, 15))  # high id, old timestamp
+    loads = store.loads
+
+    assert buffer.read_since('TX1', 10, 3, store.newest) == [row(4, 15)]
+    assert store.loads == loads
+
+
+def test_id_cursor_falls_back_when_a_late_reading_was_dropped():
+    store = Store(row(i, 10 * i) for i in range(1, 11))
+    buffer = RecentReadings(capacity=5)
+    buffer.read('TX1', 1, store.newest)
+
+    store.add(buffer, row(11, 5))  # dropped: older than everything buffered
+    store.add(buffer, row(12, 200))
+
+    assert buffer.read_since('TX1', 5, 10, store.newest) == [row(12, 200), row(11, 5)]
+    assert buffer.stats()['cursor_fallbacks'] == 1
+
+
+def test_id_cursor_falls_back_when_older_ids_may_be_missing():
+    store = Store(row(i, 10 * i) for i in range(1, 11))
+    buffer = RecentReadings(capacity=5)
+    buffer.read('TX1', 1, store.newest)
+    store.add(buffer, row(11, 110))
+
+    # Ids 6-11 are buffered, but the load cannot tell whether a reading with an
+    # id between 3 and 10 and an old timestamp exists
+    assert [r[0] for r in buffer.read_since('TX1', 5, 3, store.newest)] == [11, 10, 9, 8, 7]
+    # From the first id pushed after the load, the buffer has them all
+    loads = store.loads
+    assert buffer.read_since('TX1', 5, 10, store.newest) == [row(11, 110)]
+    assert store.loads == loads
+
+
+def test_id_cursor_falls_back_after_eviction():
+    store = Store(row(i, 10 * i) for i in range(1, 3))
+    buffer = RecentReadings(capacity=3)
+    buffer.read('TX1', 1, store.newest)  # the load returned everything
+    store.add(buffer, row(3, 5))       # late
+    store.add(buffer, row(4, 40))      # evicts id 3
+
+    assert [r[0] for r in buffer.read_since('TX1', 3, 2, store.newest)] == [4, 3]
+    assert buffer.stats()['cursor_fallbacks'] == 1
+
+
+def test_fill_is_skipped_when_a_write_raced_the_load():
+    buffer = RecentReadings(capacity=5)
+    stale = [row(1, 10)]
+
+    def load(limit):
+        buffer.add('TX1', row(2, 20))  # written while the load ran
+        return stale
+
+    assert buffer.read('TX1', 5, load) == stale
+    assert buffer.get('TX1', 5) is None
+
+
+def test_invalidate_and_max_age(monkeypatch):
+    store = Store(row(i, i) for i in range(1, 4))
+    buffer = RecentReadings(capacity=5, max_age=30)
+    buffer.read('TX1', 1, store.newest)
+    buffer.invalidate('TX1')
+    assert buffer.get('TX1', 1) is None
+
+    buffer.read('TX1', 1, store.newest)
+    clock = time.monotonic() + 31
+    monkeypatch.setattr('recent_buffer.time.monotonic', lambda: clock)
+    assert buffer.get('TX1', 1) is None
@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, MetaData, String, Table, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+import registry as registry_module
+from registry import (
+    decode_cursor, encode_cursor, ensure_registry_schema, latest_reading_update, newest_readings, page_payload,
+    page_statement, parse_registry_args,
+)
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def search_backends(monkeypatch):
+    """Search backends detected by a test stay with its database"""
+    monkeypatch.setattr(registry_module, '_search_backends', {})
+
+
+def make_transformer_table(metadata):
+    return Table(
+        'transformer', metadata,
+        Column('transformer_id', String(50), primary_key=True),
+        Column('location', String(200)),
+        Column('created_at', DateTime),
+        Column('tripped', Boolean, nullable=False, default=False),
+        Column('last_reading_at', DateTime),
+    )
+
+
+@pytest.fixture
+def registry(sqlite_engine):
+    table = make_transformer_table(MetaData())
+    table.metadata.create_all(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        session.execute(insert(table), [
+            {'transformer_id': f'TX{i:03d}', 'location': f'Sector {"ABC"[i % 3]}',
+             'created_at': START + timedelta(days=i), 'tripped': i % 4 == 0,
+             # Ties and missing values are what keyset pagination gets wrong
+             'last_reading_at': None if i % 5 == 0 else START + timedelta(hours=i % 7)}
+            for i in range(47)
+        ])
+        session.commit()
+    return table
+
+
+def walk(session, table, **args):
+    """Follow `next` cursors to the end; returns every transformer_id in page order"""
+    seen, after = [], None
+    while True:
+        params = dict(args, **({'after': after} if after else {}))
+        query = parse_registry_args(params)
+        payload = page_payload(session.execute(page_statement(table, query, 'sqlite')).all(), query)
+        assert len(payload['transformers']) <= query.limit
+        seen += [row['transformer_id'] for row in payload['transformers']]
+        after = payload['next']
+        if after is None:
+            return seen
+
+
+@pytest.mark.parametrize('sort', ['transformer_id', 'location', 'created_at', 'last_reading_at'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_pages_cover_every_row_once_in_order(sqlite_engine, registry, sort, order):
+    with Session(sqlite_engine) as session:
+        rows = session.execute(registry.select()).mappings().all()
+        paged = walk(session, registry, limit='6', sort=sort, order=order)
+
+    # NULLs first ascending (as MySQL and SQLite sort them), ties by transformer_id
+    def key(row):
+        value = row[sort]
+        return (value is not None, value if value is not None else 0, row['transformer_id'])
+    expected = [row['transformer_id'] for row in sorted(rows, key=key, reverse=order == 'desc')]
+    assert paged == expected
+
+
+def test_filtered_pages(sqlite_engine, registry):
+    with Session(sqlite_engine) as session:
+        assert walk(session, registry, limit='5', tripped='true') == [f'TX{i:03d}' for i in range(0, 47, 4)]
+        assert walk(session, registry, limit='5', prefix='TX01') == [f'TX{i:03d}' for i in range(10, 20)]
+        assert walk(session, registry, limit='5', q='sector b') == [f'TX{i:03d}' for i in range(1, 47, 3)]
+
+
+def test_cursor_is_bound_to_its_sort():
+    row = ('TX001', 'Sector A', START, False, None)
+    cursor = encode_cursor('created_at', row)
+    assert decode_cursor(cursor, 'created_at') == (START, 'TX001')
+    assert decode_cursor(encode_cursor('last_reading_at', row), 'last_reading_at') == (None, 'TX001')
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'location')
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor', 'created_at')
+
+
+def test_full_text_search(sqlite_engine, registry, reading_table):
+    with sqlite_engine.begin() as connection:
+        assert ensure_registry_schema(connection, registry, reading_table) == 'fts5'
+    with Session(sqlite_engine) as session:
+        # Every word is a prefix match, in either column
+        assert walk(session, registry, limit='5', q='sector b') == [f'TX{i:03d}' for i in range(1, 47, 3)]
+        assert walk(session, registry, limit='50', q='sec') == [f'TX{i:03d}' for i in range(47)]
+        assert walk(session, registry, limit='5', q='tx00 sector a') == ['TX000', 'TX003', 'TX006', 'TX009']
+        # Quotes and operators are words, not FTS5 syntax
+        assert walk(session, registry, limit='5', q='"sector" OR NOT b*') == []
+        assert walk(session, registry, limit='5', q='--') == walk(session, registry, limit='5')
+
+
+def test_search_index_follows_the_table(sqlite_engine, registry, reading_table):
+    with sqlite_engine.begin() as connection:
+        ensure_registry_schema(connection, registry, reading_table)
+        connection.execute(update(registry).where(registry.c.transformer_id == 'TX001').values(location='North Depot'))
+        connection.execute(delete(registry).where(registry.c.transformer_id == 'TX004'))
+        connection.execute(insert(registry).values(transformer_id='TX100', location='Depot 7'))
+        # Registry updates that do not touch the searchable columns
+        connection.execute(update(registry).values(tripped=True))
+    with Session(sqlite_engine) as session:
+        assert walk(session, registry, limit='5', q='depot') == ['TX001', 'TX100']
+        assert 'TX001' not in walk(session, registry, limit='50', q='sector b')
+        assert 'TX004' not in walk(session, registry, limit='50', q='sector b')
+
+
+def test_filters_combine(sqlite_engine, registry, reading_table):
+    with sqlite_engine.begin() as connection:
+        ensure_registry_schema(connection, registry, reading_table)
+    with Session(sqlite_engine) as session:
+        assert walk(session, registry, limit='2', q='sector b', tripped='true', sort='created_at', order='desc') == \
+            ['TX040', 'TX028', 'TX016', 'TX004']
+        assert walk(session, registry, limit='2', prefix='Sector C', tripped='false') == \
+            [f'TX{i:03d}' for i in range(2, 47, 3) if i % 4]
+
+
+@pytest.mark.parametrize('args, message', [
+    ({'limit': '0'}, 'limit must be between'),
+    ({'limit': 'many'}, 'limit must be between'),
+    ({'tripped': 'maybe'}, 'tripped must be true or false'),
+    ({'sort': 'voltage'}, 'sort must be one of'),
+    ({'order': 'up'}, 'order must be asc or desc'),
+])
+def test_invalid_page_arguments(args, message):
+    with pytest.raises(ValueError, match=message):
+        parse_registry_args(args)
+
+
+def test_latest_reading_state_only_moves_forward(sqlite_engine, registry):
+    batch = [
+        {'transformer_id': 'TX001', 'timestamp': START + timedelta(hours=3), 'trip_status': True},
+        {'transformer_id': 'TX001', 'timestamp': START + timedelta(hours=1), 'trip_status': False},
+        {'transformer_id': 'TX005', 'timestamp': START, 'trip_status': False},
+    ]
+    newest = newest_readings(batch)
+    assert newest == {'TX001': batch[0], 'TX005': batch[2]}
+
+    with sqlite_engine.begin() as connection:
+        for row in newest.values():
+            connection.execute(latest_reading_update(registry, row['transformer_id'], row['timestamp'], row['trip_status']))
+        # Late readings older than the stored one change nothing
+        connection.execute(latest_reading_update(registry, 'TX001', START + timedelta(hours=2), False))
+        connection.execute(latest_reading_update(registry, 'TX002', START, True))
+        state = connection.execute(
+            select(registry.c.transformer_id, registry.c.tripped, registry.c.last_reading_at)
+            .where(registry.c.transformer_id.in_(['TX001', 'TX002', 'TX005'])).order_by(registry.c.transformer_id)
+        ).all()
+    assert state == [('TX001', True, START + timedelta(hours=3)), ('TX002', False, START + timedelta(hours=2)),
+                     ('TX005', False, START)]
+
+
+def test_registry_columns_are_added_and_backfilled(sqlite_engine, reading_table):
+    legacy = Table(
+        'transformer', MetaData(),
+        Column('transformer_id', String(50), primary_key=True),
+        Column('location', String(200)),
+        Column('created_at', DateTime),
+    )
+    legacy.metadata.create_all(sqlite_engine)
+    reading_table.metadata.create_all(sqlite_engine)
+    with sqlite_engine.begin() as connection:
+        connection.execute(insert(legacy), [{'transformer_id': 'TX1', 'location': 'Sector A'},
+                                            {'transformer_id': 'TX2', 'location': 'Sector B'}])
+        connection.execute(insert(reading_table), [
+            {'transformer_id': 'TX1', 'voltage': 230.0, 'current': 5.0, 'trip_status': True, 'timestamp': START},
+            {'transformer_id': 'TX1', 'voltage': 230.0, 'current': 5.0, 'trip_status': False,
+             'timestamp': START + timedelta(hours=1)},
+            {'transformer_id': 'TX2', 'voltage': 0.0, 'current': 0.0, 'trip_status': True, 'timestamp': START},
+        ])
+
+        table = make_transformer_table(MetaData())
+        assert ensure_registry_schema(connection, table, reading_table) == 'fts5'
+        state = connection.execute(
+            select(table.c.transformer_id, table.c.tripped, table.c.last_reading_at).order_by(table.c.transformer_id)
+        ).all()
+    assert state == [('TX1', False, START + timedelta(hours=1)), ('TX2', True, START)]
+    with Session(sqlite_engine) as session:
+        assert walk(session, table, q='sector b') == ['TX2']
@@ -0,0 +1,129 @@
+import pytest
+from flask import Flask, jsonify
+
+from response_cache import READINGS_TAG, DiskBackend, MemoryBackend, ResponseCache
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def make_backend(request, tmp_path):
+    """Backend factory; disk backends made by one test share a file, like the workers of one host"""
+    if request.param == 'memory':
+        return MemoryBackend
+    return lambda: DiskBackend(str(tmp_path / 'cache.db'))
+
+
+def make_app(cache, on_view=None):
+    """App with one cached view per tag kind; `calls` counts view runs"""
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/readings/<transformer_id>')
+    @cache.cached(tag_arg='transformer_id')
+    def readings(transformer_id):
+        calls.append(transformer_id)
+        if on_view is not None:
+            on_view(transformer_id)
+        return jsonify({'transformer_id': transformer_id, 'version': len(calls)})
+
+    @app.route('/fleet')
+    @cache.cached(tag=READINGS_TAG)
+    def fleet():
+        calls.append('fleet')
+        return jsonify({'version': len(calls)})
+
+    @app.route('/missing')
+    @cache.cached(tag=READINGS_TAG)
+    def missing():
+        calls.append('missing')
+        return jsonify({'error': 'not found'}), 404
+
+    return app.test_client(), calls
+
+
+def test_etag_and_not_modified(make_backend):
+    client, calls = make_app(ResponseCache(make_backend()))
+
+    first = client.get('/readings/TX1')
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    unchanged = client.get('/readings/TX1', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+    assert client.get('/readings/TX1', headers={'If-None-Match': '"other"'}).data == first.data
+    assert calls == ['TX1']
+
+
+def test_query_parameters_are_part_of_the_key(make_backend):
+    client, calls = make_app(ResponseCache(make_backend()))
+    client.get('/readings/TX1?limit=5&format=columnar')
+    client.get('/readings/TX1?format=columnar&limit=5')
+    client.get('/readings/TX1?limit=6')
+    assert calls == ['TX1', 'TX1']
+
+
+def test_ingest_invalidates_only_the_affected_tags(make_backend):
+    cache = ResponseCache(make_backend())
+    client, calls = make_app(cache)
+    for path in ('/readings/TX1', '/readings/TX2', '/fleet'):
+        client.get(path)
+
+    cache.invalidate_transformer('TX1')
+    client.get('/readings/TX1')
+    client.get('/readings/TX2')
+    client.get('/fleet')
+    assert calls == ['TX1', 'TX2', 'fleet', 'TX1']
+
+    cache.invalidate_readings()
+    client.get('/fleet')
+    assert calls[-1] == 'fleet' and len(calls) == 5
+
+
+def test_errors_and_expired_entries_are_not_served(make_backend):
+    client, calls = make_app(ResponseCache(make_backend(), default_ttl=0))
+    client.get('/missing')
+    client.get('/missing')
+    client.get('/fleet')
+    client.get('/fleet')
+    assert calls == ['missing', 'missing', 'fleet', 'fleet']
+
+
+def test_fill_racing_an_invalidation_is_not_stored(make_backend):
+    cache = ResponseCache(make_backend())
+
+    def ingest_meanwhile(transformer_id):
+        # A reading is committed and invalidated after the view read the database
+        if len(calls) == 1:
+            cache.invalidate_transformer(transformer_id)
+    client, calls = make_app(cache, on_view=ingest_meanwhile)
+
+    stale = client.get('/readings/TX1').get_json()
+    fresh = client.get('/readings/TX1').get_json()
+    assert (stale['version'], fresh['version']) == (1, 2)
+    assert client.get('/readings/TX1').get_json() == fresh
+    assert calls == ['TX1', 'TX1']
+
+
+def test_disk_backend_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    worker_a, worker_b = ResponseCache(DiskBackend(path)), ResponseCache(DiskBackend(path))
+    client_a, calls_a = make_app(worker_a)
+    client_b, calls_b = make_app(worker_b)
+
+    client_a.get('/readings/TX1')
+    assert client_b.get('/readings/TX1').get_json()['version'] == 1 and calls_b == []
+
+    # Ingest handled by worker b reaches worker a's next request
+    worker_b.invalidate_transformer('TX1')
+    client_a.get('/readings/TX1')
+    assert calls_a == ['TX1', 'TX1']
+    assert worker_b.stats()['entries'] == 1
+
+
+def test_disk_backend_evicts_least_recently_used(tmp_path):
+    backend = DiskBackend(str(tmp_path / 'cache.db'), max_entries=2)
+    for key in ('a', 'b'):
+        backend.set(key, (b'body', 200, 'application/json', key), 60)
+    backend.get('a')
+    backend.set('c', (b'body', 200, 'application/json', 'c'), 60)
+
+    assert len(backend) == 2 and backend.get('b') is None and backend.get('a') is not None
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from sharding import HashRing, ShardRouter, merge_rows, shard_specs_from_env
+
+START = datetime(2024, 1, 1)
+KEYS = [f'TX{i:05d}' for i in range(5000)]
+
+
+def test_ring_is_deterministic_and_balanced():
+    ring, reordered = HashRing(['a', 'b', 'c', 'd']), HashRing(['d', 'c', 'b', 'a'])
+    owners = [ring.owner(key) for key in KEYS]
+    assert owners == [reordered.owner(key) for key in KEYS]
+    counts = {name: owners.count(name) for name in 'abcd'}
+    assert all(0.75 * len(KEYS) / 4 < count < 1.25 * len(KEYS) / 4 for count in counts.values())
+
+
+def test_adding_a_shard_only_moves_keys_to_it():
+    ring, grown = HashRing(['a', 'b', 'c', 'd']), HashRing(['a', 'b', 'c', 'd', 'e'])
+    moved = [key for key in KEYS if ring.owner(key) != grown.owner(key)]
+    assert all(grown.owner(key) == 'e' for key in moved)
+    assert 0.1 < len(moved) / len(KEYS) < 0.3
+
+
+def test_shard_specs_from_env():
+    specs = shard_specs_from_env('east=db1:3307, sqlite:////tmp/s.db', 'u', 'p', 'lt')
+    assert specs[0][0] == 'east' and specs[0][1].endswith('@db1:3307/lt')
+    assert specs[1] == ('shard1', 'sqlite:////tmp/s.db')
+
+
+@pytest.fixture
+def router(tmp_path, reading_table):
+    router = ShardRouter([(f'shard{i}', f'sqlite:///{tmp_path / f"shard{i}.db"}') for i in range(3)], reading_table)
+    router.create_all()
+    yield router
+    router.close()
+    for shard in router.shards.values():
+        shard.engine.dispose()
+
+
+def test_readings_go_to_the_owning_shard(router):
+    transformers = [f'TX{i:03d}' for i in range(30)]
+    for shard, ids in router.group(transformers).items():
+        with router.session(shard=shard) as session:
+            session.execute(insert(router.table), [
+                {'transformer_id': tx, 'voltage': 230.0, 'current': 5.0, 'trip_status': i == 0,
+                 'timestamp': START + timedelta(minutes=i)} for tx in ids for i in range(4)
+            ])
+
+    for tx in transformers:
+        count = router.run_read(tx, lambda s, tx=tx: s.scalar(
+            select(func.count()).select_from(router.table).where(router.table.c.transformer_id == tx)))
+        assert count == 4
+
+    per_shard = router.scatter(lambda s: s.execute(
+        select(router.table.c.transformer_id, func.count()).group_by(router.table.c.transformer_id)).all())
+    assert len(per_shard) == 3 and all(per_shard)
+    assert merge_rows(per_shard) == [(tx, 4) for tx in transformers]
+
+
+def test_session_rolls_back_on_error(router):
+    with pytest.raises(RuntimeError):
+        with router.session('TX001') as session:
+            session.execute(insert(router.table).values(
+                transformer_id='TX001', voltage=230.0, current=5.0, trip_status=False, timestamp=START))
+            raise RuntimeError
+    assert router.run_read('TX001', lambda s: s.scalar(select(func.count()).select_from(router.table))) == 0
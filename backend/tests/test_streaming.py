@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from worker_pool import WorkerPool
+
+main = pytest.importorskip('main')
+
+
+@pytest.fixture(params=['pool', 'subprocess'] if WorkerPool.is_supported() else ['subprocess'])
+def executor(request, monkeypatch):
+    """Stream through a fresh single-worker pool, or through the subprocess fallback"""
+    monkeypatch.setattr(main, 'docker_executor', None)
+    monkeypatch.setattr(main, 'execution_pool', WorkerPool(size=1, memory_limit_mb=0) if request.param == 'pool' else None)
+    return request.param
+
+
+def stream(code, is_disconnected=None):
+    """Run code as a streaming job; returns (job, streamed chunks, final result)"""
+    async def run():
+        await main.execution_scheduler.start()
+        try:
+            job, events = main.submit_streaming_job('test', code)
+            items = [item async for item in main.streaming_job_events(job, events, is_disconnected)]
+            await asyncio.wait_for(job.done.wait(), timeout=5)
+            return job, items
+        finally:
+            await main.execution_scheduler.stop()
+            if main.execution_pool:
+                await main.execution_pool.stop()
+
+    job, items = asyncio.run(run())
+    if items and items[-1][0] == 'result':
+        return job, items[:-1], items[-1][1]
+    return job, items, None
+
+
+def text_of(chunks, name):
+    return ''.join(text for stream, text in chunks if stream == name)
+
+
+def test_close_events_does_not_wait_for_a_full_buffer():
+    events = asyncio.Queue(maxsize=2)
+    events.put_nowait(('stdout', 'a'))
+    events.put_nowait(('stdout', 'b'))
+
+    main.close_events(events)
+
+    assert [events.get_nowait(), events.get_nowait()] == [('stdout', 'b'), None]
+
+
+def test_streamed_output_and_result(executor):
+    _, chunks, result = stream('import sys\nprint("a", flush=True)\nprint("oops", file=sys.stderr)\nprint("b")')
+
+    assert text_of(chunks, 'stdout') == 'a\nb\n' and text_of(chunks, 'stderr') == 'oops\n'
+    assert result['output'] == 'a\nb' and result['error'] == 'oops'
+
+
+def test_tracebacks_do_not_show_server_paths(executor):
+    _, chunks, result = stream('print("x")\n\nundefined_name')
+
+    assert 'File "<main>", line 3' in text_of(chunks, 'stderr')
+    assert '/tmp' not in text_of(chunks, 'stderr') and '/tmp' not in result['error']
+    assert result['error_details']['type'] == 'NameError' and result['error_details']['line'] == 3
+
+
+def test_output_limit_stops_the_program(executor, monkeypatch):
+    monkeypatch.setattr(main, 'STREAM_OUTPUT_LIMIT', 1000)
+    _, chunks, result = stream('while True:\n    print("x" * 99)')
+
+    assert len(text_of(chunks, 'stdout')) <= 1000
+    assert result['error'].startswith('Execution stopped: your program printed more than')
+    assert result['output'].startswith('x' * 99)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='checks the process with os.kill')
+def test_disconnected_client_cancels_the_run(executor, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'DISCONNECT_POLL_SECONDS', 0.05)
+    pid_file = tmp_path / 'pid'
+    code = f'import os, time\nopen({str(pid_file)!r}, "w").write(str(os.getpid()))\nprint("started")\ntime.sleep(60)'
+    polls = []
+
+    async def is_disconnected():
+        if pid_file.exists():
+            polls.append(True)
+        return len(polls) > 2  # the client leaves a moment after the program started
+
+    started = time.monotonic()
+    job, chunks, result = stream(code, is_disconnected)
+
+    assert job.status == 'cancelled' and result is None
+    assert chunks == [('stdout', 'started\n')]
+    assert time.monotonic() - started < 5
+    pid = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('the program is still running')
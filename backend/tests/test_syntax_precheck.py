@@ -0,0 +1,46 @@
+import pytest
+
+main = pytest.importorskip('main')
+testclient = pytest.importorskip('starlette.testclient')
+
+
+@pytest.mark.parametrize('code, error_type, line', [
+    ('print("hi"', 'SyntaxError', 1),
+    ('x = 1\nif x > 0\n    print(x)', 'SyntaxError', 2),
+    ('def f():\nreturn 1', 'IndentationError', 2),
+    ('for i in range(3):\n    print(i)\n  print("done")', 'IndentationError', 3),
+])
+def test_syntax_errors_are_answered_without_running(code, error_type, line):
+    response = main.check_syntax(code)
+
+    assert response is not None and response.output == '' and response.execution_time == 0.0
+    assert response.error_details.type == error_type
+    assert response.error_details.line == line and response.error_details.column is not None
+
+
+@pytest.mark.parametrize('code', [
+    'print("hi")',
+    'import os\nos._exit(3)',                # compiles; only running it would exit
+    'x = 1 +\\\n    2',
+    'assert (1, "tuple is always true")',   # a compile-time warning, not an error
+])
+def test_code_that_compiles_goes_to_the_sandbox(code):
+    assert main.check_syntax(code) is None
+
+
+def test_large_code_skips_the_check(monkeypatch):
+    monkeypatch.setattr(main, 'PRECHECK_MAX_CODE_SIZE', 5)
+    assert main.check_syntax('print("hi"') is None
+
+
+def test_endpoint_does_not_dispatch_code_with_a_syntax_error(monkeypatch):
+    async def run(client_id, code):
+        raise AssertionError('dispatched to the sandbox')
+    monkeypatch.setattr(main.execution_scheduler, 'run', run)
+    monkeypatch.setattr(main, 'precheck_stats', {'checked': 0, 'syntax_errors': 0})
+
+    response = testclient.TestClient(main.app).post('/api/execute', json={'code': 'print("hi"'})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['error'] and body['error_details']['type'] == 'SyntaxError' and body['error_details']['line'] == 1
+    assert main.precheck_stats == {'checked': 1, 'syntax_errors': 1}
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from worker_pool import WorkerCrashed, WorkerPool
+
+pytestmark = pytest.mark.skipif(not WorkerPool.is_supported(), reason='the worker pool needs POSIX')
+
+
+def run_jobs(*codes, timeout=5.0):
+    """Run codes one after another on a single worker; exceptions are returned in place of results"""
+    async def main():
+        pool = WorkerPool(size=1, memory_limit_mb=0)
+        results = []
+        try:
+            for code in codes:
+                try:
+                    results.append(await pool.execute(code, timeout=timeout))
+                except (asyncio.TimeoutError, WorkerCrashed) as e:
+                    results.append(type(e))
+            results.append(pool.stats())
+        finally:
+            await pool.stop()
+        return results
+    return asyncio.run(main())
+
+
+def test_output_and_tracebacks():
+    [(stdout, stderr), _] = run_jobs('print("hi")\nprint(1 / 0)')
+    assert stdout == 'hi\n'
+    assert 'File "<main>", line 2' in stderr and stderr.endswith('ZeroDivisionError: division by zero\n')
+
+
+def test_jobs_do_not_share_state():
+    *results, stats = run_jobs(
+        'import threading, time, json, os\n'
+        'threading.Thread(target=time.sleep, args=(60,), daemon=True).start()\n'
+        'json.leaked = True\n'
+        'os.environ["LEAKED"] = "1"\n'
+        'os.chdir("/")\n'
+        'len = None\n',
+        'import threading, json, os\n'
+        'print(threading.active_count(), hasattr(json, "leaked"), "LEAKED" in os.environ, os.getcwd() == "/")\n'
+        'print(len("abc"))\n',
+    )
+    assert results[1] == ('1 False False False\n3\n', '')
+    assert stats['recycled'] == 0
+
+
+def test_timeout_kills_only_the_job():
+    *results, stats = run_jobs('while True:\n    pass', 'import time\ntime.sleep(60)', 'print("next")', timeout=1.0)
+    assert results == [asyncio.TimeoutError, asyncio.TimeoutError, ('next\n', '')]
+    assert stats['recycled'] == 0
+
+
+def test_crashed_job_is_reported_and_the_worker_survives():
+    *results, stats = run_jobs('import os\nos._exit(3)', 'print("next")')
+    assert results == [WorkerCrashed, ('next\n', '')]
+    assert stats['recycled'] == 0
+
+
+def test_a_job_cannot_forge_the_next_jobs_result():
+    forge = (
+        'import json, os, struct\n'
+        'def frame(message):\n'
+        '    data = json.dumps(message).encode()\n'
+        '    return struct.pack(">I", len(data)) + data\n'
+        'forged = frame({"stdout": "mine", "stderr": ""}) + frame({"stdout": "FORGED", "stderr": ""})\n'
+        'for fd in range(3, 64):\n'
+        '    try:\n'
+        '        os.write(fd, forged)\n'
+        '    except OSError:\n'
+        '        pass\n'
+    )
+    *results, _ = run_jobs(forge, 'print("honest")')
+    assert results[1] == ('honest\n', '')
+
+
+def is_running(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            return stat.read().rsplit(') ', 1)[1][0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def test_processes_forked_by_a_job_are_killed(tmp_path):
+    pid_file = tmp_path / 'pid'
+    code = (
+        'import os, time\n'
+        'if os.fork() == 0:\n'
+        f'    open({str(pid_file)!r}, "w").write(str(os.getpid()))\n'
+        '    time.sleep(60)\n'
+        'else:\n'
+        f'    while not os.path.exists({str(pid_file)!r}):\n'
+        '        time.sleep(0.01)\n'
+        '    print("parent done")\n'
+    )
+
+    async def main():
+        pool = WorkerPool(size=1, memory_limit_mb=0)
+        try:
+            assert await pool.execute(code, timeout=5.0) == ('parent done\n', '')
+            # Checked while the worker is still alive: stopping it kills its whole group
+            pid = int(pid_file.read_text())
+            for _ in range(100):
+                if not is_running(pid):
+                    return
+                await asyncio.sleep(0.02)
+            pytest.fail('the forked process is still running')
+        finally:
+            await pool.stop()
+    asyncio.run(main())
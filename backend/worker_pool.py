@@ -0,0 +1,405 @@
+"""
+Warm interpreter pool for /api/execute and /api/execute/stream
+
+Instead of writing a temp file and starting a new interpreter for every
+request, a few worker processes are started ahead of time. Each worker:
+
+- receives code over a pipe (length-prefixed JSON),
+- forks a child per job that runs it in a fresh namespace with stdin empty
+  and stdout/stderr captured, under RLIMIT_AS (memory) and its own
+  RLIMIT_CPU budget, and is killed when the wall-clock timeout passes,
+- closes the worker's own pipes in that child and kills the child's process
+  group when the job ends, so a job cannot read later jobs or forge their
+  results, even from a process it forked,
+- sends back {"stdout": ..., "stderr": ...}, or {"timeout": true} /
+  {"crashed": true} when the child did not finish.
+
+Streaming jobs (/api/execute/stream) send {"stream": "stdout" | "stderr",
+"text": ...} messages as output is written, before the final one. The
+child is also killed once it passes the job's output limit
+({"limit_exceeded": true}). The server reads the next message only after
+the client took the previous one. So a slow client blocks the pipes and
+pauses the job until the server-side timeout.
+
+The worker itself never runs user code, so threads, imported modules,
+changed builtins, cwd, environment and other state left behind by a run die
+with its child. A fork costs far less than starting an interpreter. Workers
+report each job's process group ({"group": pid}) before its output, are
+killed together with that group on a protocol failure or cancellation, and
+are replaced after `max_runs` jobs.
+
+POSIX only (uses the resource module); main.py falls back to the
+one-process-per-run path elsewhere.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import select
+import signal
+import struct
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+_MAX_FD = os.sysconf('SC_OPEN_MAX') if hasattr(os, 'sysconf') else 1024
+
+
+# ---------------------------------------------------------------------------
+# Worker side (runs in the child interpreter)
+# ---------------------------------------------------------------------------
+
+def _read_message(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    return json.loads(stream.read(length))
+
+
+def _write_message(stream, message):
+    data = json.dumps(message).encode('utf-8')
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+class _StreamOutput(io.TextIOBase):
+    """
+    sys.stdout / sys.stderr of a streaming job: sends what is written as
+    {"stream": name, "text": ...} messages, a line (or 4 KB) at a time
+    """
+
+    def __init__(self, stream, out):
+        self.stream = stream
+        self._out = out
+        self._buffer = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if '\n' in text or self._size >= 4096:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            _write_message(self._out, {'stream': self.stream, 'text': ''.join(self._buffer)})
+            self._buffer, self._size = [], 0
+
+
+def _run_job(code, cpu_seconds, stdout, stderr):
+    """Run code in this (forked, throwaway) process with the given output streams"""
+    import builtins
+    import linecache
+    import resource
+    import traceback
+
+    # CPU time starts from zero in a forked child
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = cpu_seconds if hard == resource.RLIM_INFINITY else min(cpu_seconds, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(), stdout, stderr
+    namespace = {'__name__': '__main__', '__builtins__': builtins}
+    # Let tracebacks show the user's source lines
+    linecache.cache['<main>'] = (len(code), None, code.splitlines(True), '<main>')
+    try:
+        exec(compile(code, '<main>', 'exec'), namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0) and not isinstance(e.code, int):
+            stderr.write(f'{e.code}\n')
+    except SyntaxError:
+        stderr.write(''.join(traceback.format_exception_only(*sys.exc_info()[:2])))
+    except BaseException:
+        exc_type, exc_value, tb = sys.exc_info()
+        # Drop this function's frame so the traceback starts in user code
+        stderr.write(''.join(traceback.format_exception(exc_type, exc_value, tb.tb_next)))
+
+
+def _child_main(job, out):
+    """Body of the forked child: run the job and send its result on `out`"""
+    if job.get('stream'):
+        stdout, stderr = _StreamOutput('stdout', out), _StreamOutput('stderr', out)
+        _run_job(job['code'], job['cpu_seconds'], stdout, stderr)
+        stdout.flush()
+        stderr.flush()
+        _write_message(out, {'stdout': '', 'stderr': ''})
+    else:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        _run_job(job['code'], job['cpu_seconds'], stdout, stderr)
+        _write_message(out, {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()})
+
+
+def _truncate(text, limit):
+    """The longest prefix of text that is at most `limit` bytes in UTF-8"""
+    return text.encode('utf-8')[:limit].decode('utf-8', errors='ignore')
+
+
+def _run_forked(job, forward):
+    """
+    Run a job in a forked child and collect its result. The child's process
+    group ({"group": pid}) and the output messages of a streaming job are
+    passed to forward() as they arrive. The child is
+    killed once job['timeout'] seconds have passed or it has written more
+    than job['output_limit'] bytes.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Own process group, so everything the job starts dies with it
+        os.setpgid(0, 0)
+        # Keep only fds 0-2 (/dev/null) and the result pipe. The worker's
+        # protocol pipes carry other clients' jobs and results
+        os.closerange(3, write_fd)
+        os.closerange(write_fd + 1, _MAX_FD)
+        try:
+            with os.fdopen(write_fd, 'wb') as out:
+                _child_main(job, out)
+        finally:
+            # Skip atexit handlers and non-daemon threads the user started
+            os._exit(0)
+
+    os.close(write_fd)
+    try:
+        os.setpgid(pid, pid)  # also here, in case the child has not run yet
+    except OSError:
+        pass
+    forward({'group': pid})
+    deadline = time.monotonic() + job['timeout']
+    limit = job.get('output_limit')
+    written = 0
+    buffer = bytearray()
+    outcome = None
+    with os.fdopen(read_fd, 'rb', buffering=0) as pipe:
+        while outcome is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([pipe], [], [], remaining)[0]:
+                outcome = {'timeout': True}
+                break
+            chunk = pipe.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            while len(buffer) >= _HEADER.size:
+                (length,) = _HEADER.unpack_from(buffer)
+                if len(buffer) < _HEADER.size + length:
+                    break
+                message = json.loads(bytes(buffer[_HEADER.size:_HEADER.size + length]))
+                del buffer[:_HEADER.size + length]
+                if 'stream' not in message:
+                    outcome = message
+                    break
+                size = len(message['text'].encode('utf-8'))
+                if limit is not None and written + size > limit:
+                    message['text'] = _truncate(message['text'], limit - written)
+                    forward(message)
+                    outcome = {'limit_exceeded': True}
+                    break
+                written += size
+                forward(message)
+    os.kill(pid, signal.SIGKILL)
+    try:
+        # Processes the job forked and left behind
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    os.waitpid(pid, 0)
+    # No result: killed by a limit (or os._exit) before it could answer
+    return outcome or {'crashed': True}
+
+
+def worker_main(memory_limit_mb):
+    import resource
+
+    # Keep private copies of the pipes, then point fds 0-2 at /dev/null so
+    # user code writing to the raw descriptors cannot corrupt the protocol
+    proto_in = os.fdopen(os.dup(0), 'rb')
+    proto_out = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        job = _read_message(proto_in)
+        if job is None:
+            break
+        _write_message(proto_out, _run_forked(job, lambda message: _write_message(proto_out, message)))
+
+
+# ---------------------------------------------------------------------------
+# Server side
+# ---------------------------------------------------------------------------
+
+class OutputLimitExceeded(Exception):
+    """A streaming job wrote more than its output limit and was stopped"""
+
+
+class WorkerCrashed(Exception):
+    """The job died before it finished (memory/CPU limit, os._exit, ...) or its worker was lost"""
+
+
+class _Worker:
+    def __init__(self, process):
+        self.process = process
+        self.runs = 0
+        self.job_group = None
+
+    async def run(self, code, cpu_seconds, timeout, emit=None, output_limit=None):
+        job = {'code': code, 'cpu_seconds': cpu_seconds, 'timeout': timeout,
+               'stream': emit is not None, 'output_limit': output_limit}
+        data = json.dumps(job).encode('utf-8')
+        self.process.stdin.write(_HEADER.pack(len(data)) + data)
+        await self.process.stdin.drain()
+        streamed = {'stdout': [], 'stderr': []}
+        try:
+            while True:
+                header = await self.process.stdout.readexactly(_HEADER.size)
+                (length,) = _HEADER.unpack(header)
+                message = json.loads(await self.process.stdout.readexactly(length))
+                if 'group' in message:
+                    self.job_group = message['group']
+                    continue
+                if 'stream' not in message:
+                    self.job_group = None
+                    break
+                streamed[message['stream']].append(message['text'])
+                # Not reading on while the consumer is slow pauses the job
+                await emit(message['stream'], message['text'])
+        except asyncio.IncompleteReadError:
+            raise WorkerCrashed()
+        if emit is not None and 'stdout' in message:
+            message = {'stdout': ''.join(streamed['stdout']), 'stderr': ''.join(streamed['stderr'])}
+        return message
+
+    def kill(self):
+        """Kill the worker and the process group of any job it is running"""
+        groups = [self.job_group]
+        if self.process.returncode is None:
+            groups.append(self.process.pid)
+        for group in groups:
+            if group is None:
+                continue
+            try:
+                os.killpg(group, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class WorkerPool:
+    """Pool of pre-started interpreters that run untrusted snippets"""
+
+    def __init__(self, size=None, max_runs=50, memory_limit_mb=256):
+        self.size = size or os.cpu_count() or 1
+        self.max_runs = max_runs
+        self.memory_limit_mb = memory_limit_mb
+        self._idle = None
+        self._started = False
+        self._background = set()
+        self.executions = 0
+        self.recycled = 0
+
+    @staticmethod
+    def is_supported():
+        return os.name == 'posix'
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._idle = asyncio.Queue()
+        workers = await asyncio.gather(*(self._spawn() for _ in range(self.size)))
+        for worker in workers:
+            self._idle.put_nowait(worker)
+        logger.info(f"Started {self.size} execution workers")
+
+    async def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        # Let replacements finish starting, so they are stopped below too
+        await asyncio.gather(*self._background, return_exceptions=True)
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            worker.kill()
+            await worker.process.wait()
+
+    async def _spawn(self):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-I', os.path.abspath(__file__), '--worker', str(self.memory_limit_mb),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=tempfile.gettempdir(),
+            start_new_session=True,  # lets kill() reach the job child too
+        )
+        return _Worker(process)
+
+    def _replace(self, worker):
+        """Kill a worker and start its replacement in the background"""
+        worker.kill()
+        self.recycled += 1
+
+        async def replace():
+            await worker.process.wait()
+            self._idle.put_nowait(await self._spawn())
+
+        task = asyncio.create_task(replace())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def execute(self, code, timeout=10.0, emit=None, output_limit=None):
+        """
+        Run code in a warm worker. Returns (stdout, stderr); raises
+        asyncio.TimeoutError on timeout and WorkerCrashed if the job died.
+        With `emit`, output is also streamed: `await emit("stdout" | "stderr",
+        text)` is called as it is written, and OutputLimitExceeded is raised
+        once it passes `output_limit` bytes.
+        """
+        await self.start()
+        worker = await self._idle.get()
+        self.executions += 1
+        try:
+            # The worker enforces the timeout; this one only catches a stuck worker
+            result = await asyncio.wait_for(worker.run(code, int(timeout) + 1, timeout, emit, output_limit),
+                                            timeout=timeout + 5)
+        except BaseException:
+            # Lost worker, stuck worker or cancellation: never reuse this worker
+            self._replace(worker)
+            raise
+
+        worker.runs += 1
+        if worker.runs >= self.max_runs:
+            self._replace(worker)
+        else:
+            self._idle.put_nowait(worker)
+        if result.get('timeout'):
+            raise asyncio.TimeoutError()
+        if result.get('crashed'):
+            raise WorkerCrashed()
+        if result.get('limit_exceeded'):
+            raise OutputLimitExceeded()
+        return result['stdout'], result['stderr']
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize() if self._idle is not None else 0,
+            'executions': self.executions,
+            'recycled': self.recycled,
+        }
+
+
+if __name__ == '__main__' and len(sys.argv) >= 2 and sys.argv[1] == '--worker':
+    worker_main(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
@@ -29,7 +29,7 @@ const char* WIFI_SSID = "YOUR_WIFI_SSID";          // Replace with your WiFi SSI
 const char* WIFI_PASSWORD = "YOUR_WIFI_PASSWORD";   // Replace with your WiFi password
 
 // Server Configuration
-const char* SERVER_URL = "http://192.168.1.100:5000"; // Replace with your Flask server IP
+const char* SERVER_URL = "http://192.168.1.100:5000"; // Replace with your Flask server IP (or the substation gateway, see gateway.py)
 const char* TRANSFORMER_ID = "TX001";               // Unique transformer ID
 
 // Pin Definitions
@@ -3,6 +3,9 @@ const CONFIG = {
     API_BASE_URL: 'http://localhost:5000',
     REFRESH_INTERVAL: 5000, // 5 seconds
     CHART_MAX_POINTS: 50,
+    REGISTRY_PAGE_SIZE: 100, // transformers listed in the selector; search narrows the list
+    SEARCH_DELAY: 300, // ms after the last keystroke before searching
+    FULL_SYNC_INTERVAL: 60000, // reload the whole window every minute; refreshes in between fetch only new readings
     VOLTAGE_THRESHOLDS: {
         low: 200,
         high: 250
@@ -16,15 +19,27 @@ const CONFIG = {
 // Global Variables
 let currentTransformerId = null;
 let refreshInterval = null;
+let searchTimer = null;
 let trendsChart = null;
 let lastTripStatus = false;
 
+// Readings currently shown, and the server cursor for fetching only newer ones
+let readingsState = {
+    transformerId: null,
+    limit: 0,
+    cursor: null,
+    readings: [],
+    syncedAt: 0
+};
+
 // DOM Elements
 const elements = {
     connectionStatus: document.getElementById('connectionStatus'),
     statusText: document.getElementById('statusText'),
     lastUpdate: document.getElementById('lastUpdate'),
     transformerSelect: document.getElementById('transformerSelect'),
+    transformerSearch: document.getElementById('transformerSearch'),
+    trippedOnly: document.getElementById('trippedOnly'),
     autoRefresh: document.getElementById('autoRefresh'),
     voltageValue: document.getElementById('voltageValue'),
     voltageStatus: document.getElementById('voltageStatus'),
@@ -112,9 +127,16 @@ async function apiRequest(endpoint, options = {}) {
     }
 }
 
+// Loads one page of the registry (filtered by the search box and the
+// tripped-only toggle) instead of every transformer
 async function loadTransformers() {
     try {
-        const data = await apiRequest('/get_transformers');
+        const params = new URLSearchParams({ limit: CONFIG.REGISTRY_PAGE_SIZE });
+        const search = elements.transformerSearch.value.trim();
+        if (search) params.set('q', search);
+        if (elements.trippedOnly.checked) params.set('tripped', 'true');
+        
+        const data = await apiRequest(`/get_transformers?${params}`);
         
         elements.transformerSelect.innerHTML = '<option value="">Select a transformer...</option>';
         
@@ -122,9 +144,21 @@ async function loadTransformers() {
             data.transformers.forEach(transformer => {
                 const option = document.createElement('option');
                 option.value = transformer.transformer_id;
-                option.textContent = `${transformer.transformer_id} - ${transformer.location}`;
+                option.textContent = `${transformer.transformer_id} - ${transformer.location}` +
+                                     (transformer.tripped ? ' (TRIPPED)' : '');
                 elements.transformerSelect.appendChild(option);
             });
+            if (data.next) {
+                const more = document.createElement('option');
+                more.disabled = true;
+                more.textContent = 'More transformers... refine your search';
+                elements.transformerSelect.appendChild(more);
+            }
+            // Keep the current selection if it is still in the list
+            if (currentTransformerId &&
+                data.transformers.some(t => t.transformer_id === currentTransformerId)) {
+                elements.transformerSelect.value = currentTransformerId;
+            }
         } else {
             elements.transformerSelect.innerHTML = '<option value="">No transformers found</option>';
         }
@@ -164,17 +198,76 @@ async function loadLatestReading(transformerId) {
 async function loadReadings(transformerId, limit = 25) {
     try {
         const data = await apiRequest(`/get_readings/${transformerId}?limit=${limit}`);
+        if (transformerId !== currentTransformerId) return; // selection changed while loading
         
         if (data.readings) {
+            readingsState = {
+                transformerId,
+                limit,
+                cursor: data.cursor ?? null,
+                readings: data.readings,
+                syncedAt: Date.now()
+            };
             updateReadingsTable(data.readings);
             updateTrendsChart(data.readings);
         }
     } catch (error) {
         console.error('Error loading readings:', error);
+        readingsState.transformerId = null;
         elements.readingsTableBody.innerHTML = '<tr><td colspan="5" class="loading">Error loading readings</td></tr>';
     }
 }
 
+// Auto-refresh: fetch only readings newer than the last response's cursor and
+// append them, so a refresh with one new sample transfers one reading
+async function syncReadings(transformerId, limit = 25) {
+    const state = readingsState;
+    if (state.transformerId !== transformerId || state.limit !== limit || state.cursor === null ||
+        Date.now() - state.syncedAt > CONFIG.FULL_SYNC_INTERVAL) {
+        return loadReadings(transformerId, limit);
+    }
+    
+    try {
+        const since = encodeURIComponent(state.cursor);
+        const data = await apiRequest(`/get_readings/${transformerId}?limit=${limit}&since=${since}`);
+        if (transformerId !== currentTransformerId || readingsState !== state) return;
+        
+        if (data.cursor !== null && data.cursor !== undefined) {
+            state.cursor = data.cursor;
+        }
+        const newReadings = data.readings || [];
+        if (newReadings.length === 0) return;
+        
+        if (newReadings.length >= limit) {
+            // More new readings than the window holds: they replace it
+            state.readings = newReadings;
+            updateReadingsTable(state.readings);
+            updateTrendsChart(state.readings);
+            return;
+        }
+        
+        state.readings = mergeReadings(newReadings, state.readings, limit);
+        updateReadingsTable(state.readings);
+        appendToTrendsChart(newReadings, state.readings);
+    } catch (error) {
+        console.error('Error syncing readings:', error);
+    }
+}
+
+// Newest `limit` readings of both lists, newest first, without duplicates
+function mergeReadings(newReadings, readings, limit) {
+    const seen = new Set();
+    return [...newReadings, ...readings]
+        .filter(reading => {
+            const key = reading.id ?? reading.timestamp;
+            if (seen.has(key)) return false;
+            seen.add(key);
+            return true;
+        })
+        .sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp))
+        .slice(0, limit);
+}
+
 // UI Update Functions
 function updateReadingCards(reading) {
     // Update voltage
@@ -354,6 +447,37 @@ function updateTrendsChart(readings) {
     trendsChart.update('none'); // Update without animation for better performance
 }
 
+// Add new readings to the end of the chart series, dropping the oldest points
+function appendToTrendsChart(newReadings, windowReadings) {
+    if (!trendsChart || !newReadings || newReadings.length === 0) return;
+    
+    const labels = trendsChart.data.labels;
+    const sortedReadings = [...newReadings].sort((a, b) => 
+        new Date(a.timestamp) - new Date(b.timestamp)
+    );
+    
+    // A late reading belongs somewhere inside the series: rebuild it instead
+    const lastLabel = labels[labels.length - 1];
+    if (lastLabel && new Date(sortedReadings[0].timestamp) <= new Date(lastLabel)) {
+        updateTrendsChart(windowReadings);
+        return;
+    }
+    
+    const maxPoints = Math.min(CONFIG.CHART_MAX_POINTS, windowReadings.length);
+    sortedReadings.forEach(r => {
+        labels.push(r.timestamp);
+        trendsChart.data.datasets[0].data.push(r.voltage);
+        trendsChart.data.datasets[1].data.push(r.current);
+    });
+    while (labels.length > maxPoints) {
+        labels.shift();
+        trendsChart.data.datasets[0].data.shift();
+        trendsChart.data.datasets[1].data.shift();
+    }
+    
+    trendsChart.update('none');
+}
+
 // Event Handlers
 function setupEventListeners() {
     // Transformer selection
@@ -377,6 +501,13 @@ function setupEventListeners() {
         }
     });
     
+    // Registry search (debounced) and tripped-only filter
+    elements.transformerSearch.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadTransformers, CONFIG.SEARCH_DELAY);
+    });
+    elements.trippedOnly.addEventListener('change', loadTransformers);
+    
     // Auto-refresh toggle
     elements.autoRefresh.addEventListener('change', (e) => {
         if (e.target.checked) {
@@ -430,7 +561,7 @@ function startAutoRefresh() {
     refreshInterval = setInterval(() => {
         if (currentTransformerId) {
             loadLatestReading(currentTransformerId);
-            loadReadings(currentTransformerId, parseInt(elements.recordsLimit.value));
+            syncReadings(currentTransformerId, parseInt(elements.recordsLimit.value));
         }
     }, CONFIG.REFRESH_INTERVAL);
 }
@@ -475,5 +606,6 @@ window.Dashboard = {
     loadTransformers,
     loadLatestReading,
     loadReadings,
+    syncReadings,
     trendsChart
 };